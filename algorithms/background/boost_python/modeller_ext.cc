@@ -11,12 +11,29 @@
 #include <boost/python.hpp>
 #include <boost/python/def.hpp>
 #include <dials/algorithms/background/modeller.h>
+#include <dials/algorithms/background/pixel_statistics.h>
 
 namespace dials { namespace algorithms { namespace background {
   namespace boost_python {
 
   using namespace boost::python;
 
+  struct PixelStatisticsPickleSuite : boost::python::pickle_suite {
+    static
+    boost::python::tuple getinitargs(const PixelStatistics &obj)
+    {
+      return boost::python::make_tuple(
+          obj.num_images(),
+          obj.num_valid(),
+          obj.num_strong(),
+          obj.num(),
+          obj.mean(1),
+          obj.m2(),
+          obj.min(),
+          obj.max());
+    }
+  };
+
   BOOST_PYTHON_MODULE(dials_algorithms_background_modeller_ext)
   {
     class_<BackgroundStatistics>("BackgroundStatistics", no_init)
@@ -40,6 +57,41 @@ namespace dials { namespace algorithms { namespace background {
       .def("__iadd__", &MultiPanelBackgroundStatistics::operator+=)
       ;
 
+    class_<PixelStatistics>("PixelStatistics", no_init)
+      .def(init< std::size_t, std::size_t >((
+              arg("height"),
+              arg("width"))))
+      .def(init<
+          std::size_t,
+          const PixelStatistics::int_image&,
+          const PixelStatistics::int_image&,
+          const PixelStatistics::int_image&,
+          const PixelStatistics::double_image&,
+          const PixelStatistics::double_image&,
+          const PixelStatistics::double_image&,
+          const PixelStatistics::double_image&>())
+      .def("add", &PixelStatistics::add, (
+            arg("data"),
+            arg("mask"),
+            arg("strong")))
+      .def("__iadd__", &PixelStatistics::operator+=)
+      .def("num_images", &PixelStatistics::num_images)
+      .def("num_valid", &PixelStatistics::num_valid)
+      .def("num_strong", &PixelStatistics::num_strong)
+      .def("num", &PixelStatistics::num)
+      .def("m2", &PixelStatistics::m2)
+      .def("min", &PixelStatistics::min)
+      .def("max", &PixelStatistics::max)
+      .def("mean", &PixelStatistics::mean)
+      .def("variance", &PixelStatistics::variance)
+      .def("dispersion", &PixelStatistics::dispersion)
+      .def("mask", &PixelStatistics::mask)
+      .def("hot_pixel_mask", &PixelStatistics::hot_pixel_mask, (
+            arg("min_images"),
+            arg("fraction")=1.0))
+      .def_pickle(PixelStatisticsPickleSuite())
+      ;
+
   }
 
 }}}} // namespace = dials::algorithms::background::boost_python
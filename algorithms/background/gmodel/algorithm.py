@@ -11,10 +11,63 @@
 
 from __future__ import absolute_import, division
 
+# The magic bytes at the start of a memory mapped background model file
+MAPPED_MODEL_MAGIC = b'DIALSBGM'
+
+
+def write_mapped_model(model, filename):
+  '''
+  Write a background model in the flat binary layout read by the
+  MemoryMappedBackgroundModel class. See mapped_model.h for the layout.
+
+  :param model: The background model
+  :param filename: The output filename
+
+  '''
+  import struct
+  import zlib
+  header_size = 24
+  panel_header_size = 32
+  data = [model.data(i) for i in range(len(model))]
+  table = []
+  offset = header_size + panel_header_size * len(data)
+  for d in data:
+    offset += -offset % 8
+    height, width = d.all()
+    table.append((height, width, offset))
+    offset += height * width * 8
+  with open(filename, 'wb') as outfile:
+    outfile.write(MAPPED_MODEL_MAGIC)
+    outfile.write(struct.pack('<IIQ', 1, 0x01020304, len(data)))
+    blocks = []
+    for (height, width, offset), d in zip(table, data):
+      block = d.as_1d().copy_to_byte_str()
+      assert len(block) == height * width * 8
+      checksum = zlib.crc32(block) & 0xffffffff
+      outfile.write(struct.pack('<QQQQ', height, width, offset, checksum))
+      blocks.append(block)
+    for (height, width, offset), block in zip(table, blocks):
+      outfile.write(b'\0' * (offset - outfile.tell()))
+      outfile.write(block)
+
+
+def is_mapped_model(filename):
+  '''
+  Check if the file is a memory mapped background model
+
+  '''
+  with open(filename, 'rb') as infile:
+    return infile.read(len(MAPPED_MODEL_MAGIC)) == MAPPED_MODEL_MAGIC
+
+
 class ModelCache(object):
   '''
   A class to cache the model
 
+  Models in the flat binary layout are memory mapped read only so that every
+  process using the same file shares a single copy of the data. Pickled
+  models are loaded into memory in each process.
+
   '''
   def __init__(self):
     '''
@@ -33,10 +86,14 @@ def get(self, name):
     try:
       model = self.model[name]
     except KeyError:
-      import six.moves.cPickle as pickle
-      with open(name, 'rb') as infile:
-        model = pickle.load(infile)
-        self.model[name] = model
+      if is_mapped_model(name):
+        from dials.algorithms.background.gmodel import MemoryMappedBackgroundModel
+        model = MemoryMappedBackgroundModel(name)
+      else:
+        import six.moves.cPickle as pickle
+        with open(name, 'rb') as infile:
+          model = pickle.load(infile)
+      self.model[name] = model
     return model
 
 
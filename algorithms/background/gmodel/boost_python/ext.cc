@@ -12,6 +12,7 @@
 #include <boost/python/def.hpp>
 #include <dials/algorithms/background/gmodel/creator.h>
 #include <dials/algorithms/background/gmodel/model.h>
+#include <dials/algorithms/background/gmodel/mapped_model.h>
 #include <dials/algorithms/background/gmodel/polar_transform.h>
 
 
@@ -44,6 +45,14 @@ namespace dials { namespace algorithms { namespace background {
     }
   };
 
+  struct MemoryMappedBackgroundModelPickleSuite : boost::python::pickle_suite {
+    static
+    boost::python::tuple getinitargs(const MemoryMappedBackgroundModel &obj)
+    {
+      return boost::python::make_tuple(obj.filename());
+    }
+  };
+
   BOOST_PYTHON_MODULE(dials_algorithms_background_gmodel_ext)
   {
     class_<PolarTransformResult>("PolarTransfrormResult", no_init)
@@ -75,6 +84,18 @@ namespace dials { namespace algorithms { namespace background {
       .def_pickle(StaticBackgroundModelPickleSuite())
       ;
 
+    class_< MemoryMappedBackgroundModel,
+            bases<BackgroundModel>,
+            boost::shared_ptr<MemoryMappedBackgroundModel>,
+            boost::noncopyable >("MemoryMappedBackgroundModel", no_init)
+      .def(init<std::string>((arg("filename"))))
+      .def("__len__", &MemoryMappedBackgroundModel::size)
+      .def("data", &MemoryMappedBackgroundModel::data)
+      .def("filename", &MemoryMappedBackgroundModel::filename)
+      .def("verify_all", &MemoryMappedBackgroundModel::verify_all)
+      .def_pickle(MemoryMappedBackgroundModelPickleSuite())
+      ;
+
     class_<GModelBackgroundCreator> creator("Creator", no_init);
     creator
       .def(init<
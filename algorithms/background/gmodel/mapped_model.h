@@ -0,0 +1,201 @@
+/*
+ * mapped_model.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+
+#ifndef DIALS_ALGORITHMS_BACKGROUND_GMODEL_MAPPED_MODEL_H
+#define DIALS_ALGORITHMS_BACKGROUND_GMODEL_MAPPED_MODEL_H
+
+#include <cstring>
+#include <string>
+#include <vector>
+#include <boost/crc.hpp>
+#include <boost/cstdint.hpp>
+#include <boost/interprocess/file_mapping.hpp>
+#include <boost/interprocess/mapped_region.hpp>
+#include <boost/shared_ptr.hpp>
+#include <boost/thread/mutex.hpp>
+#include <dials/algorithms/background/gmodel/model.h>
+#include <dials/error.h>
+
+namespace dials { namespace algorithms {
+
+  /**
+   * A static background model read from a flat binary file which is memory
+   * mapped read only. The pages of the file are shared between all processes
+   * which map the same file (whether forked or started independently) and
+   * are only read from disk when a panel is first accessed.
+   *
+   * The file layout (all integers little endian) is:
+   *
+   *  char[8]   magic "DIALSBGM"
+   *  uint32    version (1)
+   *  uint32    byte order mark (0x01020304)
+   *  uint64    number of panels
+   *  for each panel:
+   *    uint64  height
+   *    uint64  width
+   *    uint64  offset of the data from the start of the file
+   *    uint64  CRC-32 of the data
+   *  for each panel:
+   *    double  data[height * width] (8 byte aligned)
+   *
+   * The checksum of each panel is verified the first time the panel is used.
+   */
+  class MemoryMappedBackgroundModel : public BackgroundModel {
+  public:
+
+    /**
+     * Map the model file
+     * @param filename The model filename
+     */
+    MemoryMappedBackgroundModel(const std::string &filename)
+      : filename_(filename),
+        file_(filename.c_str(), boost::interprocess::read_only),
+        region_(file_, boost::interprocess::read_only),
+        mutex_(new boost::mutex()) {
+      const char *base = static_cast<const char*>(region_.get_address());
+      std::size_t length = region_.get_size();
+
+      // Check the header
+      DIALS_ASSERT(length >= header_size());
+      DIALS_ASSERT(std::memcmp(base, "DIALSBGM", 8) == 0);
+      DIALS_ASSERT(read<boost::uint32_t>(base + 8) == 1);
+      DIALS_ASSERT(read<boost::uint32_t>(base + 12) == 0x01020304);
+      std::size_t npanels = read<boost::uint64_t>(base + 16);
+      DIALS_ASSERT(length >= header_size() + npanels * panel_header_size());
+
+      // Read the panel table
+      for (std::size_t i = 0; i < npanels; ++i) {
+        const char *entry = base + header_size() + i * panel_header_size();
+        std::size_t height = read<boost::uint64_t>(entry);
+        std::size_t width = read<boost::uint64_t>(entry + 8);
+        std::size_t offset = read<boost::uint64_t>(entry + 16);
+        DIALS_ASSERT(offset % sizeof(double) == 0);
+        DIALS_ASSERT(offset + height * width * sizeof(double) <= length);
+        accessor_.push_back(af::c_grid<2>(height, width));
+        data_.push_back(reinterpret_cast<const double*>(base + offset));
+        checksum_.push_back(read<boost::uint64_t>(entry + 24));
+        verified_.push_back(false);
+      }
+    }
+
+    /**
+     * Extract a shoebox
+     * @param panel The panel number
+     * @param bbox The bounding box
+     * @returns The model data
+     */
+    virtual
+    af::versa< double, af::c_grid<3> > extract(std::size_t panel, int6 bbox) const {
+      DIALS_ASSERT(panel < size());
+      DIALS_ASSERT(bbox[1] > bbox[0]);
+      DIALS_ASSERT(bbox[3] > bbox[2]);
+      DIALS_ASSERT(bbox[5] > bbox[4]);
+      verify(panel);
+      af::c_grid<3> grid(
+          bbox[5]-bbox[4],
+          bbox[3]-bbox[2],
+          bbox[1]-bbox[0]);
+      af::versa< double, af::c_grid<3> > result(grid, 0);
+      af::const_ref< double, af::c_grid<2> > data(data_[panel], accessor_[panel]);
+      for (std::size_t j = 0; j < result.accessor()[1]; ++j) {
+        for (std::size_t i = 0; i < result.accessor()[2]; ++i) {
+          int ii = bbox[0] + i;
+          int jj = bbox[2] + j;
+          if (ii >= 0 &&
+              jj >= 0 &&
+              ii < data.accessor()[1] &&
+              jj < data.accessor()[0]) {
+            double value = data(jj,ii);
+            for (std::size_t k = 0; k < result.accessor()[0]; ++k) {
+              result(k,j,i) = value;
+            }
+          }
+        }
+      }
+      return result;
+    }
+
+    /**
+     * The number of panels
+     */
+    std::size_t size() const {
+      return data_.size();
+    }
+
+    /**
+     * Get a copy of the data array
+     * @returns The data array
+     */
+    af::versa< double, af::c_grid<2> > data(std::size_t panel) const {
+      DIALS_ASSERT(panel < size());
+      verify(panel);
+      af::versa< double, af::c_grid<2> > result(accessor_[panel]);
+      std::copy(data_[panel], data_[panel] + result.size(), result.begin());
+      return result;
+    }
+
+    /**
+     * @returns The filename
+     */
+    std::string filename() const {
+      return filename_;
+    }
+
+    /**
+     * Verify the checksum of every panel
+     */
+    void verify_all() const {
+      for (std::size_t i = 0; i < size(); ++i) {
+        verify(i);
+      }
+    }
+
+  protected:
+
+    template <typename T>
+    static T read(const char *ptr) {
+      T value;
+      std::memcpy(&value, ptr, sizeof(T));
+      return value;
+    }
+
+    static std::size_t header_size() {
+      return 24;
+    }
+
+    static std::size_t panel_header_size() {
+      return 32;
+    }
+
+    /**
+     * Verify the checksum of a panel the first time it is used
+     */
+    void verify(std::size_t panel) const {
+      boost::lock_guard<boost::mutex> guard(*mutex_);
+      if (!verified_[panel]) {
+        boost::crc_32_type crc;
+        crc.process_bytes(
+            data_[panel],
+            accessor_[panel].size_1d() * sizeof(double));
+        DIALS_ASSERT(crc.checksum() == checksum_[panel]);
+        verified_[panel] = true;
+      }
+    }
+
+    std::string filename_;
+    boost::interprocess::file_mapping file_;
+    boost::interprocess::mapped_region region_;
+    std::vector< af::c_grid<2> > accessor_;
+    std::vector< const double* > data_;
+    std::vector< boost::uint64_t > checksum_;
+    mutable std::vector< bool > verified_;
+    boost::shared_ptr< boost::mutex > mutex_;
+  };
+
+}} // namespace dials::algorithms
+
+#endif // DIALS_ALGORITHMS_BACKGROUND_GMODEL_MAPPED_MODEL_H
@@ -0,0 +1,284 @@
+/*
+ * pixel_statistics.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_ALGORITHMS_BACKGROUND_PIXEL_STATISTICS_H
+#define DIALS_ALGORITHMS_BACKGROUND_PIXEL_STATISTICS_H
+
+#include <algorithm>
+#include <dials/array_family/scitbx_shared_and_versa.h>
+#include <dials/error.h>
+
+namespace dials { namespace algorithms {
+
+  /**
+   * A class to accumulate per pixel statistics over a sequence of images in a
+   * single pass. For each pixel, the number of images on which the pixel was
+   * valid and the number on which it was strong are counted. The minimum and
+   * maximum valid value are recorded and the mean and variance of the
+   * background (valid and not strong) values are accumulated online using
+   * Welford's algorithm. Two sets of statistics accumulated over disjoint sets
+   * of images can be merged, so the images can be split between workers.
+   */
+  class PixelStatistics {
+  public:
+
+    typedef af::versa< double, af::c_grid<2> > double_image;
+    typedef af::versa< int, af::c_grid<2> > int_image;
+    typedef af::versa< bool, af::c_grid<2> > bool_image;
+
+    /**
+     * Initialize empty statistics for an image of the given size
+     * @param height The image height
+     * @param width The image width
+     */
+    PixelStatistics(std::size_t height, std::size_t width)
+      : accessor_(height, width),
+        num_images_(0),
+        num_valid_(accessor_, 0),
+        num_strong_(accessor_, 0),
+        num_(accessor_, 0),
+        mean_(accessor_, 0.0),
+        m2_(accessor_, 0.0),
+        min_(accessor_, 0.0),
+        max_(accessor_, 0.0) {}
+
+    /**
+     * Initialize from the accumulated state
+     */
+    PixelStatistics(
+          std::size_t num_images,
+          const int_image &num_valid,
+          const int_image &num_strong,
+          const int_image &num,
+          const double_image &mean,
+          const double_image &m2,
+          const double_image &min,
+          const double_image &max)
+      : accessor_(num_valid.accessor()),
+        num_images_(num_images),
+        num_valid_(num_valid),
+        num_strong_(num_strong),
+        num_(num),
+        mean_(mean),
+        m2_(m2),
+        min_(min),
+        max_(max) {
+      DIALS_ASSERT(num_strong.accessor().all_eq(accessor_));
+      DIALS_ASSERT(num.accessor().all_eq(accessor_));
+      DIALS_ASSERT(mean.accessor().all_eq(accessor_));
+      DIALS_ASSERT(m2.accessor().all_eq(accessor_));
+      DIALS_ASSERT(min.accessor().all_eq(accessor_));
+      DIALS_ASSERT(max.accessor().all_eq(accessor_));
+    }
+
+    /**
+     * Add an image to the statistics
+     * @param data The image data
+     * @param mask The image mask (true for valid pixels)
+     * @param strong The strong pixels (true for strong pixels)
+     */
+    void add(
+        const af::const_ref< double, af::c_grid<2> > &data,
+        const af::const_ref< bool, af::c_grid<2> > &mask,
+        const af::const_ref< bool, af::c_grid<2> > &strong) {
+      DIALS_ASSERT(data.accessor().all_eq(accessor_));
+      DIALS_ASSERT(mask.accessor().all_eq(accessor_));
+      DIALS_ASSERT(strong.accessor().all_eq(accessor_));
+      for (std::size_t i = 0; i < data.size(); ++i) {
+        if (!mask[i]) {
+          continue;
+        }
+        double d = data[i];
+        if (num_valid_[i] == 0) {
+          min_[i] = d;
+          max_[i] = d;
+        } else {
+          min_[i] = std::min(min_[i], d);
+          max_[i] = std::max(max_[i], d);
+        }
+        num_valid_[i] += 1;
+        if (strong[i]) {
+          num_strong_[i] += 1;
+          continue;
+        }
+        num_[i] += 1;
+        double delta = d - mean_[i];
+        mean_[i] += delta / num_[i];
+        m2_[i] += delta * (d - mean_[i]);
+      }
+      num_images_ += 1;
+    }
+
+    /**
+     * Merge the statistics from another object accumulated over a disjoint
+     * set of images.
+     * @param other The other object
+     */
+    PixelStatistics operator+=(const PixelStatistics &other) {
+      DIALS_ASSERT(accessor_.all_eq(other.accessor_));
+      for (std::size_t i = 0; i < num_.size(); ++i) {
+        if (other.num_valid_[i] > 0) {
+          if (num_valid_[i] == 0) {
+            min_[i] = other.min_[i];
+            max_[i] = other.max_[i];
+          } else {
+            min_[i] = std::min(min_[i], other.min_[i]);
+            max_[i] = std::max(max_[i], other.max_[i]);
+          }
+        }
+        num_valid_[i] += other.num_valid_[i];
+        num_strong_[i] += other.num_strong_[i];
+        int na = num_[i];
+        int nb = other.num_[i];
+        if (nb > 0) {
+          int n = na + nb;
+          double delta = other.mean_[i] - mean_[i];
+          mean_[i] += delta * nb / n;
+          m2_[i] += other.m2_[i] + delta * delta * ((double)na * nb / n);
+          num_[i] = n;
+        }
+      }
+      num_images_ += other.num_images_;
+      return *this;
+    }
+
+    /**
+     * @returns The number of images added
+     */
+    std::size_t num_images() const {
+      return num_images_;
+    }
+
+    /**
+     * @returns The number of images on which each pixel was valid
+     */
+    int_image num_valid() const {
+      return num_valid_;
+    }
+
+    /**
+     * @returns The number of images on which each pixel was strong
+     */
+    int_image num_strong() const {
+      return num_strong_;
+    }
+
+    /**
+     * @returns The number of background values at each pixel
+     */
+    int_image num() const {
+      return num_;
+    }
+
+    /**
+     * @returns The sum of squared deviations from the background mean
+     */
+    double_image m2() const {
+      return m2_;
+    }
+
+    /**
+     * @returns The minimum valid value at each pixel
+     */
+    double_image min() const {
+      return min_;
+    }
+
+    /**
+     * @returns The maximum valid value at each pixel
+     */
+    double_image max() const {
+      return max_;
+    }
+
+    /**
+     * @returns The background mean at each pixel
+     */
+    double_image mean(std::size_t min_images) const {
+      DIALS_ASSERT(min_images > 0);
+      double_image result(accessor_, 0.0);
+      for (std::size_t i = 0; i < result.size(); ++i) {
+        if (num_[i] >= min_images) {
+          result[i] = mean_[i];
+        }
+      }
+      return result;
+    }
+
+    /**
+     * @returns The background variance at each pixel
+     */
+    double_image variance(std::size_t min_images) const {
+      DIALS_ASSERT(min_images > 0);
+      double_image result(accessor_, 0.0);
+      for (std::size_t i = 0; i < result.size(); ++i) {
+        if (num_[i] >= min_images) {
+          result[i] = m2_[i] / num_[i];
+        }
+      }
+      return result;
+    }
+
+    /**
+     * @returns The background index of dispersion at each pixel
+     */
+    double_image dispersion(std::size_t min_images) const {
+      DIALS_ASSERT(min_images > 0);
+      double_image result(accessor_, 0.0);
+      for (std::size_t i = 0; i < result.size(); ++i) {
+        if (num_[i] >= min_images && mean_[i] > 0) {
+          result[i] = (m2_[i] / num_[i]) / mean_[i];
+        }
+      }
+      return result;
+    }
+
+    /**
+     * @returns The pixels with at least min_images background values
+     */
+    bool_image mask(std::size_t min_images) const {
+      DIALS_ASSERT(min_images > 0);
+      bool_image result(accessor_, false);
+      for (std::size_t i = 0; i < result.size(); ++i) {
+        result[i] = num_[i] >= min_images;
+      }
+      return result;
+    }
+
+    /**
+     * A pixel is hot if it was valid on at least min_images images and was
+     * strong on at least the given fraction of them.
+     * @returns The hot pixel mask (false for hot pixels)
+     */
+    bool_image hot_pixel_mask(std::size_t min_images, double fraction) const {
+      DIALS_ASSERT(min_images > 0);
+      DIALS_ASSERT(fraction > 0 && fraction <= 1);
+      bool_image result(accessor_, true);
+      for (std::size_t i = 0; i < result.size(); ++i) {
+        if (num_valid_[i] >= min_images &&
+            num_strong_[i] >= fraction * num_valid_[i]) {
+          result[i] = false;
+        }
+      }
+      return result;
+    }
+
+  private:
+
+    af::c_grid<2> accessor_;
+    std::size_t num_images_;
+    int_image num_valid_;
+    int_image num_strong_;
+    int_image num_;
+    double_image mean_;
+    double_image m2_;
+    double_image min_;
+    double_image max_;
+  };
+
+}}
+
+#endif // DIALS_ALGORITHMS_BACKGROUND_PIXEL_STATISTICS_H
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+#
+# pixel_statistics.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PixelStatisticsResult(object):
+  '''
+  The per pixel statistics for each panel accumulated over a set of images.
+
+  Results computed over disjoint sets of images can be merged with +=, and the
+  result can be pickled so that an interrupted calculation can be resumed
+  from a checkpoint.
+
+  '''
+
+  def __init__(self, statistics, indices):
+    '''
+    Initialise the result
+
+    :param statistics: The list of PixelStatistics, one per panel
+    :param indices: The set of image indices processed
+
+    '''
+    self.statistics = statistics
+    self.indices = set(indices)
+
+  def __iadd__(self, other):
+    '''
+    Merge the result from another set of images
+
+    '''
+    assert len(self.statistics) == len(other.statistics), "Inconsistent size"
+    assert len(self.indices & other.indices) == 0, "Images processed twice"
+    for i in range(len(self.statistics)):
+      self.statistics[i] += other.statistics[i]
+    self.indices.update(other.indices)
+    return self
+
+  def __len__(self):
+    return len(self.statistics)
+
+  def hot_pixel_mask(self, min_images=10, fraction=1.0):
+    '''
+    Compute the hot pixel mask. A pixel is flagged as hot if it is strong on
+    at least the given fraction of the images on which it is valid.
+
+    :param min_images: The minimum number of valid images for a pixel
+    :param fraction: The fraction of images on which a pixel must be strong
+    :return: A tuple of masks (False for hot pixels)
+
+    '''
+    return tuple(s.hot_pixel_mask(min_images, fraction)
+                 for s in self.statistics)
+
+  def gain_map(self, min_images=10):
+    '''
+    Compute the per pixel gain as the index of dispersion of the background.
+
+    :param min_images: The minimum number of background values for a pixel
+    :return: A tuple of gain maps (zero where unknown)
+
+    '''
+    return tuple(s.dispersion(min_images) for s in self.statistics)
+
+  def gain(self, min_images=10):
+    '''
+    Estimate a single gain value for the detector as the median of the inlying
+    per pixel gain values.
+
+    :param min_images: The minimum number of background values for a pixel
+    :return: The gain
+
+    '''
+    from dials.array_family import flex
+    from libtbx.math_utils import nearest_integer as nint
+    dispersion = flex.double()
+    for s in self.statistics:
+      d = s.dispersion(min_images).as_1d()
+      dispersion.extend(d.select(s.mask(min_images).as_1d()))
+    if len(dispersion) == 0:
+      raise RuntimeError('No pixels with at least %d images' % min_images)
+
+    # Clamp the indices so that short arrays don't index past the end
+    def quantile(data, fraction):
+      return data[min(nint(len(data) * fraction), len(data) - 1)]
+
+    dispersion = flex.sorted(dispersion)
+    q1 = quantile(dispersion, 0.25)
+    q3 = quantile(dispersion, 0.75)
+    iqr = q3 - q1
+    inliers = dispersion.select(
+      (dispersion > (q1 - 1.5 * iqr)) & (dispersion < (q3 + 1.5 * iqr)))
+    if len(inliers) == 0:
+      inliers = dispersion
+    return quantile(inliers, 0.5)
+
+  def background_model(self, min_images=10):
+    '''
+    Create a static background model from the mean of the background pixels
+    which can be used as a prior for the gmodel background algorithm.
+
+    :param min_images: The minimum number of background values for a pixel
+    :return: The StaticBackgroundModel
+
+    '''
+    from dials.algorithms.background.gmodel import StaticBackgroundModel
+    model = StaticBackgroundModel()
+    for s in self.statistics:
+      model.add(s.mean(min_images))
+    return model
+
+  def as_pickle(self, filename):
+    '''
+    Save the result as a checkpoint
+
+    '''
+    import six.moves.cPickle as pickle
+    with open(filename, 'wb') as outfile:
+      pickle.dump(self, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+  @staticmethod
+  def from_pickle(filename):
+    '''
+    Load a result from a checkpoint
+
+    '''
+    import six.moves.cPickle as pickle
+    with open(filename, 'rb') as infile:
+      return pickle.load(infile)
+
+
+class PixelStatisticsTask(object):
+  '''
+  Accumulate the statistics over a block of images. This is a class so that
+  it can be pickled and run in a separate process.
+
+  '''
+
+  def __init__(self, imageset, threshold_function, mask=None):
+    '''
+    Initialise the task
+
+    :param imageset: The imageset
+    :param threshold_function: The spot finder threshold algorithm
+    :param mask: An additional mask to apply to each image
+
+    '''
+    self.imageset = imageset
+    self.threshold_function = threshold_function
+    self.mask = mask
+
+  def __call__(self, indices):
+    '''
+    Process the block of images
+
+    :param indices: The image indices to process
+    :return: The PixelStatisticsResult
+
+    '''
+    from dials.algorithms.background.modeller import PixelStatistics
+
+    # Parallel reading of HDF5 from the same handle is not allowed
+    if self.imageset.reader().is_single_file_reader():
+      self.imageset.reader().nullify_format_instance()
+
+    statistics = []
+    for panel in self.imageset.get_detector():
+      width, height = panel.get_image_size()
+      statistics.append(PixelStatistics(height, width))
+
+    for index in indices:
+      image = self.imageset.get_raw_data(index)
+      mask = self.imageset.get_mask(index)
+      if self.mask is not None:
+        assert len(self.mask) == len(mask)
+        mask = tuple(m1 & m2 for m1, m2 in zip(mask, self.mask))
+      for stats, im, mk in zip(statistics, image, mask):
+        im = im.as_double()
+        stats.add(im, mk, self.threshold_function.compute_threshold(im, mk))
+    return PixelStatisticsResult(statistics, indices)
+
+
+class PixelStatisticsEngine(object):
+  '''
+  A class to compute per pixel statistics over an imageset in a single read of
+  the data. The images are split into contiguous blocks which are processed in
+  parallel and the results merged.
+
+  '''
+
+  def __init__(self,
+               threshold_function=None,
+               mask=None,
+               nproc=1,
+               block_size=None,
+               checkpoint=None):
+    '''
+    Initialise the engine
+
+    :param threshold_function: The spot finder threshold algorithm
+    :param mask: An additional mask to apply to each image
+    :param nproc: The number of processes
+    :param block_size: The number of images per block
+    :param checkpoint: A checkpoint file to resume from and save to
+
+    '''
+    if threshold_function is None:
+      from dials.algorithms.spot_finding.factory import SpotFinderFactory
+      from dials.algorithms.spot_finding.factory import phil_scope
+      threshold_function = SpotFinderFactory.configure_threshold(
+        phil_scope.extract(), None)
+    self.threshold_function = threshold_function
+    self.mask = mask
+    self.nproc = nproc
+    self.block_size = block_size
+    self.checkpoint = checkpoint
+
+  def __call__(self, imageset):
+    '''
+    Compute the statistics
+
+    :param imageset: The imageset to process
+    :return: The PixelStatisticsResult
+
+    '''
+    from dials.util.mp import parallel_map
+    from math import ceil
+    import os
+
+    # Resume from the checkpoint if given
+    result = None
+    done = set()
+    if self.checkpoint is not None and os.path.exists(self.checkpoint):
+      result = PixelStatisticsResult.from_pickle(self.checkpoint)
+      assert len(result) == len(imageset.get_detector()), "Invalid checkpoint"
+      done = result.indices
+      logger.info('Resuming from checkpoint with %d images processed' % len(done))
+
+    # Split the images into blocks
+    indices = [i for i in range(len(imageset)) if i not in done]
+    if len(indices) == 0:
+      return result
+    nproc = max(1, min(self.nproc, len(indices)))
+    block_size = self.block_size
+    if block_size is None:
+      block_size = int(ceil(len(indices) / nproc))
+    blocks = [indices[i:i+block_size] for i in range(0, len(indices), block_size)]
+    logger.info('Computing pixel statistics for %d images in %d blocks using %d processes' % (
+      len(indices), len(blocks), nproc))
+
+    # Process the blocks, merging the results as they arrive
+    task = PixelStatisticsTask(imageset, self.threshold_function, self.mask)
+    results = [result]
+    def accumulate(block_result):
+      if results[0] is None:
+        results[0] = block_result
+      else:
+        results[0] += block_result
+      if self.checkpoint is not None:
+        results[0].as_pickle(self.checkpoint)
+    if nproc > 1:
+      parallel_map(
+        func      = task,
+        iterable  = blocks,
+        processes = nproc,
+        callback  = accumulate,
+        preserve_order = False)
+    else:
+      for block in blocks:
+        accumulate(task(block))
+    return results[0]
@@ -30,6 +30,12 @@ namespace dials { namespace algorithms { namespace boost_python {
       (arg("grid"), arg("reciprocal_space_vectors"),
        arg("selection"), arg("d_min"), arg("b_iso")=0));
 
+    def("fft3d_real_part_squared", &fft3d_real_part_squared,
+      (arg("grid"), arg("nthreads")=1));
+
+    def("fft3d_peak_mask", &fft3d_peak_mask,
+      (arg("grid"), arg("rmsd_cutoff")));
+
   }
 
 }
@@ -56,11 +56,19 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("crystal_ids", &w_t::crystal_ids);
   }
 
+  void export_count_indexed() {
+    def("count_indexed", &count_indexed, (
+      arg("reciprocal_space_points"),
+      arg("UB_matrices"),
+      arg("tolerance") = 0.3));
+  }
+
   BOOST_PYTHON_MODULE(dials_algorithms_indexing_ext)
   {
     export_fft3d();
     export_assign_indices();
     export_assign_indices_local();
+    export_count_indexed();
   }
 
 }}} // namespace = dials::algorithms::boost_python
@@ -11,6 +11,7 @@
 #ifndef DIALS_ALGORITHMS_INTEGRATION_FFT3D_H
 #define DIALS_ALGORITHMS_INTEGRATION_FFT3D_H
 #include <stdio.h>
+#include <algorithm>
 #include <iostream>
 #include <cmath>
 #include <scitbx/vec2.h>
@@ -18,6 +19,12 @@
 #include <scitbx/math/utils.h>
 
 #include <cstdlib>
+#include <complex>
+#include <vector>
+#include <boost/bind.hpp>
+#include <boost/thread.hpp>
+#include <scitbx/fftpack/complex_to_complex.h>
+#include <scitbx/fftpack/real_to_complex.h>
 #include <scitbx/array_family/versa_matrix.h>
 #include <dials/array_family/scitbx_shared_and_versa.h>
 #include <dials/algorithms/spot_prediction/rotation_angles.h>
@@ -220,6 +227,191 @@ namespace dials { namespace algorithms {
   }
 
 
+  /**
+   * Split the range [0, n) into nthreads contiguous blocks and call the
+   * function on each block in a separate thread.
+   */
+  template <typename Function>
+  void parallel_for_blocks(std::size_t n, std::size_t nthreads, Function f) {
+    nthreads = std::max((std::size_t)1, std::min(nthreads, n));
+    if (nthreads == 1) {
+      f(0, n);
+      return;
+    }
+    boost::thread_group threads;
+    for (std::size_t t = 0; t < nthreads; ++t) {
+      threads.create_thread(
+          boost::bind<void>(f, t * n / nthreads, (t + 1) * n / nthreads));
+    }
+    threads.join_all();
+  }
+
+  /**
+   * Helper classes for fft3d_real_part_squared. Each transforms a block of
+   * 1D lines of the half complex work array with its own FFT object (the
+   * scitbx FFT objects have internal scratch space so cannot be shared
+   * between threads).
+   */
+  namespace detail {
+
+    typedef std::complex<double> complex_type;
+
+    // Real to complex transform along the fastest varying dimension
+    struct fft3d_pass_k {
+      const double *grid;
+      complex_type *work;
+      std::size_t n2, h;
+      void operator()(std::size_t begin, std::size_t end) const {
+        scitbx::fftpack::real_to_complex<double> fft(n2);
+        std::vector<double> buffer(fft.m_real());
+        for (std::size_t line = begin; line < end; ++line) {
+          std::copy(grid + line * n2, grid + (line + 1) * n2, buffer.begin());
+          fft.forward(&buffer[0]);
+          for (std::size_t k = 0; k < h; ++k) {
+            work[line * h + k] = complex_type(buffer[2*k], buffer[2*k+1]);
+          }
+        }
+      }
+    };
+
+    // Complex to complex transform along the middle dimension
+    struct fft3d_pass_j {
+      complex_type *work;
+      std::size_t n1, h;
+      void operator()(std::size_t begin, std::size_t end) const {
+        scitbx::fftpack::complex_to_complex<double> fft(n1);
+        std::vector<complex_type> buffer(n1);
+        for (std::size_t i = begin; i < end; ++i) {
+          for (std::size_t k = 0; k < h; ++k) {
+            for (std::size_t j = 0; j < n1; ++j) {
+              buffer[j] = work[(i * n1 + j) * h + k];
+            }
+            fft.forward(&buffer[0]);
+            for (std::size_t j = 0; j < n1; ++j) {
+              work[(i * n1 + j) * h + k] = buffer[j];
+            }
+          }
+        }
+      }
+    };
+
+    // Complex to complex transform along the slowest varying dimension
+    struct fft3d_pass_i {
+      complex_type *work;
+      std::size_t n0, n1, h;
+      void operator()(std::size_t begin, std::size_t end) const {
+        scitbx::fftpack::complex_to_complex<double> fft(n0);
+        std::vector<complex_type> buffer(n0);
+        for (std::size_t j = begin; j < end; ++j) {
+          for (std::size_t k = 0; k < h; ++k) {
+            for (std::size_t i = 0; i < n0; ++i) {
+              buffer[i] = work[(i * n1 + j) * h + k];
+            }
+            fft.forward(&buffer[0]);
+            for (std::size_t i = 0; i < n0; ++i) {
+              work[(i * n1 + j) * h + k] = buffer[i];
+            }
+          }
+        }
+      }
+    };
+
+    // Expand the half complex array to the full grid using the hermitian
+    // symmetry F(-h) = conj(F(h)) and store the squared real part
+    struct fft3d_expand {
+      double *grid;
+      const complex_type *work;
+      std::size_t n0, n1, n2, h;
+      void operator()(std::size_t begin, std::size_t end) const {
+        for (std::size_t i = begin; i < end; ++i) {
+          std::size_t ii = (n0 - i) % n0;
+          for (std::size_t j = 0; j < n1; ++j) {
+            std::size_t jj = (n1 - j) % n1;
+            double *row = grid + (i * n1 + j) * n2;
+            for (std::size_t k = 0; k < n2; ++k) {
+              double value = (k < h)
+                ? work[(i * n1 + j) * h + k].real()
+                : work[(ii * n1 + jj) * h + (n2 - k)].real();
+              row[k] = value * value;
+            }
+          }
+        }
+      }
+    };
+
+  }
+
+  /**
+   * Compute the squared real part of the forward 3D FFT of a real grid and
+   * store it in place of the input. Since the input is real only half of
+   * the transform is computed (a real to complex transform along the
+   * fastest varying dimension followed by complex to complex transforms
+   * along the other two) and the full grid is recovered from the hermitian
+   * symmetry. The 1D transforms are distributed between threads. The only
+   * additional memory used is the half complex work array, which is the
+   * same size as the input grid.
+   * @param grid The real grid, overwritten with the result
+   * @param nthreads The number of threads to use
+   */
+  inline
+  void fft3d_real_part_squared(
+      af::ref<double, af::c_grid<3> > const & grid,
+      std::size_t nthreads = 1) {
+    DIALS_ASSERT(nthreads > 0);
+    const std::size_t n0 = grid.accessor()[0];
+    const std::size_t n1 = grid.accessor()[1];
+    const std::size_t n2 = grid.accessor()[2];
+    DIALS_ASSERT(n0 > 0 && n1 > 0 && n2 > 0);
+    const std::size_t h = n2 / 2 + 1;
+    std::vector<detail::complex_type> work(n0 * n1 * h);
+
+    detail::fft3d_pass_k pass_k = { grid.begin(), &work[0], n2, h };
+    parallel_for_blocks(n0 * n1, nthreads, pass_k);
+
+    detail::fft3d_pass_j pass_j = { &work[0], n1, h };
+    parallel_for_blocks(n0, nthreads, pass_j);
+
+    detail::fft3d_pass_i pass_i = { &work[0], n0, n1, h };
+    parallel_for_blocks(n1, nthreads, pass_i);
+
+    detail::fft3d_expand expand = { grid.begin(), &work[0], n0, n1, n2, h };
+    parallel_for_blocks(n0, nthreads, expand);
+  }
+
+  /**
+   * Threshold the FFT map for the flood fill peak search without making a
+   * copy of the map. The mean and rms deviation are computed in two passes
+   * over the data and points above rmsd_cutoff * rmsd are set to 1 in the
+   * returned integer grid.
+   * @param grid The real space grid
+   * @param rmsd_cutoff The cutoff in multiples of the rms deviation
+   * @returns The binary grid
+   */
+  inline
+  af::versa<int, af::c_grid<3> > fft3d_peak_mask(
+      af::const_ref<double, af::c_grid<3> > const & grid,
+      double rmsd_cutoff) {
+    DIALS_ASSERT(grid.size() > 0);
+    double sum = 0;
+    for (std::size_t i = 0; i < grid.size(); ++i) {
+      sum += grid[i];
+    }
+    double mean = sum / grid.size();
+    double sum_sq = 0;
+    for (std::size_t i = 0; i < grid.size(); ++i) {
+      double d = grid[i] - mean;
+      sum_sq += d * d;
+    }
+    double cutoff = rmsd_cutoff * std::sqrt(sum_sq / grid.size());
+    af::versa<int, af::c_grid<3> > result(grid.accessor(), 0);
+    for (std::size_t i = 0; i < grid.size(); ++i) {
+      if (grid[i] >= cutoff && grid[i] > 0) {
+        result[i] = 1;
+      }
+    }
+    return result;
+  }
+
 }}
 
 #endif
@@ -70,7 +70,7 @@ def find_lattices(self):
     return experiments
 
   def map_centroids_to_reciprocal_space_grid(self):
-    d_min = self.params.fft3d.reciprocal_space_grid.d_min
+    d_min = self.fft_d_min
 
     n_points = self.gridding[0]
     rlgrid = 2 / (d_min * n_points)
@@ -100,7 +100,8 @@ def map_centroids_to_reciprocal_space_grid(self):
     self.reflections_used_for_indexing = reflections_used_for_indexing
 
   def fft(self):
-    if self.params.fft3d.reciprocal_space_grid.d_min is libtbx.Auto:
+    rs_grid = self.params.fft3d.reciprocal_space_grid
+    if rs_grid.d_min is libtbx.Auto:
       # rough calculation of suitable d_min based on max cell
       # see also Campbell, J. (1998). J. Appl. Cryst., 31(3), 407-413.
       # fft_cell should be greater than twice max_cell, so say:
@@ -113,17 +114,26 @@ def fft(self):
 
       max_cell = self.params.max_cell
       d_min = (
-        5 * max_cell / self.params.fft3d.reciprocal_space_grid.n_points)
+        5 * max_cell / rs_grid.n_points)
       d_spacings = 1/self.reflections['rlp'].norms()
-      self.params.fft3d.reciprocal_space_grid.d_min = max(
+      rs_grid.d_min = max(
         d_min, min(d_spacings))
-      logger.info("Setting d_min: %.2f" %self.params.fft3d.reciprocal_space_grid.d_min)
-    n_points = self.params.fft3d.reciprocal_space_grid.n_points
+      logger.info("Setting d_min: %.2f" %rs_grid.d_min)
+    n_points = rs_grid.n_points
+    self.fft_d_min = rs_grid.d_min
+    if rs_grid.adaptive:
+      # search for peaks on a coarse grid with the same real space cell and
+      # refine the peak positions against the reciprocal lattice points to
+      # the resolution of the full grid
+      n_coarse = max(int(round(n_points * rs_grid.coarse_fraction)), 2)
+      self.fft_d_min = rs_grid.d_min * n_points / n_coarse
+      n_points = n_coarse
+      logger.info("Adaptive gridding: coarse grid d_min: %.2f" %self.fft_d_min)
     self.gridding = fftpack.adjust_gridding_triple(
       (n_points,n_points,n_points), max_prime=5)
     n_points = self.gridding[0]
     self.map_centroids_to_reciprocal_space_grid()
-    self.d_min = self.params.fft3d.reciprocal_space_grid.d_min
+    self.d_min = rs_grid.d_min
 
     logger.info("Number of centroids used: %i" %(
       (self.reciprocal_space_grid>0).count(True)))
@@ -137,15 +147,12 @@ def fft(self):
     #(512**3)*8*2*bytes_to_gb
     #2.0
 
-    fft = fftpack.complex_to_complex_3d(self.gridding)
-    grid_complex = flex.complex_double(
-      reals=self.reciprocal_space_grid,
-      imags=flex.double(self.reciprocal_space_grid.size(), 0))
-    grid_transformed = fft.forward(grid_complex)
-    #self.grid_real = flex.pow2(flex.abs(grid_transformed))
-    self.grid_real = flex.pow2(flex.real(grid_transformed))
-    #self.grid_real = flex.pow2(flex.imag(self.grid_transformed))
-    del grid_transformed
+    # The input grid is real so only half the transform is computed and the
+    # grid is overwritten with the squared real part of the result
+    from dials.algorithms.indexing import fft3d_real_part_squared
+    self.grid_real = self.reciprocal_space_grid
+    del self.reciprocal_space_grid
+    fft3d_real_part_squared(self.grid_real, nthreads=self.params.nproc)
 
     if self.params.debug:
       self.debug_write_ccp4_map(map_data=self.grid_real, file_name="fft3d.map")
@@ -155,12 +162,9 @@ def fft(self):
       self.find_peaks_clean()
 
   def find_peaks(self):
-    grid_real_binary = self.grid_real.deep_copy()
-    rmsd = math.sqrt(
-      flex.mean(flex.pow2(grid_real_binary.as_1d()-flex.mean(grid_real_binary.as_1d()))))
-    grid_real_binary.set_selected(grid_real_binary < (self.params.rmsd_cutoff)*rmsd, 0)
-    grid_real_binary.as_1d().set_selected(grid_real_binary.as_1d() > 0, 1)
-    grid_real_binary = grid_real_binary.iround()
+    from dials.algorithms.indexing import fft3d_peak_mask
+    grid_real_binary = fft3d_peak_mask(
+      self.grid_real, rmsd_cutoff=self.params.rmsd_cutoff)
     from cctbx import masks
     flood_fill = masks.flood_fill(grid_real_binary, self.fft_cell)
     if flood_fill.n_voids() < 4:
@@ -182,12 +186,17 @@ def find_peaks(self):
       self.params.fft3d.peak_volume_cutoff * flex.max(
         grid_points_per_void.select(~outliers)))).iselection()
 
-    if self.params.optimise_initial_basis_vectors:
+    if (self.params.optimise_initial_basis_vectors or
+        self.params.fft3d.reciprocal_space_grid.adaptive):
       self.volumes = flood_fill.grid_points_per_void().select(isel)
       sites_cart = flood_fill.centres_of_mass_cart().select(isel)
-      sites_cart_optimised = optimise_basis_vectors(
-        self.reflections['rlp'].select(self.reflections_used_for_indexing),
-        sites_cart)
+      if self.params.fft3d.reciprocal_space_grid.adaptive:
+        # refine against the reciprocal lattice points to the full resolution
+        rlp = self.reflections['rlp'].select(self.reflections['id'] == -1)
+        rlp = rlp.select((1/rlp.norms()) >= self.d_min)
+      else:
+        rlp = self.reflections['rlp'].select(self.reflections_used_for_indexing)
+      sites_cart_optimised = optimise_basis_vectors(rlp, sites_cart)
 
       self.sites = self.fft_cell.fractionalize(sites_cart_optimised)
 
@@ -595,7 +604,7 @@ def find_peaks_clean(self):
     # doesn't seem to be any benefit to using more than say 8 threads
     num_threads = min(8, omptbx.omp_get_num_procs(), self.params.nproc)
     omptbx.omp_set_num_threads(num_threads)
-    d_min = self.params.fft3d.reciprocal_space_grid.d_min
+    d_min = self.fft_d_min
     rlgrid = 2 / (d_min * self.gridding[0])
 
     frame_number = self.reflections['xyzobs.px.value'].parts()[2]
@@ -620,12 +629,11 @@ def find_peaks_clean(self):
                         self.imagesets[0].get_goniometer().get_rotation_axis(),
                         rlgrid, d_min, self.params.b_iso)
 
-    fft = fftpack.complex_to_complex_3d(self.gridding)
-    grid_complex = flex.complex_double(
-      reals=grid,
-      imags=flex.double(grid.size(), 0))
-    grid_transformed = fft.forward(grid_complex)
-    grid_real = flex.pow2(flex.real(grid_transformed))
+    if self.params.debug:
+      self.debug_write_ccp4_map(grid, "sampling_volume.map")
+    from dials.algorithms.indexing import fft3d_real_part_squared
+    fft3d_real_part_squared(grid, nthreads=num_threads)
+    grid_real = grid
 
     gamma = 1
     peaks = flex.vec3_double()
@@ -653,7 +661,6 @@ def find_peaks_clean(self):
       #print p, peaks_frac[-1]
 
     if self.params.debug:
-      self.debug_write_ccp4_map(grid, "sampling_volume.map")
       self.debug_write_ccp4_map(grid_real, "sampling_volume_FFT.map")
       self.debug_write_ccp4_map(dirty_map, "clean.map")
 
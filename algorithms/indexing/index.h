@@ -153,6 +153,48 @@ namespace dials { namespace algorithms {
     af::shared<int> crystal_ids_;
   };
 
+  /**
+   * Count the number of reciprocal lattice points indexed by each of a set
+   * of candidate UB matrices in a single pass over the points. A point is
+   * indexed if the fractional miller index is within the tolerance of a non
+   * zero integer miller index. Unlike AssignIndices the candidates are
+   * scored independently and duplicate indices are not resolved.
+   * @param reciprocal_space_points The reciprocal lattice points
+   * @param UB_matrices The candidate UB matrices
+   * @param tolerance The maximum distance from an integer miller index
+   * @returns The number of indexed points for each candidate
+   */
+  inline
+  af::shared<std::size_t> count_indexed(
+      af::const_ref<scitbx::vec3<double> > const & reciprocal_space_points,
+      af::const_ref<scitbx::mat3<double> > const & UB_matrices,
+      double tolerance=0.3) {
+    DIALS_ASSERT(tolerance > 0);
+    std::vector<scitbx::mat3<double> > A_inv(UB_matrices.size());
+    for (std::size_t i = 0; i < UB_matrices.size(); ++i) {
+      A_inv[i] = UB_matrices[i].inverse();
+    }
+    double tolerance_sq = tolerance * tolerance;
+    af::shared<std::size_t> result(UB_matrices.size(), 0);
+    for (std::size_t i_ref = 0; i_ref < reciprocal_space_points.size(); ++i_ref) {
+      const scitbx::vec3<double> &rlp = reciprocal_space_points[i_ref];
+      for (std::size_t i = 0; i < A_inv.size(); ++i) {
+        scitbx::vec3<double> hkl_f = A_inv[i] * rlp;
+        scitbx::vec3<double> hkl_i;
+        for (std::size_t j = 0; j < 3; ++j) {
+          hkl_i[j] = scitbx::math::iround(hkl_f[j]);
+        }
+        if (hkl_i[0] == 0 && hkl_i[1] == 0 && hkl_i[2] == 0) {
+          continue;
+        }
+        if ((hkl_f - hkl_i).length_sq() <= tolerance_sq) {
+          result[i] += 1;
+        }
+      }
+    }
+    return result;
+  }
+
   typedef struct edge_ {
     std::size_t i;
     std::size_t j;
@@ -115,6 +115,16 @@
         .type = float(value_min=0)
         .help = "The high resolution limit in Angstrom for spots to include in "
                 "the initial indexing."
+      adaptive = False
+        .type = bool
+        .help = "Search for peaks on a coarse grid and then refine the peak "
+                "positions against the reciprocal lattice points to the "
+                "resolution of the full n_points grid."
+        .expert_level = 2
+      coarse_fraction = 0.5
+        .type = float(value_min=0, value_max=1)
+        .help = "The size of the coarse grid as a fraction of n_points."
+        .expert_level = 2
     }
   }
   sigma_phi_deg = None
@@ -170,6 +180,22 @@
       .expert_level = 1
     sys_absent_threshold = 0.9
       .type = float(value_min=0.0, value_max=1.0)
+    pre_screen
+      .expert_level = 2
+    {
+      top_k = None
+        .type = int(value_min=1)
+        .help = "Score all the candidate crystal models in a single pass over"
+                "the reciprocal lattice points and only prepare and refine the"
+                "top_k models that index the most reflections. Models with a"
+                "unit cell volume below min_cell_volume are rejected."
+      early_termination = None
+        .type = float(value_min=1)
+        .help = "Refine the candidate models in batches of nproc in order of"
+                "their pre-screen score and stop once the best refined"
+                "solution indexes more than this factor times the number of"
+                "reflections indexed by any remaining model in the pre-screen."
+    }
     solution_scorer = filter *weighted
       .type = choice
       .expert_level = 1
@@ -1405,35 +1431,37 @@ def run_one_refinement(args):
       params.refinement.reflections.outlier.tukey.iqr_multiplier = \
         2 * params.refinement.reflections.outlier.tukey.iqr_multiplier
 
-    args = []
-
     from dials.algorithms.indexing.compare_orientation_matrices \
          import difference_rotation_matrix_axis_angle
-    for cm in candidate_orientation_matrices:
-      sel = (self.reflections['id'] == -1)
-      if self.d_min is not None:
-        sel &= (1/self.reflections['rlp'].norms() > self.d_min)
-      xo, yo, zo = self.reflections['xyzobs.mm.value'].parts()
-      imageset_id = self.reflections['imageset_id']
+
+    # The reflections to use are the same for every candidate
+    sel = (self.reflections['id'] == -1)
+    if self.d_min is not None:
+      sel &= (1/self.reflections['rlp'].norms() > self.d_min)
+    xo, yo, zo = self.reflections['xyzobs.mm.value'].parts()
+    imageset_id = self.reflections['imageset_id']
+    for i_imageset, imageset in enumerate(self.imagesets):
+      scan = imageset.get_scan()
+      if scan is not None:
+        start, end = scan.get_oscillation_range()
+        if (end - start) > 360:
+          # only use reflections from the first 360 degrees of the scan
+          sel.set_selected(
+            (imageset_id == i_imageset) & (zo > ((start * math.pi/180) + 2 * math.pi)), False)
+
+    def prepare_one_refinement(cm):
       experiments = ExperimentList()
-      for i_imageset, imageset in enumerate(self.imagesets):
-        scan = imageset.get_scan()
-        if scan is not None:
-          start, end = scan.get_oscillation_range()
-          if (end - start) > 360:
-            # only use reflections from the first 360 degrees of the scan
-            sel.set_selected(
-              (imageset_id == i_imageset) & (zo > ((start * math.pi/180) + 2 * math.pi)), False)
+      for imageset in self.imagesets:
         experiments.append(Experiment(imageset=imageset,
                                       beam=imageset.get_beam(),
                                       detector=imageset.get_detector(),
                                       goniometer=imageset.get_goniometer(),
-                                      scan=scan,
+                                      scan=imageset.get_scan(),
                                       crystal=cm))
       refl = self.reflections.select(sel)
       self.index_reflections(experiments, refl)
       if refl.get_flags(refl.flags.indexed).count(True) == 0:
-        continue
+        return
 
       from rstbx.dps_core.cell_assessment import SmallUnitCellVolume
       threshold = self.params.basis_vector_combinations.sys_absent_threshold
@@ -1444,35 +1472,35 @@ def run_one_refinement(args):
         except SmallUnitCellVolume:
           logger.debug("correct_non_primitive_basis SmallUnitCellVolume error for unit cell %s:"
                        %experiments[0].crystal.get_unit_cell())
-          continue
+          return
         except RuntimeError as e:
           if 'Krivy-Gruber iteration limit exceeded' in str(e):
             logger.debug("correct_non_primitive_basis Krivy-Gruber iteration limit exceeded error for unit cell %s:"
                          %experiments[0].crystal.get_unit_cell())
-            continue
+            return
           raise
         if experiments[0].crystal.get_unit_cell().volume() < self.params.min_cell_volume:
-          continue
+          return
 
       if self.params.known_symmetry.space_group is not None:
         target_space_group = self.target_symmetry_primitive.space_group()
         new_crystal, cb_op_to_primitive = self.apply_symmetry(
           experiments[0].crystal, target_space_group)
         if new_crystal is None:
-          continue
+          return
         experiments[0].crystal.update(new_crystal)
         if not cb_op_to_primitive.is_identity_op():
-          sel = refl['id'] > -1
-          miller_indices = refl['miller_index'].select(sel)
+          indexed_sel = refl['id'] > -1
+          miller_indices = refl['miller_index'].select(indexed_sel)
           miller_indices = cb_op_to_primitive.apply(miller_indices)
-          refl['miller_index'].set_selected(sel, miller_indices)
+          refl['miller_index'].set_selected(indexed_sel, miller_indices)
         if 0 and self.cb_op_primitive_to_given is not None:
-          sel = refl['id'] > -1
+          indexed_sel = refl['id'] > -1
           experiments[0].crystal.update(
             experiments[0].crystal.change_basis(self.cb_op_primitive_to_given))
-          miller_indices = refl['miller_index'].select(sel)
+          miller_indices = refl['miller_index'].select(indexed_sel)
           miller_indices = self.cb_op_primitive_to_given.apply(miller_indices)
-          refl['miller_index'].set_selected(sel, miller_indices)
+          refl['miller_index'].set_selected(indexed_sel, miller_indices)
 
       if (self.refined_experiments is not None and
           len(self.refined_experiments) > 0):
@@ -1487,22 +1515,57 @@ def run_one_refinement(args):
             break
         if orientation_too_similar:
           logger.debug("skipping crystal: too similar to other crystals")
-          continue
-
-      args.append((params, refl, experiments))
+          return
+
+      return (params, refl, experiments)
+
+    # Optionally pre-screen the candidates and keep only the best top_k
+    pre_screen = self.params.basis_vector_combinations.pre_screen
+    candidates = list(candidate_orientation_matrices)
+    scores = None
+    if pre_screen.top_k is not None or pre_screen.early_termination is not None:
+      candidates, scores = self.pre_screen_candidate_orientation_matrices(
+        candidates, self.reflections.select(sel))
+      if pre_screen.top_k is not None:
+        candidates = candidates[:pre_screen.top_k]
+        scores = scores[:pre_screen.top_k]
+
+    # Refine all candidates together unless terminating early, in which case
+    # refine them in batches in order of their pre-screen score
+    if pre_screen.early_termination is not None:
+      batch_size = self.params.nproc
+    else:
+      batch_size = max(len(candidates), 1)
 
     from libtbx import easy_mp
-    results = easy_mp.parallel_map(
-      run_one_refinement,
-      args,
-      processes=self.params.nproc,
-      preserve_exception_message=True,
-    )
-
-    for soln in results:
-      if soln is None:
-        continue
-      solutions.append(soln)
+    for i_batch in range(0, len(candidates), batch_size):
+      args = []
+      for cm in candidates[i_batch:i_batch+batch_size]:
+        arg = prepare_one_refinement(cm)
+        if arg is not None:
+          args.append(arg)
+
+      results = easy_mp.parallel_map(
+        run_one_refinement,
+        args,
+        processes=self.params.nproc,
+        preserve_exception_message=True,
+      )
+
+      for soln in results:
+        if soln is None:
+          continue
+        solutions.append(soln)
+
+      remaining = scores[i_batch+batch_size:] if scores is not None else []
+      if (pre_screen.early_termination is not None and
+          len(solutions) and len(remaining)):
+        best_n_indexed = solutions.best_solution().n_indexed
+        if best_n_indexed > pre_screen.early_termination * max(remaining):
+          logger.debug(
+            "Best solution indexes %i reflections: skipping %i remaining candidates"
+            %(best_n_indexed, len(remaining)))
+          break
 
     if len(solutions):
       logger.info("Candidate solutions:")
@@ -1515,6 +1578,38 @@ def run_one_refinement(args):
     else:
       return None, None
 
+  def pre_screen_candidate_orientation_matrices(
+      self, candidate_orientation_matrices, reflections):
+    '''
+    Score all the candidate crystal models together by the number of
+    reflections each indexes, computed in a single pass over the reciprocal
+    lattice points, and reject models with an implausibly small unit cell.
+
+    :param candidate_orientation_matrices: The candidate crystal models
+    :param reflections: The reflections to index
+    :return: The accepted models sorted by decreasing score and their scores
+
+    '''
+    from dials.algorithms.indexing import count_indexed
+    if len(candidate_orientation_matrices) == 0:
+      return [], []
+    n_indexed = count_indexed(
+      reflections['rlp'],
+      flex.mat3_double([cm.get_A() for cm in candidate_orientation_matrices]),
+      tolerance=self.params.index_assignment.simple.hkl_tolerance)
+    accepted = []
+    for i, cm in enumerate(candidate_orientation_matrices):
+      if n_indexed[i] == 0:
+        continue
+      if cm.get_unit_cell().volume() < self.params.min_cell_volume:
+        continue
+      accepted.append(i)
+    accepted.sort(key=lambda i: n_indexed[i], reverse=True)
+    logger.debug("Pre-screen accepted %i of %i candidate models" %(
+      len(accepted), len(candidate_orientation_matrices)))
+    return ([candidate_orientation_matrices[i] for i in accepted],
+            [n_indexed[i] for i in accepted])
+
   def correct_non_primitive_basis(self, experiments, reflections, threshold):
     assert len(experiments.crystals()) == 1
     while True:
@@ -1996,14 +2091,8 @@ def find_max_cell(reflections, max_cell_multiplier, step_size,
   # need bounding box in reflections to find overlaps; this is not there if
   # spots are from XDS (for example)
   if filter_overlaps and 'bbox' in reflections:
-    overlap_sel = flex.bool(len(reflections), False)
-
-    overlaps = reflections.find_overlaps(border=overlaps_border)
-    for item in overlaps.edges():
-      i0 = overlaps.source(item)
-      i1 = overlaps.target(item)
-      overlap_sel[i0] = True
-      overlap_sel[i1] = True
+    overlap_sel = reflections.find_overlapping_selection(
+      border=overlaps_border)
     logger.debug('Rejecting %i overlapping bounding boxes' %overlap_sel.count(True))
     reflections = reflections.select(~overlap_sel)
   logger.debug('%i reflections remain for max_cell identification' % len(reflections))
@@ -23,7 +23,7 @@ def __init__(self, reflections, step_size=45, tolerance=1.5,
 
     d_spacings = flex.double()
     # nearest neighbor analysis
-    from annlib_ext import AnnAdaptor
+    from dials.algorithms.spatial_indexing import KdTree3
     for imageset_id in range(flex.max(reflections['imageset_id'])+1):
       sel_imageset = reflections['imageset_id'] == imageset_id
       if sel_imageset.count(True) == 0:
@@ -38,20 +38,14 @@ def __init__(self, reflections, step_size=45, tolerance=1.5,
 
         for entering in (True, False):
           sel_entering = sel_step & (entering_flags == entering)
-          if sel_entering.count(True) == 0:
+          if sel_entering.count(True) < 2:
             continue
 
-          query = flex.double()
-          query.extend(rs_vectors.select(sel_entering).as_double())
+          query = rs_vectors.select(sel_entering)
+          indices, distances = KdTree3(query).knn_self(k=1)
 
-          if query.size() == 0:
-            continue
-
-          IS_adapt = AnnAdaptor(data=query,dim=3,k=1)
-          IS_adapt.query(query)
-
-          direct.extend(1/flex.sqrt(IS_adapt.distances))
-          d_spacings.extend(1/rs_vectors.norms())
+          direct.extend(1/distances.as_1d())
+          d_spacings.extend(1/query.norms())
 
     assert len(direct)>NEAR, (
       "Too few spots (%d) for nearest neighbour analysis." %len(direct))
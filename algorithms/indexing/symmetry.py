@@ -94,9 +94,23 @@ def labelit_printout(self,out=None):
   'tI':79, 'hP':143, 'hR':146, 'cP':195, 'cF':196, 'cI':197
 }
 
+# The relative cost of refinement in each crystal system, taken as the number
+# of free unit cell parameters. Used to start the most expensive refinements
+# first.
+crystal_system_refinement_cost = {
+  'triclinic':6, 'monoclinic':4, 'orthorhombic':3, 'tetragonal':2,
+  'hexagonal':2, 'rhombohedral':2, 'cubic':1
+}
+
+# Data shared by all the subgroup refinements. This is set before the worker
+# processes are started so that, where processes are forked, the workers
+# inherit the reflections instead of receiving a pickled copy per subgroup.
+_shared_data = {}
+
 def refined_settings_factory_from_refined_triclinic(
   params, experiments, reflections, i_setting=None,
-  lepage_max_delta=5.0, nproc=1, refiner_verbosity=0):
+  lepage_max_delta=5.0, nproc=1, refiner_verbosity=0,
+  shared_outlier_rejection=False):
 
   assert len(experiments.crystals()) == 1
   crystal = experiments.crystals()[0]
@@ -138,25 +152,87 @@ def refined_settings_factory_from_refined_triclinic(
     Lfat[j].unrefined_crystal = dials_crystal_from_orientation(
       constrain_orient, space_group)
 
+  # Optionally do the outlier rejection once for the triclinic solution and
+  # refine all the subgroups against the same set of matches
+  p1_matches = None
+  if shared_outlier_rejection:
+    params = copy.deepcopy(params)
+    p1_matches = triclinic_matches(params, used_reflections, experiments,
+                                   refiner_verbosity)
+    params.refinement.reflections.outlier.algorithm = 'null'
+
+  # Share the reflections with forked workers rather than pickling them
+  share = workers_are_forked()
+  if share:
+    _shared_data['reflections'] = used_reflections
+    _shared_data['p1_matches'] = p1_matches
+
+  # Start the most expensive refinements first
+  order = sorted(range(Nset), key=lambda i: -crystal_system_refinement_cost.get(
+    Lfat[i]['system'], 6))
+
   args = []
-  for subgroup in Lfat:
-    args.append((
-      params, subgroup, used_reflections, experiments, refiner_verbosity))
-
-  results = easy_mp.parallel_map(
-    func=refine_subgroup,
-    iterable=args,
-    processes=nproc,
-    method="multiprocessing",
-    preserve_order=True,
-    asynchronous=True,
-    preserve_exception_message=True)
-
-  for i, result in enumerate(results):
+  for i in order:
+    if share:
+      args.append((params, Lfat[i], None, experiments, refiner_verbosity,
+                   None))
+    else:
+      args.append((params, Lfat[i], used_reflections, experiments,
+                   refiner_verbosity, p1_matches))
+
+  try:
+    results = easy_mp.parallel_map(
+      func=refine_subgroup,
+      iterable=args,
+      processes=nproc,
+      method="multiprocessing",
+      preserve_order=True,
+      asynchronous=True,
+      preserve_exception_message=True)
+  finally:
+    _shared_data.clear()
+
+  for i, result in zip(order, results):
     Lfat[i] = result
   identify_likely_solutions(Lfat)
   return Lfat
 
+def workers_are_forked():
+  '''
+  Check whether the multiprocessing workers are forked from this process and
+  so inherit module level data. This is not the case with the spawn or
+  forkserver start methods.
+
+  '''
+  import multiprocessing
+  import os
+  try:
+    return multiprocessing.get_start_method() == 'fork'
+  except AttributeError:
+    # Python 2 always forks where fork is available
+    return hasattr(os, 'fork')
+
+def triclinic_matches(params, reflections, experiments, refiner_verbosity=0):
+  '''
+  Refine the triclinic solution and return the reflections used in the final
+  step of refinement, i.e. those remaining after outlier rejection. The
+  predicted scattering vectors are reset so that the observed vectors are
+  recalculated when the matches are used for further refinement.
+
+  '''
+  from dials.algorithms.indexing.refinement import refine
+  logger = logging.getLogger()
+  disabled = logger.disabled
+  logger.disabled = True
+  try:
+    refinery, refined, outliers = refine(
+      params, reflections, experiments, verbosity=refiner_verbosity)
+  finally:
+    logger.disabled = disabled
+  matches = refinery.get_matches()
+  matches['s1'] = flex.vec3_double(len(matches))
+  return matches
+
 def identify_likely_solutions(all_solutions):
   p1_solution = all_solutions[-1]
   assert p1_solution.setting_number == 1, p1_solution.setting_number
@@ -175,17 +251,24 @@ def identify_likely_solutions(all_solutions):
 
 
 def refine_subgroup(args):
-  assert len(args) == 5
+  assert len(args) == 6
   from dials.command_line.check_indexing_symmetry \
        import get_symop_correlation_coefficients, normalise_intensities
 
-  params, subgroup, used_reflections, experiments, refiner_verbosity = args
+  (params, subgroup, used_reflections, experiments, refiner_verbosity,
+   p1_matches) = args
+  if used_reflections is None:
+    used_reflections = _shared_data['reflections']
+    p1_matches = _shared_data['p1_matches']
 
   used_reflections = copy.deepcopy(used_reflections)
   triclinic_miller = used_reflections['miller_index']
   cb_op = subgroup['cb_op_inp_best']
   higher_symmetry_miller = cb_op.apply(triclinic_miller)
   used_reflections['miller_index'] = higher_symmetry_miller
+  if p1_matches is not None:
+    p1_matches = copy.deepcopy(p1_matches)
+    p1_matches['miller_index'] = cb_op.apply(p1_matches['miller_index'])
   unrefined_crystal = copy.deepcopy(subgroup.unrefined_crystal)
   for expt in experiments:
     expt.crystal = unrefined_crystal
@@ -199,13 +282,18 @@ def refine_subgroup(args):
     logger = logging.getLogger()
     disabled = logger.disabled
     logger.disabled = True
-    iqr_multiplier = params.refinement.reflections.outlier.tukey.iqr_multiplier
-    params.refinement.reflections.outlier.tukey.iqr_multiplier = 2 * iqr_multiplier
-    refinery, refined, outliers = refine(
-      params, used_reflections, experiments, verbosity=refiner_verbosity)
-    params.refinement.reflections.outlier.tukey.iqr_multiplier = iqr_multiplier
-    refinery, refined, outliers = refine(
-      params, used_reflections, refinery.get_experiments(), verbosity=refiner_verbosity)
+    if p1_matches is not None:
+      # outliers were already rejected for the triclinic solution
+      refinery, refined, outliers = refine(
+        params, p1_matches, experiments, verbosity=refiner_verbosity)
+    else:
+      iqr_multiplier = params.refinement.reflections.outlier.tukey.iqr_multiplier
+      params.refinement.reflections.outlier.tukey.iqr_multiplier = 2 * iqr_multiplier
+      refinery, refined, outliers = refine(
+        params, used_reflections, experiments, verbosity=refiner_verbosity)
+      params.refinement.reflections.outlier.tukey.iqr_multiplier = iqr_multiplier
+      refinery, refined, outliers = refine(
+        params, used_reflections, refinery.get_experiments(), verbosity=refiner_verbosity)
   except RuntimeError as e:
     if (str(e) == "scitbx Error: g0 - astry*astry -astrz*astrz <= 0." or
         str(e) == "scitbx Error: g1-bstrz*bstrz <= 0."):
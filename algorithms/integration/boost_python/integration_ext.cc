@@ -16,10 +16,12 @@ namespace dials { namespace algorithms { namespace boost_python {
   using namespace boost::python;
 
   void export_corrections();
+  void export_overlaps_filter();
 
   BOOST_PYTHON_MODULE(dials_algorithms_integration_ext)
   {
     export_corrections();
+    export_overlaps_filter();
   }
 
 }}} // namespace = dials::algorithms::boost_python
@@ -0,0 +1,31 @@
+/*
+ * overlaps_filter.cc
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#include <boost/python.hpp>
+#include <boost/python/def.hpp>
+#include <dials/algorithms/integration/overlaps_filter.h>
+
+using namespace boost::python;
+
+namespace dials { namespace algorithms { namespace boost_python {
+
+  void export_overlaps_filter() {
+
+    class_<ShoeboxOverlapsFilter>("ShoeboxOverlapsFilter", no_init)
+      .def(init< const Detector&,
+                 const af::const_ref< Shoebox<> >& >((
+        arg("detector"),
+        arg("shoeboxes"))))
+      .def("foreground_foreground", &ShoeboxOverlapsFilter::foreground_foreground)
+      .def("foreground_background", &ShoeboxOverlapsFilter::foreground_background)
+      .def("foreground_count", &ShoeboxOverlapsFilter::foreground_count, (
+        arg("panel")))
+      .def("mask_code", &ShoeboxOverlapsFilter::mask_code, (
+        arg("panel")))
+      ;
+  }
+
+}}} // namespace = dials::algorithms::boost_python
@@ -141,6 +141,19 @@ def generate_phil_scope():
             .help = "The minimum number of spots to use in each subsample."
 
         }
+
+        cache_shoeboxes = *none reference all
+          .type = choice
+          .help = "Keep the shoeboxes extracted while modelling the reference"
+                  "profiles so that later passes do not read the images again."
+                  "With reference, the profile validation uses the cached"
+                  "reference shoeboxes. With all, the shoeboxes of every"
+                  "reflection are extracted in the modelling pass and the"
+                  "validation and integration are done from memory. If the"
+                  "shoeboxes do not fit within block.max_memory_usage a smaller"
+                  "cache is used. The passes done from memory run in a single"
+                  "process, so mp.nproc and mp.njobs do not apply to them."
+          .expert_level = 2
       }
 
       filter
@@ -181,6 +194,13 @@ def generate_phil_scope():
         nproc = 1
           .type = int(value_min=1)
           .help = "The number of processes to use per cluster job"
+
+        nthreads = 1
+          .type = int(value_min=1)
+          .help = "The number of threads to use for profile modelling within"
+                  "each process. The reference profiles are accumulated in"
+                  "parallel without the memory cost of more processes."
+          .expert_level = 2
       }
 
       summation {
@@ -275,6 +295,20 @@ def nframes_hist(bbox, width=80, symbol='#', prefix=''):
     prefix=prefix)
 
 
+def shoebox_memory(reflections):
+  '''
+  Estimate the memory needed to hold the shoeboxes of the reflections
+
+  :param reflections: The reflections with bounding boxes
+  :return: The memory in bytes
+
+  '''
+  from dials.array_family import flex
+  x0, x1, y0, y1, z0, z1 = reflections['bbox'].parts()
+  npixels = flex.sum(((x1 - x0) * (y1 - y0) * (z1 - z0)).as_double())
+  return npixels * 12 # float data and background and int mask
+
+
 class Parameters(object):
   '''
   A class to represent the integration parameters
@@ -305,6 +339,7 @@ def __init__(self):
     def __init__(self):
       self.fitting = True
       self.validation = Parameters.Profile.Validation()
+      self.cache_shoeboxes = 'none'
 
   def __init__(self):
     '''
@@ -336,6 +371,7 @@ def from_phil(params):
     mp.method = params.mp.method
     mp.nproc = params.mp.nproc
     mp.njobs = params.mp.njobs
+    mp.nthreads = params.mp.nthreads
 
     # Set the lookup parameters
     lookup = processor.Lookup()
@@ -385,6 +421,7 @@ def from_phil(params):
       params.profile.validation.number_of_partitions
     result.profile.validation.min_partition_size = \
       params.profile.validation.min_partition_size
+    result.profile.cache_shoeboxes = params.profile.cache_shoeboxes
 
     # Return the result
     return result
@@ -643,8 +680,15 @@ def process(self, frame, reflections):
     reflections.compute_centroid(self.experiments)
     reflections.compute_summed_intensity()
 
-    # Do the profile modelling
-    self.profile_fitter.model(reflections)
+    # Do the profile modelling on the reference spots. Other reflections are
+    # only present if their shoeboxes are being cached for integration.
+    selection = reflections.get_flags(reflections.flags.reference_spot)
+    if selection.all_eq(True):
+      self.profile_fitter.model(reflections, job.nthreads)
+    elif selection.count(True) > 0:
+      subset = reflections.select(selection)
+      self.profile_fitter.model(subset, job.nthreads)
+      reflections.set_selected(selection, subset)
 
     # Print some info
     fmt = ' Modelled % 5d / % 5d reflection profiles on image %d'
@@ -1030,6 +1074,9 @@ def integrate(self):
       profile_fitting = False
       profile_fitter = None
 
+    # The reflections with shoeboxes cached from the modelling pass
+    cached = None
+
     # Do profile modelling
     if profile_fitting:
 
@@ -1075,6 +1122,20 @@ def integrate(self):
             profile_fitter_single.add(expr.profile.fitting_class()(expr))
           profile_fitter.add(profile_fitter_single)
 
+        # Choose which shoeboxes to keep for the later passes. To cache all
+        # the shoeboxes, every reflection is extracted in the modelling pass
+        # but only the reference spots are modelled.
+        cache_shoeboxes = self._shoebox_cache_mode(reference)
+        self.params.modelling.shoebox.keep = cache_shoeboxes != 'none'
+        if cache_shoeboxes == 'all':
+          if 'profile.index' in reference:
+            index = flex.size_t(len(self.reflections), 0)
+            index.set_selected(selection, reference['profile.index'])
+            self.reflections['profile.index'] = index
+          modelling_reflections = self.reflections
+        else:
+          modelling_reflections = reference
+
         # Create the data processor
         executor = ProfileModellerExecutor(
           self.experiments,
@@ -1082,12 +1143,24 @@ def integrate(self):
         processor = ProcessorBuilder(
           self.ProcessorClass,
           self.experiments,
-          reference,
+          modelling_reflections,
           self.params.modelling).build()
         processor.executor = executor
 
         # Process the reference profiles
         reference, profile_fitter_list, time_info = processor.process()
+        if cache_shoeboxes == 'all':
+          cached = reference
+          reference = cached.select(
+            cached.get_flags(cached.flags.reference_spot))
+          cached.unset_flags(
+            flex.bool(len(cached), True),
+            cached.flags.integrated |
+            cached.flags.overloaded |
+            cached.flags.used_in_modelling |
+            cached.flags.failed_during_background_modelling |
+            cached.flags.failed_during_summation |
+            cached.flags.failed_during_profile_fitting)
 
         # Set the reference spots info
         #self.reflections.set_selected(selection, reference)
@@ -1155,15 +1228,19 @@ def integrate(self):
           executor = ProfileValidatorExecutor(
             self.experiments,
             profile_fitter)
-          processor = ProcessorBuilder(
-            self.ProcessorClass,
-            self.experiments,
-            reference,
-            self.params.modelling).build()
-          processor.executor = executor
 
           # Process the reference profiles
-          reference, validation, time_info = processor.process()
+          if cache_shoeboxes != 'none':
+            reference, validation, time_info = self._process_cached(
+              executor, reference)
+          else:
+            processor = ProcessorBuilder(
+              self.ProcessorClass,
+              self.experiments,
+              reference,
+              self.params.modelling).build()
+            processor.executor = executor
+            reference, validation, time_info = processor.process()
 
           # Print the modeller report
           self.profile_validation_report = ProfileValidationReport(
@@ -1180,6 +1257,10 @@ def integrate(self):
           logger.info(str(time_info))
           logger.info("")
 
+        # Release the cached reference shoeboxes
+        if 'shoebox' in reference:
+          del reference['shoebox']
+
         # Set to the finalized fitter
         profile_fitter = finalized_profile_fitter
 
@@ -1192,15 +1273,21 @@ def integrate(self):
     executor = IntegratorExecutor(
       self.experiments,
       profile_fitter)
-    processor = ProcessorBuilder(
-      self.ProcessorClass,
-      self.experiments,
-      self.reflections,
-      self.params.integration).build()
-    processor.executor = executor
 
     # Process the reflections
-    self.reflections, _, time_info = processor.process()
+    if cached is not None:
+      if 'profile.index' in cached:
+        del cached['profile.index']
+      self.reflections, _, time_info = self._process_cached(executor, cached)
+      del self.reflections['shoebox']
+    else:
+      processor = ProcessorBuilder(
+        self.ProcessorClass,
+        self.experiments,
+        self.reflections,
+        self.params.integration).build()
+      processor.executor = executor
+      self.reflections, _, time_info = processor.process()
 
     # Finalize the reflections
     finalize = self.FinalizerClass(
@@ -1226,6 +1313,71 @@ def integrate(self):
     # Return the reflections
     return self.reflections
 
+  def _shoebox_cache_mode(self, reference):
+    '''
+    Choose which shoeboxes to cache in the modelling pass. The cache is
+    reduced if the shoeboxes would not fit within the shoebox memory limit.
+
+    :param reference: The reference reflections
+    :return: The cache mode (none, reference or all)
+
+    '''
+    from libtbx.introspection import machine_memory_info
+    mode = self.params.profile.cache_shoeboxes
+    if mode == 'all' and self.params.integration.debug.output:
+      logger.info(' Shoeboxes are saved during integration; caching only'
+                  ' the reference shoeboxes')
+      mode = 'reference'
+    total_memory = machine_memory_info().memory_total()
+    if mode != 'none' and total_memory is not None:
+      limit_memory = total_memory * self.params.integration.block.max_memory_usage
+      if mode == 'all' and shoebox_memory(self.reflections) > limit_memory:
+        logger.info(' Not enough memory to cache all shoeboxes; caching only'
+                    ' the reference shoeboxes')
+        mode = 'reference'
+      if mode == 'reference' and shoebox_memory(reference) > limit_memory:
+        logger.info(' Not enough memory to cache the reference shoeboxes')
+        mode = 'none'
+    mp = self.params.integration.mp
+    if mode != 'none' and mp.nproc * mp.njobs > 1:
+      logger.warning(' The passes using cached shoeboxes run in a single'
+                     ' process; mp.nproc and mp.njobs are ignored for them')
+    return mode
+
+  def _process_cached(self, executor, reflections):
+    '''
+    Process reflections whose shoeboxes were kept from the modelling pass
+    instead of reading the images again. The shoebox masks are reset to the
+    pixel validity so that the executor starts from freshly extracted data.
+
+    :param executor: The executor
+    :param reflections: The reflections with shoeboxes
+    :return: The reflections, executor data and timing info
+
+    '''
+    from dials.algorithms.integration.processor import TimingInfo
+    from dials.algorithms.shoebox import MaskCode
+    from dials.array_family import flex
+    from time import time
+    start_time = time()
+    time_info = TimingInfo()
+    job.index = 0
+    reflections['shoebox'].reset_mask_values(MaskCode.Valid)
+    bbox = reflections['bbox'].parts()
+    frame0 = flex.min(bbox[4])
+    frame1 = flex.max(bbox[5])
+    st = time()
+    executor.initialize(frame0, frame1, reflections)
+    time_info.initialize = time() - st
+    st = time()
+    executor.process(frame1 - 1, reflections)
+    time_info.process = time() - st
+    st = time()
+    executor.finalize()
+    time_info.finalize = time() - st
+    time_info.total = time() - start_time
+    return reflections, executor.data(), time_info
+
   def report(self):
     '''
     Return the report of the processing
@@ -0,0 +1,213 @@
+/*
+ * overlaps_filter.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_ALGORITHMS_INTEGRATION_OVERLAPS_FILTER_H
+#define DIALS_ALGORITHMS_INTEGRATION_OVERLAPS_FILTER_H
+
+#include <vector>
+#include <dxtbx/model/detector.h>
+#include <dials/model/data/shoebox.h>
+#include <dials/model/data/mask_code.h>
+#include <dials/array_family/scitbx_shared_and_versa.h>
+#include <dials/error.h>
+
+namespace dials { namespace algorithms {
+
+  using dxtbx::model::Detector;
+  using dials::model::Shoebox;
+  using dials::model::Valid;
+  using dials::model::Foreground;
+  using dials::model::Background;
+
+  /**
+   * A class to filter reflections whose shoeboxes overlap on the detector.
+   * The shoebox masks are projected onto the detector (the mask codes at a
+   * pixel are combined over the frames of the shoebox) and for each panel a
+   * single compact array is accumulated holding, for each pixel, the number
+   * of reflections with foreground at the pixel and the combined mask code of
+   * all the reflections. Pixels of a shoebox which fall outside the panel are
+   * ignored.
+   */
+  class ShoeboxOverlapsFilter {
+  public:
+
+    /**
+     * Accumulate the per pixel counts and mask codes
+     * @param detector The detector model
+     * @param shoeboxes The shoeboxes
+     */
+    ShoeboxOverlapsFilter(
+        const Detector &detector,
+        const af::const_ref< Shoebox<> > &shoeboxes)
+      : shoeboxes_(shoeboxes.begin(), shoeboxes.end()) {
+      for (std::size_t i = 0; i < detector.size(); ++i) {
+        std::size_t width = detector[i].get_image_size()[0];
+        std::size_t height = detector[i].get_image_size()[1];
+        accessor_.push_back(af::c_grid<2>(height, width));
+        count_.push_back(std::vector<unsigned short>(width * height, 0));
+        code_.push_back(std::vector<int>(width * height, 0));
+      }
+      std::vector<int> projected;
+      for (std::size_t i = 0; i < shoeboxes_.size(); ++i) {
+        const Shoebox<> &sbox = shoeboxes_[i];
+        DIALS_ASSERT(sbox.is_consistent());
+        DIALS_ASSERT(sbox.panel < accessor_.size());
+        project(sbox, projected);
+        std::vector<unsigned short> &count = count_[sbox.panel];
+        std::vector<int> &code = code_[sbox.panel];
+        for_each_pixel(sbox, projected, count, code, &accumulate);
+      }
+    }
+
+    /**
+     * Find reflections whose foreground overlaps the foreground of any other
+     * reflection.
+     * @returns True for reflections to keep
+     */
+    af::shared<bool> foreground_foreground() const {
+      af::shared<bool> result(shoeboxes_.size(), true);
+      std::vector<int> projected;
+      for (std::size_t i = 0; i < shoeboxes_.size(); ++i) {
+        const Shoebox<> &sbox = shoeboxes_[i];
+        project(sbox, projected);
+        const std::vector<unsigned short> &count = count_[sbox.panel];
+        result[i] = !for_each_pixel(sbox, projected, count, code_[sbox.panel],
+                                    &is_foreground_foreground);
+      }
+      return result;
+    }
+
+    /**
+     * Find reflections with any pixel where the foreground of one reflection
+     * and the background of another (or the same) reflection coincide.
+     * @returns True for reflections to keep
+     */
+    af::shared<bool> foreground_background() const {
+      af::shared<bool> result(shoeboxes_.size(), true);
+      std::vector<int> projected;
+      for (std::size_t i = 0; i < shoeboxes_.size(); ++i) {
+        const Shoebox<> &sbox = shoeboxes_[i];
+        project(sbox, projected);
+        const std::vector<unsigned short> &count = count_[sbox.panel];
+        result[i] = !for_each_pixel(sbox, projected, count, code_[sbox.panel],
+                                    &is_foreground_background);
+      }
+      return result;
+    }
+
+    /**
+     * @returns The number of foreground reflections at each pixel of a panel
+     */
+    af::versa< int, af::c_grid<2> > foreground_count(std::size_t panel) const {
+      DIALS_ASSERT(panel < accessor_.size());
+      af::versa< int, af::c_grid<2> > result(accessor_[panel]);
+      std::copy(count_[panel].begin(), count_[panel].end(), result.begin());
+      return result;
+    }
+
+    /**
+     * @returns The combined mask code at each pixel of a panel
+     */
+    af::versa< int, af::c_grid<2> > mask_code(std::size_t panel) const {
+      DIALS_ASSERT(panel < accessor_.size());
+      af::versa< int, af::c_grid<2> > result(accessor_[panel]);
+      std::copy(code_[panel].begin(), code_[panel].end(), result.begin());
+      return result;
+    }
+
+  private:
+
+    static const int code_fgd = Foreground | Valid;
+    static const int code_bgd = Background | Valid;
+
+    static bool is_fgd(int code) {
+      return (code & code_fgd) == code_fgd;
+    }
+
+    static bool is_bgd(int code) {
+      return (code & code_bgd) == code_bgd;
+    }
+
+    static bool accumulate(int sbox_code, unsigned short &count, int &code) {
+      if (is_fgd(sbox_code) && count < 0xffff) {
+        count += 1;
+      }
+      code |= sbox_code;
+      return false;
+    }
+
+    static bool is_foreground_foreground(
+        int sbox_code, unsigned short count, int code) {
+      return is_fgd(sbox_code) && count > 1;
+    }
+
+    static bool is_foreground_background(
+        int sbox_code, unsigned short count, int code) {
+      return is_fgd(code) && is_bgd(code);
+    }
+
+    /**
+     * Combine the mask codes of the shoebox over the frames
+     */
+    static void project(const Shoebox<> &sbox, std::vector<int> &projected) {
+      std::size_t zsize = sbox.zsize();
+      std::size_t ysize = sbox.ysize();
+      std::size_t xsize = sbox.xsize();
+      projected.assign(ysize * xsize, 0);
+      for (std::size_t k = 0; k < zsize; ++k) {
+        for (std::size_t j = 0; j < ysize; ++j) {
+          for (std::size_t i = 0; i < xsize; ++i) {
+            projected[j * xsize + i] |= sbox.mask(k, j, i);
+          }
+        }
+      }
+    }
+
+    /**
+     * Call the function for each pixel of the shoebox on the panel, stopping
+     * if the function returns true.
+     * @returns True if the function returned true for any pixel
+     */
+    template <typename Count, typename Code, typename Function>
+    bool for_each_pixel(
+        const Shoebox<> &sbox,
+        const std::vector<int> &projected,
+        Count &count,
+        Code &code,
+        Function function) const {
+      const af::c_grid<2> &accessor = accessor_[sbox.panel];
+      int height = accessor[0];
+      int width = accessor[1];
+      int xsize = sbox.xsize();
+      int ysize = sbox.ysize();
+      for (int j = 0; j < ysize; ++j) {
+        int y = sbox.bbox[2] + j;
+        if (y < 0 || y >= height) {
+          continue;
+        }
+        for (int i = 0; i < xsize; ++i) {
+          int x = sbox.bbox[0] + i;
+          if (x < 0 || x >= width) {
+            continue;
+          }
+          std::size_t index = y * width + x;
+          if (function(projected[j * xsize + i], count[index], code[index])) {
+            return true;
+          }
+        }
+      }
+      return false;
+    }
+
+    std::vector< Shoebox<> > shoeboxes_;
+    std::vector< af::c_grid<2> > accessor_;
+    std::vector< std::vector<unsigned short> > count_;
+    std::vector< std::vector<int> > code_;
+  };
+
+}} // namespace dials::algorithms
+
+#endif // DIALS_ALGORITHMS_INTEGRATION_OVERLAPS_FILTER_H
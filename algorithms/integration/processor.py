@@ -90,10 +90,12 @@ class Shoebox(object):
   def __init__(self):
     self.flatten = False
     self.partials = False
+    self.keep = False
 
   def update(self, other):
     self.flatten = other.flatten
     self.partials = other.partials
+    self.keep = other.keep
 
 class Debug(object):
   '''
@@ -386,8 +388,9 @@ def __call__(self):
     # Get the start time
     start_time = time()
 
-    # Set the global process ID
+    # Set the global process ID and number of threads
     job.index = self.index
+    job.nthreads = self.params.mp.nthreads
 
     # Check all reflections have same imageset and get it
     exp_id = list(set(self.reflections['id']))
@@ -435,7 +438,7 @@ def __call__(self):
       len(imageset.get_detector()),
       frame0,
       frame1,
-      self.params.debug.output)
+      self.params.debug.output or self.params.shoebox.keep)
 
     # Compute percentage of max available. The function is not portable to
     # windows so need to add a check if the function fails. On windows no
@@ -500,8 +503,9 @@ def __call__(self):
       else:
         output.as_pickle('shoeboxes_%d.pickle' % self.index)
 
-    # Delete the shoeboxes
-    if self.params.debug.separate_files or not self.params.debug.output:
+    # Delete the shoeboxes unless they are kept for later processing
+    if not self.params.shoebox.keep and (
+        self.params.debug.separate_files or not self.params.debug.output):
       del self.reflections['shoebox']
 
     # Finalize the executor
@@ -38,7 +38,7 @@ def __getitem__(self, index):
     '''
     return self.modellers[index]
 
-  def model(self, reflections):
+  def model(self, reflections, nthreads=1):
     '''
     Do the modelling for all modellers
 
@@ -46,14 +46,14 @@ def model(self, reflections):
     from dials.array_family import flex
     if 'profile.index' not in reflections:
       assert(len(self.modellers) == 1)
-      self.modellers[0].model(reflections)
+      self.modellers[0].model(reflections, nthreads)
     else:
       for i, modeller in enumerate(self.modellers):
         mask = reflections['profile.index'] != i
         indices = flex.size_t(range(len(mask))).select(mask)
         if len(indices) > 0:
           subsample = reflections.select(indices)
-          modeller.model(subsample)
+          modeller.model(subsample, nthreads)
           reflections.set_selected(indices, subsample)
 
   def validate(self, reflections):
@@ -13,6 +13,11 @@
 #define DIALS_ALGORITHMS_PROFILE_MODEL_GAUSSIAN_RS_MODELLER_H
 
 #include <fstream>
+#include <vector>
+#include <boost/bind.hpp>
+#include <boost/make_shared.hpp>
+#include <boost/thread.hpp>
+#include <boost/exception_ptr.hpp>
 #include <dials/algorithms/profile_model/gaussian_rs/transform/transform.h>
 #include <dials/algorithms/profile_model/modeller/empirical_modeller.h>
 #include <dials/algorithms/profile_model/modeller/single_sampler.h>
@@ -290,8 +295,21 @@ namespace dials { namespace algorithms {
      * @param reflections The reflection list
      */
     void model(af::reflection_table reflections) {
+      model_threaded(reflections, 1);
+    }
+
+    /**
+     * Model the profiles from the reflections using a number of threads. The
+     * reflections are split into contiguous blocks and each thread adds its
+     * block to a private set of profiles. The partial profiles are then added
+     * in block order so the result does not depend on the thread scheduling.
+     * @param reflections The reflection list
+     * @param nthreads The number of threads
+     */
+    void model_threaded(af::reflection_table reflections, std::size_t nthreads) {
 
       // Check input is OK
+      DIALS_ASSERT(nthreads > 0);
       DIALS_ASSERT(reflections.is_consistent());
       DIALS_ASSERT(reflections.contains("shoebox"));
       DIALS_ASSERT(reflections.contains("flags"));
@@ -301,67 +319,48 @@ namespace dials { namespace algorithms {
       DIALS_ASSERT(reflections.contains("xyzcal.mm"));
 
       // Get some data
-      af::const_ref< Shoebox<> > sbox = reflections["shoebox"];
-      af::const_ref<double> partiality = reflections["partiality"];
-      af::const_ref< vec3<double> > s1 = reflections["s1"];
-      af::const_ref< vec3<double> > xyzpx = reflections["xyzcal.px"];
-      af::const_ref< vec3<double> > xyzmm = reflections["xyzcal.mm"];
-      af::ref<std::size_t> flags = reflections["flags"];
-
-      // Loop through all the reflections and add them to the model
-      for (std::size_t i = 0; i < reflections.size(); ++i) {
-        DIALS_ASSERT(sbox[i].is_consistent());
-
-        // Check if we want to use this reflection
-        if (check1(flags[i], partiality[i], sbox[i])) {
-
-          // Create the coordinate system
-          vec3<double> m2 = spec_.goniometer().get_rotation_axis();
-          vec3<double> s0 = spec_.beam()->get_s0();
-          CoordinateSystem cs(m2, s0, s1[i], xyzmm[i][2]);
-
-          // Create the data array
-          af::versa< double, af::c_grid<3> > data(sbox[i].data.accessor());
-          std::transform(
-              sbox[i].data.begin(),
-              sbox[i].data.end(),
-              sbox[i].background.begin(),
-              data.begin(),
-              std::minus<double>());
-
-          // Create the mask array
-          af::versa< bool, af::c_grid<3> > mask(sbox[i].mask.accessor());
-          std::transform(
-              sbox[i].mask.begin(),
-              sbox[i].mask.end(),
-              mask.begin(),
-              detail::check_mask_code(Valid | Foreground));
-
-          // Compute the transform
-          TransformForward<double> transform(
-              spec_,
-              cs,
-              sbox[i].bbox,
-              sbox[i].panel,
-              data.const_ref(),
-              mask.const_ref());
-
-          // Get the indices and weights of the profiles
-          af::shared<std::size_t> indices = sampler_->nearest_n(sbox[i].panel, xyzpx[i]);
-          af::shared<double> weights(indices.size());
-          for (std::size_t j = 0; j < indices.size(); ++j) {
-            weights[j] = sampler_->weight(indices[j], sbox[i].panel, xyzpx[i]);
-          }
-
-          // Add the profile
-          add(indices.const_ref(),
-              weights.const_ref(),
-              transform.profile().const_ref());
+      ModelColumns columns(reflections);
+      std::size_t n = reflections.size();
+      nthreads = std::max((std::size_t)1, std::min(nthreads, n));
+
+      // Add the reflections directly to the model
+      if (nthreads == 1) {
+        boost::exception_ptr error;
+        model_range(columns, 0, n, *this, error);
+        if (error) {
+          boost::rethrow_exception(error);
+        }
+        return;
+      }
 
-          // Set the flags
-          flags[i] |= af::UsedInModelling;
+      // Add blocks of reflections to partial models in parallel
+      std::vector< boost::shared_ptr<EmpiricalProfileModeller> > partial;
+      std::vector<boost::exception_ptr> errors(nthreads);
+      boost::thread_group threads;
+      for (std::size_t t = 0; t < nthreads; ++t) {
+        partial.push_back(boost::make_shared<EmpiricalProfileModeller>(
+          data_.size(),
+          int3(accessor_[0], accessor_[1], accessor_[2]),
+          threshold_));
+        threads.create_thread(boost::bind(
+          &GaussianRSProfileModeller::model_range, this,
+          boost::cref(columns),
+          (t * n) / nthreads,
+          ((t + 1) * n) / nthreads,
+          boost::ref(*partial[t]),
+          boost::ref(errors[t])));
+      }
+      threads.join_all();
+      for (std::size_t t = 0; t < nthreads; ++t) {
+        if (errors[t]) {
+          boost::rethrow_exception(errors[t]);
         }
       }
+
+      // Reduce the partial models in order
+      for (std::size_t t = 0; t < nthreads; ++t) {
+        accumulate_raw_pointer(partial[t].get());
+      }
     }
 
     /**
@@ -670,6 +669,108 @@ namespace dials { namespace algorithms {
 
   private:
 
+    /**
+     * The columns needed for profile modelling
+     */
+    struct ModelColumns {
+      af::const_ref< Shoebox<> > sbox;
+      af::const_ref<double> partiality;
+      af::const_ref< vec3<double> > s1;
+      af::const_ref< vec3<double> > xyzpx;
+      af::const_ref< vec3<double> > xyzmm;
+      af::ref<std::size_t> flags;
+
+      ModelColumns(af::reflection_table reflections)
+        : sbox(reflections.get< Shoebox<> >("shoebox").const_ref()),
+          partiality(reflections.get<double>("partiality").const_ref()),
+          s1(reflections.get< vec3<double> >("s1").const_ref()),
+          xyzpx(reflections.get< vec3<double> >("xyzcal.px").const_ref()),
+          xyzmm(reflections.get< vec3<double> >("xyzcal.mm").const_ref()),
+          flags(reflections.get<std::size_t>("flags").ref()) {}
+    };
+
+    /**
+     * Add a range of reflections to a model, keeping any exception thrown.
+     * @param columns The reflection data
+     * @param begin The first reflection
+     * @param end One past the last reflection
+     * @param target The model to add the profiles to
+     * @param error The exception thrown
+     */
+    void model_range(
+        const ModelColumns &columns,
+        std::size_t begin,
+        std::size_t end,
+        EmpiricalProfileModeller &target,
+        boost::exception_ptr &error) const {
+      try {
+        af::const_ref< Shoebox<> > sbox = columns.sbox;
+        af::const_ref<double> partiality = columns.partiality;
+        af::const_ref< vec3<double> > s1 = columns.s1;
+        af::const_ref< vec3<double> > xyzpx = columns.xyzpx;
+        af::const_ref< vec3<double> > xyzmm = columns.xyzmm;
+        af::ref<std::size_t> flags = columns.flags;
+        vec3<double> m2 = spec_.goniometer().get_rotation_axis();
+        vec3<double> s0 = spec_.beam()->get_s0();
+
+        // Loop through the reflections and add them to the model
+        for (std::size_t i = begin; i < end; ++i) {
+          DIALS_ASSERT(sbox[i].is_consistent());
+
+          // Check if we want to use this reflection
+          if (check1(flags[i], partiality[i], sbox[i])) {
+
+            // Create the coordinate system
+            CoordinateSystem cs(m2, s0, s1[i], xyzmm[i][2]);
+
+            // Create the data array
+            af::versa< double, af::c_grid<3> > data(sbox[i].data.accessor());
+            std::transform(
+                sbox[i].data.begin(),
+                sbox[i].data.end(),
+                sbox[i].background.begin(),
+                data.begin(),
+                std::minus<double>());
+
+            // Create the mask array
+            af::versa< bool, af::c_grid<3> > mask(sbox[i].mask.accessor());
+            std::transform(
+                sbox[i].mask.begin(),
+                sbox[i].mask.end(),
+                mask.begin(),
+                detail::check_mask_code(Valid | Foreground));
+
+            // Compute the transform
+            TransformForward<double> transform(
+                spec_,
+                cs,
+                sbox[i].bbox,
+                sbox[i].panel,
+                data.const_ref(),
+                mask.const_ref());
+
+            // Get the indices and weights of the profiles
+            af::shared<std::size_t> indices = sampler_->nearest_n(sbox[i].panel, xyzpx[i]);
+            af::shared<double> weights(indices.size());
+            for (std::size_t j = 0; j < indices.size(); ++j) {
+              weights[j] = sampler_->weight(indices[j], sbox[i].panel, xyzpx[i]);
+            }
+
+            // Add the profile
+            target.add(
+                indices.const_ref(),
+                weights.const_ref(),
+                transform.profile().const_ref());
+
+            // Set the flags
+            flags[i] |= af::UsedInModelling;
+          }
+        }
+      } catch (...) {
+        error = boost::current_exception();
+      }
+    }
+
     /**
      * Do we want to use the reflection in profile modelling
      * @param flags The reflection flags
@@ -21,6 +21,7 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("valid", &T::valid)
       .def("n_reflections", &T::n_reflections)
       .def("model", &T::model)
+      .def("model_threaded", &T::model_threaded)
       .def("fit", &T::fit)
       .def("validate", &T::validate)
       .def("accumulate", &T::accumulate)
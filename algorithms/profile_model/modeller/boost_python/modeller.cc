@@ -119,6 +119,9 @@ namespace dials { namespace algorithms { namespace boost_python {
 
   void export_modeller()
   {
+    typedef void (MultiExpProfileModeller::*model_type)(af::reflection_table);
+    typedef void (MultiExpProfileModeller::*model_threaded_type)(
+        af::reflection_table, std::size_t);
 
     class_<ProfileModellerIfaceWrapper,
            boost::shared_ptr<ProfileModellerIfaceWrapper>,
@@ -153,7 +156,11 @@ namespace dials { namespace algorithms { namespace boost_python {
     class_<MultiExpProfileModeller>("MultiExpProfileModeller")
       .def("add", &MultiExpProfileModeller::add)
       .def("__getitem__", &MultiExpProfileModeller::operator[])
-      .def("model", &MultiExpProfileModeller::model)
+      .def("model", (model_type)&MultiExpProfileModeller::model)
+      .def("model",
+          (model_threaded_type)&MultiExpProfileModeller::model, (
+            arg("reflections"),
+            arg("nthreads")))
       .def("accumulate", &MultiExpProfileModeller::accumulate)
       .def("finalize", &MultiExpProfileModeller::finalize)
       .def("finalized", &MultiExpProfileModeller::finalized)
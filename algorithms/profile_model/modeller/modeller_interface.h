@@ -37,6 +37,15 @@ namespace dials { namespace algorithms {
     virtual
     void model(af::reflection_table) = 0;
 
+    /**
+     * Model the reflections using a number of threads. By default the
+     * reflections are modelled in the calling thread.
+     */
+    virtual
+    void model_threaded(af::reflection_table reflections, std::size_t nthreads) {
+      model(reflections);
+    }
+
     virtual
     void accumulate(boost::shared_ptr<ProfileModellerIface>) = 0;
 
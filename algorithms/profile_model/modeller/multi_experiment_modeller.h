@@ -57,11 +57,22 @@ namespace dials { namespace algorithms {
      * @param reflections The reflection table
      */
     void model(af::reflection_table reflections) {
+      model(reflections, 1);
+    }
+
+    /**
+     * Model the reflections. The reflections of each experiment are modelled
+     * using a number of threads if the modeller supports it.
+     * @param reflections The reflection table
+     * @param nthreads The number of threads
+     */
+    void model(af::reflection_table reflections, std::size_t nthreads) {
 
       using af::boost_python::flex_table_suite::select_rows_index;
       using af::boost_python::flex_table_suite::set_selected_rows_index;
 
       // Check some stuff
+      DIALS_ASSERT(nthreads > 0);
       DIALS_ASSERT(size() > 0);
       DIALS_ASSERT(reflections.size() > 0);
       DIALS_ASSERT(reflections.contains("id"));
@@ -120,7 +131,11 @@ namespace dials { namespace algorithms {
           af::const_ref<std::size_t> ind(&indices[o1], n);
           af::reflection_table subset = select_rows_index(reflections, ind);
           DIALS_ASSERT(modellers_[i] != NULL);
-          modellers_[i]->model(subset);
+          if (nthreads > 1) {
+            modellers_[i]->model_threaded(subset, nthreads);
+          } else {
+            modellers_[i]->model(subset);
+          }
           set_selected_rows_index(reflections, ind, subset);
         }
       }
@@ -11,6 +11,7 @@ namespace dials { namespace refinement { namespace boost_python {
   void export_mahalanobis();
   void export_outlier_helpers();
   void export_calculate_cell_gradients();
+  void export_sparse_matrix_from_triplets();
   void export_rtmats();
   void export_gaussian_smoother();
   void export_gaussian_smoother_2D();
@@ -26,6 +27,7 @@ namespace dials { namespace refinement { namespace boost_python {
     export_mahalanobis();
     export_outlier_helpers();
     export_calculate_cell_gradients();
+    export_sparse_matrix_from_triplets();
     export_rtmats();
     export_gaussian_smoother();
     export_gaussian_smoother_2D();
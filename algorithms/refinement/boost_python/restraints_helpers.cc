@@ -31,4 +31,14 @@ namespace dials { namespace refinement { namespace boost_python {
       .def("dcc_dp", &CalculateCellGradients::dcc_dp);
   }
 
+  void export_sparse_matrix_from_triplets()
+  {
+    def("sparse_matrix_from_triplets", &sparse_matrix_from_triplets, (
+      arg("n_rows"),
+      arg("n_cols"),
+      arg("rows"),
+      arg("cols"),
+      arg("values")));
+  }
+
 }}} // namespace dials::refinement::boost_python
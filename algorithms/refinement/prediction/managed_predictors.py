@@ -69,12 +69,35 @@ class ExperimentsPredictor(object):
   predictor in each case.
   """
 
-  def __init__(self, experiments, force_stills=False, spherical_relp=False):
-    """Construct by linking to instances of experimental model classes"""
+  def __init__(self, experiments, force_stills=False, spherical_relp=False,
+               reuse_predictions=False):
+    """Construct by linking to instances of experimental model classes.
+
+    If reuse_predictions is True then the predictions for each experiment are
+    cached and reused on the next call if neither the models of the experiment
+    nor the reflections selected for it have changed"""
 
     self._experiments = experiments
     self._force_stills = force_stills
     self._spherical_relp = spherical_relp
+    self._reuse_predictions = reuse_predictions
+    self._cache = {}
+
+  @staticmethod
+  def _model_state(experiment):
+    """Return a tuple of values that determine the predictions for an
+    experiment at its current model geometry"""
+
+    state = [experiment.beam.get_s0(), experiment.crystal.get_A()]
+    if experiment.goniometer is not None:
+      state.extend([experiment.goniometer.get_rotation_axis_datum(),
+                    experiment.goniometer.get_fixed_rotation(),
+                    experiment.goniometer.get_setting_rotation()])
+    if experiment.scan is not None:
+      state.append(experiment.scan.get_oscillation(deg=False))
+    for panel in experiment.detector:
+      state.append(panel.get_d_matrix())
+    return tuple(tuple(e) for e in state)
 
   def __call__(self, reflections):
     """Predict for all reflections at the current model geometry"""
@@ -93,6 +116,19 @@ def __call__(self, reflections):
       sel = reflections['id'] == iexp
       refs = reflections.select(sel)
 
+      # reuse the previous predictions if nothing has changed. Scan-varying
+      # predictions depend on the per-reflection model columns so are never
+      # reused
+      inputs = None
+      if self._reuse_predictions and 'ub_matrix' not in refs:
+        state = self._model_state(e)
+        cached = self._cache.get(iexp)
+        if cached is not None and cached.matches(state, refs):
+          cached.restore(refs)
+          reflections.set_selected(sel, refs)
+          continue
+        inputs = _CachedPredictions.copy_inputs(refs)
+
       # stills
       if not e.goniometer or self._force_stills:
         predictor = st(e, spherical_relp=self._spherical_relp)
@@ -112,8 +148,65 @@ def __call__(self, reflections):
         UB = e.crystal.get_A()
         predictor.for_reflection_table(refs, UB)
 
+      if inputs is not None:
+        self._cache[iexp] = _CachedPredictions(state, inputs, refs)
+
       # write predictions back to overall reflections
       reflections.set_selected(sel, refs)
 
     return reflections
 
+class _CachedPredictions(object):
+  """The predictions for the reflections of one experiment, together with the
+  model state and the reflection columns they were calculated from. The model
+  state is compared first as it is cheap and changes on every step of
+  refinement; the reflection columns are only compared when it matches"""
+
+  # Columns that the predictions depend on
+  inputs = ('miller_index', 'panel', 'entering')
+
+  # Columns set by the predictors
+  outputs = ('miller_index', 'panel', 'entering', 's1', 'xyzcal.mm',
+             'xyzcal.px', 'delpsical.rad')
+
+  def __init__(self, state, inputs, reflections):
+    """Keep the predicted columns. The reflections are a selection made for
+    the prediction and are not used afterwards, so their columns are kept
+    without copying"""
+    self.state = state
+    self.columns = inputs
+    self.predictions = dict((k, reflections[k]) for k in self.outputs
+                            if k in reflections)
+    self.predicted = reflections.get_flags(reflections.flags.predicted)
+
+  @classmethod
+  def copy_inputs(cls, reflections):
+    """Copy the columns the predictions depend on before predicting"""
+    return dict((k, reflections[k].deep_copy()) for k in cls.inputs
+                if k in reflections)
+
+  def matches(self, state, reflections):
+    """Check whether the cached predictions are valid for the model state and
+    reflections"""
+    if state != self.state:
+      return False
+    keys = [k for k in self.inputs if k in reflections]
+    if sorted(keys) != sorted(self.columns.keys()):
+      return False
+    for key in keys:
+      column = reflections[key]
+      cached = self.columns[key]
+      if len(column) != len(cached):
+        return False
+      if not (column == cached).all_eq(True):
+        return False
+    return True
+
+  def restore(self, reflections):
+    """Set the predicted columns from the cache. The columns are only copied
+    into the full reflection table by the caller, so they are not copied
+    here"""
+    for key, column in self.predictions.items():
+      reflections[key] = column
+    reflections.unset_flags(~self.predicted, reflections.flags.predicted)
+    reflections.set_flags(self.predicted, reflections.flags.predicted)
@@ -352,6 +352,15 @@
               "the minimiser must do the full calculation in blocks."
       .type = int(value_min=1)
 
+    reuse_predictions = False
+      .help = "Cache the predictions for each experiment and reuse them if"
+              "neither the models of the experiment nor its reflections have"
+              "changed since the last prediction. This can save time in"
+              "multi-experiment refinement where the models of some"
+              "experiments are fixed."
+      .type = bool
+      .expert_level = 2
+
   }
 
   reflections
@@ -1761,7 +1770,7 @@ def config_target(params, experiments, refman, do_stills):
     # build managed reflection predictors
     from dials.algorithms.refinement.prediction import ExperimentsPredictor
     ref_predictor = ExperimentsPredictor(experiments, do_stills,
-                                         spherical_relp=srm)
+      spherical_relp=srm, reuse_predictions=options.reuse_predictions)
 
     # Determine whether the target is in X, Y, Phi space or just X, Y.
     if do_stills:
@@ -274,6 +274,12 @@ def __init__(self, model_parameterisations, sigma):
     # set the selection for gradient calculations to the unconstrained parameters
     self._sel = [s > 0.0 for s in sigma]
 
+    # cache of the parameter values, cell parameters and cell gradients for
+    # each crystal, updated only for crystals whose parameters have changed
+    self._param_vals = [None] * self._nxls
+    self._cells = [flex.double(self._nxls) for i in range(6)]
+    self._cell_grads = [None] * self._nxls
+
     self.nrestraints_per_cell = self._sel.count(True)
 
     # repeat the weights for each unit cell being restrained
@@ -285,21 +291,43 @@ def __init__(self, model_parameterisations, sigma):
 
     return
 
+  def _update(self):
+    '''Update the cached cell parameters and cell gradients for the crystals
+    whose parameters have changed since the last call'''
+
+    for i, xlucp in enumerate(self._xlucp):
+      param_vals = tuple(xlucp.get_param_vals())
+      if param_vals == self._param_vals[i]: continue
+      self._param_vals[i] = param_vals
+      for col, p in zip(self._cells, xlucp.get_model().get_unit_cell().parameters()):
+        col[i] = p
+      B = xlucp.get_state()
+      dB_dp = flex.mat3_double(xlucp.get_ds_dp())
+      # Use C++ function for speed
+      ccg = CalculateCellGradients(B, dB_dp)
+      grads = [ccg.da_dp, ccg.db_dp, ccg.dc_dp, ccg.daa_dp, ccg.dbb_dp, ccg.dcc_dp]
+      self._cell_grads[i] = [flex.double(g()) if sel else None
+                             for g, sel in zip(grads, self._sel)]
+    return
+
+  @staticmethod
+  def _target_value(values):
+    '''The central value to tie the cell parameters to'''
+    return flex.mean(values)
+
+  def _gradient_factors(self):
+    '''The factors applied to the gradient of a cell parameter to give the
+    gradient of the residual for the same crystal and for every other crystal'''
+    return self._gradfac, -1. * self._meangradfac
+
   def residuals(self):
     """Calculate and return the residuals"""
 
-    cells = [xlucp.get_model().get_unit_cell().parameters() for xlucp in self._xlucp]
-    a, b, c, aa, bb, cc = [flex.double(e) for e in zip(*cells)]
-    resid_a = a - flex.mean(a) if self._sel[0] else None
-    resid_b = b - flex.mean(b) if self._sel[1] else None
-    resid_c = c - flex.mean(c) if self._sel[2] else None
-    resid_aa = aa - flex.mean(aa) if self._sel[3] else None
-    resid_bb = bb - flex.mean(bb) if self._sel[4] else None
-    resid_cc = cc - flex.mean(cc) if self._sel[5] else None
+    self._update()
 
     # collect the residuals for restrained parameters only
-    resid = [e for e in [resid_a, resid_b, resid_c,
-                         resid_aa, resid_bb, resid_cc] if e is not None]
+    resid = [col - self._target_value(col)
+             for col, sel in zip(self._cells, self._sel) if sel]
 
     # stack the columns
     R = resid[0]
@@ -333,27 +361,65 @@ def gradients(self):
     being restrained. Gradients of zero are detected and not set in the sparse
     matrices to save memory."""
 
-    for i, xlucp in enumerate(self._xlucp):
-      B = xlucp.get_state()
-      dB_dp = flex.mat3_double(xlucp.get_ds_dp())
-      # Use C++ function for speed
-      ccg = CalculateCellGradients(B, dB_dp)
-      dRdp = []
-      if self._sel[0]:
-        dRdp.append(self._construct_grad_block(ccg.da_dp(), i))
-      if self._sel[1]:
-        dRdp.append(self._construct_grad_block(ccg.db_dp(), i))
-      if self._sel[2]:
-        dRdp.append(self._construct_grad_block(ccg.dc_dp(), i))
-      if self._sel[3]:
-        dRdp.append(self._construct_grad_block(ccg.daa_dp(), i))
-      if self._sel[4]:
-        dRdp.append(self._construct_grad_block(ccg.dbb_dp(), i))
-      if self._sel[5]:
-        dRdp.append(self._construct_grad_block(ccg.dcc_dp(), i))
+    self._update()
+    for i in range(self._nxls):
+      dRdp = [self._construct_grad_block(g.deep_copy(), i)
+              for g in self._cell_grads[i] if g is not None]
 
       yield dRdp
 
+  def gradient_triplets(self, col_starts, row_start=0):
+    """Return the gradients dR/dp for all the restraints as sparse
+    (row, column, value) triplets. The rows start at row_start and follow the
+    order of the residuals. col_starts gives the column of the first parameter
+    of each crystal's unit cell parameterisation. Gradients of zero are
+    detected and not included. The triplets are assembled directly from the
+    nonzero elements of the cell parameter gradients, without building a
+    dense column or an intermediate sparse matrix for each crystal."""
+
+    self._update()
+    diag_fac, off_fac = self._gradient_factors()
+    rows = flex.size_t()
+    cols = flex.size_t()
+    values = flex.double()
+    irow = row_start
+    for isel, sel in enumerate(self._sel):
+      if not sel: continue
+
+      # gather the gradients of this cell parameter for all crystals, with
+      # their columns and the index of the crystal they belong to
+      grads = flex.double()
+      g_cols = flex.size_t()
+      owner = flex.size_t()
+      for i, icol in enumerate(col_starts):
+        g = self._cell_grads[i][isel]
+        grads.extend(g)
+        g_cols.extend(flex.size_t_range(len(g)) + icol)
+        owner.extend(flex.size_t(len(g), i))
+
+      if off_fac == 0.0:
+        # each residual depends only on the parameters of its own crystal
+        g_values = grads * diag_fac
+        keep = flex.abs(g_values) > 1e-20 # skip gradients close to zero
+        rows.extend(owner.select(keep) + irow)
+        cols.extend(g_cols.select(keep))
+        values.extend(g_values.select(keep))
+      else:
+        # each residual depends on the parameters of every crystal through
+        # the mean, and on its own crystal's parameters with the diagonal
+        # factor
+        off_values = grads * off_fac
+        for i in range(self._nxls):
+          g_values = off_values.deep_copy()
+          own = owner == i
+          g_values.set_selected(own, grads.select(own) * diag_fac)
+          keep = flex.abs(g_values) > 1e-20 # skip gradients close to zero
+          rows.extend(flex.size_t(keep.count(True), irow + i))
+          cols.extend(g_cols.select(keep))
+          values.extend(g_values.select(keep))
+      irow += self._nxls
+    return rows, cols, values
+
   def weights(self):
     '''Return the weights for the residuals vector'''
 
@@ -362,6 +428,11 @@ def weights(self):
 
 class LowMemoryMeanUnitCellTie(MeanUnitCellTie):
 
+  def _gradient_factors(self):
+    '''Ignore the gradients of the mean with respect to the parameters of the
+    other crystals'''
+    return self._gradfac, 0.0
+
   def _construct_grad_block(self, param_grads, i):
     '''helper function to construct a block of gradients. The length of
     param_grads is the number of columns of the block. i selects a row of
@@ -377,28 +448,15 @@ def _construct_grad_block(self, param_grads, i):
 
 class MedianUnitCellTie(MeanUnitCellTie):
 
-  def residuals(self):
-    """Calculate and return the residuals"""
+  @staticmethod
+  def _target_value(values):
+    '''The central value to tie the cell parameters to'''
+    return flex.median(values)
 
-    cells = [xlucp.get_model().get_unit_cell().parameters() for xlucp in self._xlucp]
-    a, b, c, aa, bb, cc = [flex.double(e) for e in zip(*cells)]
-    resid_a = a - flex.median(a) if self._sel[0] else None
-    resid_b = b - flex.median(b) if self._sel[1] else None
-    resid_c = c - flex.median(c) if self._sel[2] else None
-    resid_aa = aa - flex.median(aa) if self._sel[3] else None
-    resid_bb = bb - flex.median(bb) if self._sel[4] else None
-    resid_cc = cc - flex.median(cc) if self._sel[5] else None
-
-    # collect the residuals for restrained parameters only
-    resid = [e for e in [resid_a, resid_b, resid_c,
-                         resid_aa, resid_bb, resid_cc] if e is not None]
-
-    # stack the columns
-    R = resid[0]
-    for r in resid[1:]:
-      R.extend(r)
-
-    return R
+  def _gradient_factors(self):
+    '''The gradients of the median with respect to the parameters are
+    ignored, as in _construct_grad_block'''
+    return 1.0, 0.0
 
   def _construct_grad_block(self, param_grads, i):
     '''helper function to construct a block of gradients. The length of
@@ -19,6 +19,7 @@
 #include <scitbx/vec3.h>
 #include <scitbx/array_family/tiny.h>
 #include <scitbx/math/angle_derivative.h>
+#include <scitbx/sparse/matrix.h>
 #include <dials/array_family/scitbx_shared_and_versa.h>
 #include <dials/error.h>
 
@@ -158,6 +159,30 @@ namespace dials { namespace refinement {
     vec3<double> dbeta_da_, dbeta_dc_;
     vec3<double> dgamma_da_, dgamma_db_;
   };
+
+  /**
+   * Build a sparse matrix from (row, column, value) triplets, such as the
+   * gradients of a group of restraints. Each row and column pair must appear
+   * at most once.
+   */
+  inline
+  scitbx::sparse::matrix<double> sparse_matrix_from_triplets(
+      std::size_t n_rows,
+      std::size_t n_cols,
+      const af::const_ref<std::size_t> &rows,
+      const af::const_ref<std::size_t> &cols,
+      const af::const_ref<double> &values) {
+    DIALS_ASSERT(rows.size() == cols.size());
+    DIALS_ASSERT(rows.size() == values.size());
+    scitbx::sparse::matrix<double> result(n_rows, n_cols);
+    for (std::size_t i = 0; i < values.size(); ++i) {
+      DIALS_ASSERT(rows[i] < n_rows);
+      DIALS_ASSERT(cols[i] < n_cols);
+      result(rows[i], cols[i]) = values[i];
+    }
+    return result;
+  }
+
 }} // namespace dials::refinement
 
 #endif // DIALS_REFINEMENT_RESTRAINTS_HELPERS_H
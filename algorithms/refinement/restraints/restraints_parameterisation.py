@@ -20,6 +20,7 @@
 from dials.algorithms.refinement.restraints.restraints import MeanUnitCellTie
 from dials.algorithms.refinement.restraints.restraints import LowMemoryMeanUnitCellTie
 from dials.algorithms.refinement.restraints.restraints import MedianUnitCellTie
+from dials_refinement_helpers_ext import sparse_matrix_from_triplets
 
 # PHIL options for unit cell restraints
 uc_phil_str = '''
@@ -277,18 +278,29 @@ def get_residuals_gradients_and_weights(self):
       row_start.append(irow)
       irow += len(res)
 
-    # keep track of the row at the start of group models
-    group_model_irow = irow
-
     # process restraints residuals and weights for groups of models
     for r in self._group_model_restraints:
-      residuals.extend(flex.double(r.restraint.residuals()))
+      res = r.restraint.residuals()
+      residuals.extend(flex.double(res))
       weights.extend(flex.double(r.restraint.weights()))
+      row_start.append(irow)
+      irow += len(res)
+
+    # collect the gradients of the group model restraints as sparse triplets
+    rows = flex.size_t()
+    cols = flex.size_t()
+    values = flex.double()
+    for irow, r in zip(row_start[len(self._single_model_restraints):],
+                       self._group_model_restraints):
+      r_rows, r_cols, r_values = r.restraint.gradient_triplets(r.istart, irow)
+      rows.extend(r_rows)
+      cols.extend(r_cols)
+      values.extend(r_values)
 
     # now it is clear how many residuals there are we can set up a sparse
     # matrix for the restraints jacobian
     nrows = len(residuals)
-    gradients = sparse.matrix(nrows, self._nparam)
+    gradients = sparse_matrix_from_triplets(nrows, self._nparam, rows, cols, values)
 
     # assign gradients in blocks for the single model restraints
     for irow, r in zip(row_start, self._single_model_restraints):
@@ -297,14 +309,4 @@ def get_residuals_gradients_and_weights(self):
       grads = flex.double(r.restraint.gradients())
       gradients.assign_block(grads, irow, icol)
 
-    # assign gradients in blocks for the group model restraints
-    for r in self._group_model_restraints:
-      # loop over the included unit cell models, k
-      for k, (icol, grads) in enumerate(zip(r.istart, r.restraint.gradients())):
-        irow = group_model_irow
-        for grad in grads:
-          gradients.assign_block(grad, irow, icol)
-          irow += grad.n_rows
-      group_model_irow = irow
-
     return residuals, gradients, weights
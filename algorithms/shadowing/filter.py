@@ -3,8 +3,10 @@
 def filter_shadowed_reflections(experiments, reflections,
                                 experiment_goniometer=False):
   from dials.util.ext import is_inside_polygon
-  from scitbx.array_family import flex
+  from dials.array_family import flex
   shadowed = flex.bool(reflections.size(), False)
+  index = reflections.spatial_index('xyzcal.px', per=('id', 'panel'))
+  x, y, z = reflections['xyzcal.px'].parts()
   for expt_id in range(len(experiments)):
     expt = experiments[expt_id]
     imageset = expt.imageset
@@ -16,24 +18,21 @@ def filter_shadowed_reflections(experiments, reflections,
       masker = imageset.masker().format_class(
         imageset.paths()[0]).get_goniometer_shadow_masker()
     detector = expt.detector
-    sel = reflections['id'] == expt_id
-    isel = sel.iselection()
-    x,y,z = reflections['xyzcal.px'].select(isel).parts()
+    slices = [index.image_slices(group=(expt_id, p_id))
+              for p_id in range(len(detector))]
     start, end = expt.scan.get_array_range()
     for i in range(start, end):
       shadow = masker.project_extrema(
         detector, expt.scan.get_angle_from_array_index(i))
-      img_sel = (z >= i) & (z < (i+1))
-      img_isel = img_sel.iselection()
       for p_id in range(len(detector)):
-        panel = reflections['panel'].select(img_isel)
         if shadow[p_id].size() < 4:
           continue
-        panel_isel = img_isel.select(panel == p_id)
+        panel_isel = slices[p_id].get(i)
+        if panel_isel is None:
+          continue
         inside = is_inside_polygon(
           shadow[p_id],
-          flex.vec2_double(x.select(isel.select(panel_isel)),
-                           y.select(isel.select(panel_isel))))
+          flex.vec2_double(x.select(panel_isel), y.select(panel_isel)))
         shadowed.set_selected(panel_isel, inside)
 
   return shadowed
@@ -0,0 +1,65 @@
+/*
+ * kdtree.cc
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#include <boost/python.hpp>
+#include <boost/python/def.hpp>
+#include <dials/algorithms/spatial_indexing/kdtree.h>
+
+namespace dials { namespace algorithms { namespace boost_python {
+
+  using namespace boost::python;
+
+  template <typename T>
+  boost::python::tuple pair_to_tuple(const T &p) {
+    return boost::python::make_tuple(p.first, p.second);
+  }
+
+  boost::python::tuple kdtree_knn(
+      const KdTree3 &self,
+      const af::const_ref< vec3<double> > &query,
+      std::size_t k) {
+    return pair_to_tuple(self.knn(query, k));
+  }
+
+  boost::python::tuple kdtree_knn_self(const KdTree3 &self, std::size_t k) {
+    return pair_to_tuple(self.knn_self(k));
+  }
+
+  boost::python::tuple kdtree_radius_pairs(const KdTree3 &self, double radius) {
+    return pair_to_tuple(self.radius_pairs(radius));
+  }
+
+  void export_kdtree() {
+
+    class_<KdTree3>("KdTree3", no_init)
+      .def(init< const af::const_ref< vec3<double> >&,
+                 std::size_t >((
+        arg("points"),
+        arg("leaf_size") = 8)))
+      .def("size", &KdTree3::size)
+      .def("__len__", &KdTree3::size)
+      .def("knn", &kdtree_knn, (
+        arg("query"),
+        arg("k") = 1))
+      .def("knn_self", &kdtree_knn_self, (
+        arg("k") = 1))
+      .def("query_radius", &KdTree3::query_radius, (
+        arg("point"),
+        arg("radius")))
+      .def("query_box", &KdTree3::query_box, (
+        arg("lower"),
+        arg("upper")))
+      .def("radius_pairs", &kdtree_radius_pairs, (
+        arg("radius")));
+
+    def("overlapping_bbox_selection",
+        &overlapping_bbox_selection, (
+          arg("group"),
+          arg("panel"),
+          arg("bbox")));
+  }
+
+}}} // namespace = dials::algorithms::boost_python
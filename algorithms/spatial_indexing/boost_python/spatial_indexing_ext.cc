@@ -17,11 +17,13 @@ namespace dials { namespace algorithms { namespace boost_python {
 
   void export_quadtree();
   void export_octree();
+  void export_kdtree();
 
   BOOST_PYTHON_MODULE(dials_algorithms_spatial_indexing_ext)
   {
     export_quadtree();
     export_octree();
+    export_kdtree();
   }
 
 }}} // namespace = dials::algorithms::boost_python
@@ -0,0 +1,433 @@
+/*
+ * kdtree.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_ALGORITHMS_SPATIAL_INDEXING_KDTREE_H
+#define DIALS_ALGORITHMS_SPATIAL_INDEXING_KDTREE_H
+
+#include <algorithm>
+#include <cmath>
+#include <map>
+#include <queue>
+#include <utility>
+#include <vector>
+#include <scitbx/vec3.h>
+#include <scitbx/array_family/tiny_types.h>
+#include <dials/array_family/scitbx_shared_and_versa.h>
+#include <dials/error.h>
+
+namespace dials { namespace algorithms {
+
+  using scitbx::vec3;
+  using scitbx::af::int6;
+
+  /**
+   * A static k-d tree over a set of 3D points. The tree is built once by
+   * recursively splitting the points at the median of the dimension with the
+   * largest spread, and then answers k nearest neighbour, radius and box
+   * queries. All query functions process the whole set of query points in a
+   * single call so that no per point work is done in Python.
+   */
+  class KdTree3 {
+  public:
+
+    typedef af::versa< std::size_t, af::flex_grid<> > index_array;
+    typedef af::versa< double, af::flex_grid<> > distance_array;
+
+    /**
+     * Build the tree
+     * @param points The list of points
+     * @param leaf_size The maximum number of points in a leaf node
+     */
+    KdTree3(const af::const_ref< vec3<double> > &points,
+            std::size_t leaf_size = 8)
+      : points_(points.begin(), points.end()),
+        index_(points.size()),
+        leaf_size_(leaf_size) {
+      DIALS_ASSERT(leaf_size > 0);
+      for (std::size_t i = 0; i < index_.size(); ++i) {
+        index_[i] = i;
+      }
+      if (points_.size() > 0) {
+        build(0, points_.size());
+      }
+    }
+
+    /**
+     * @returns The number of points in the tree
+     */
+    std::size_t size() const {
+      return points_.size();
+    }
+
+    /**
+     * Find the k nearest neighbours of each query point
+     * @param query The query points
+     * @param k The number of neighbours
+     * @returns The indices and distances (nquery x k) sorted by distance
+     */
+    std::pair<index_array, distance_array> knn(
+        const af::const_ref< vec3<double> > &query,
+        std::size_t k) const {
+      DIALS_ASSERT(k > 0 && k <= size());
+      index_array indices(af::flex_grid<>(query.size(), k));
+      distance_array distances(af::flex_grid<>(query.size(), k));
+      for (std::size_t i = 0; i < query.size(); ++i) {
+        search_knn(query[i], k, size(), &indices[i*k], &distances[i*k]);
+      }
+      return std::make_pair(indices, distances);
+    }
+
+    /**
+     * Find the k nearest neighbours of each point in the tree, excluding the
+     * point itself.
+     * @param k The number of neighbours
+     * @returns The indices and distances (npoints x k) sorted by distance
+     */
+    std::pair<index_array, distance_array> knn_self(std::size_t k) const {
+      DIALS_ASSERT(k > 0 && k < size());
+      index_array indices(af::flex_grid<>(size(), k));
+      distance_array distances(af::flex_grid<>(size(), k));
+      for (std::size_t i = 0; i < size(); ++i) {
+        search_knn(points_[i], k, i, &indices[i*k], &distances[i*k]);
+      }
+      return std::make_pair(indices, distances);
+    }
+
+    /**
+     * Find all the points within a distance of a point
+     * @param point The query point
+     * @param radius The radius
+     * @returns The indices of the points
+     */
+    af::shared<std::size_t> query_radius(
+        const vec3<double> &point,
+        double radius) const {
+      DIALS_ASSERT(radius >= 0);
+      af::shared<std::size_t> result;
+      if (size() > 0) {
+        search_radius(0, point, radius * radius, result);
+      }
+      return result;
+    }
+
+    /**
+     * Find all the points within an axis aligned box (inclusive)
+     * @param lower The lower corner of the box
+     * @param upper The upper corner of the box
+     * @returns The indices of the points
+     */
+    af::shared<std::size_t> query_box(
+        const vec3<double> &lower,
+        const vec3<double> &upper) const {
+      af::shared<std::size_t> result;
+      if (size() > 0) {
+        search_box(0, lower, upper, result);
+      }
+      return result;
+    }
+
+    /**
+     * Find all pairs of points within a distance of each other
+     * @param radius The radius
+     * @returns The pairs of indices (i < j)
+     */
+    std::pair< af::shared<std::size_t>, af::shared<std::size_t> >
+    radius_pairs(double radius) const {
+      DIALS_ASSERT(radius >= 0);
+      af::shared<std::size_t> first;
+      af::shared<std::size_t> second;
+      af::shared<std::size_t> temp;
+      for (std::size_t i = 0; i < size(); ++i) {
+        temp.resize(0);
+        search_radius(0, points_[i], radius * radius, temp);
+        for (std::size_t j = 0; j < temp.size(); ++j) {
+          if (temp[j] > i) {
+            first.push_back(i);
+            second.push_back(temp[j]);
+          }
+        }
+      }
+      return std::make_pair(first, second);
+    }
+
+  private:
+
+    struct Node {
+      std::size_t begin;
+      std::size_t end;
+      std::size_t left;
+      std::size_t right;
+      std::size_t dim;
+      double split;
+      vec3<double> lower;
+      vec3<double> upper;
+      bool leaf;
+    };
+
+    struct by_dimension {
+      const std::vector< vec3<double> > &points;
+      std::size_t dim;
+      by_dimension(const std::vector< vec3<double> > &p, std::size_t d)
+        : points(p), dim(d) {}
+      bool operator()(std::size_t a, std::size_t b) const {
+        return points[a][dim] < points[b][dim];
+      }
+    };
+
+    typedef std::pair<double, std::size_t> neighbour;
+
+    /**
+     * Recursively build a node from the points in index_[begin:end]
+     */
+    std::size_t build(std::size_t begin, std::size_t end) {
+      std::size_t id = nodes_.size();
+      nodes_.push_back(Node());
+      Node node;
+      node.begin = begin;
+      node.end = end;
+      node.left = 0;
+      node.right = 0;
+      node.dim = 0;
+      node.split = 0;
+      node.lower = points_[index_[begin]];
+      node.upper = points_[index_[begin]];
+      for (std::size_t i = begin + 1; i < end; ++i) {
+        const vec3<double> &p = points_[index_[i]];
+        for (std::size_t d = 0; d < 3; ++d) {
+          node.lower[d] = std::min(node.lower[d], p[d]);
+          node.upper[d] = std::max(node.upper[d], p[d]);
+        }
+      }
+      vec3<double> spread = node.upper - node.lower;
+      node.leaf = (end - begin <= leaf_size_) ||
+        (spread[0] == 0 && spread[1] == 0 && spread[2] == 0);
+      if (!node.leaf) {
+        std::size_t dim = 0;
+        if (spread[1] > spread[dim]) dim = 1;
+        if (spread[2] > spread[dim]) dim = 2;
+        std::size_t mid = begin + (end - begin) / 2;
+        std::nth_element(
+            index_.begin() + begin,
+            index_.begin() + mid,
+            index_.begin() + end,
+            by_dimension(points_, dim));
+        node.dim = dim;
+        node.split = points_[index_[mid]][dim];
+        node.left = build(begin, mid);
+        node.right = build(mid, end);
+      }
+      nodes_[id] = node;
+      return id;
+    }
+
+    /**
+     * @returns The squared distance from a point to the node bounding box
+     */
+    static double box_distance_sq(const Node &node, const vec3<double> &p) {
+      double d2 = 0;
+      for (std::size_t d = 0; d < 3; ++d) {
+        double delta = 0;
+        if (p[d] < node.lower[d]) {
+          delta = node.lower[d] - p[d];
+        } else if (p[d] > node.upper[d]) {
+          delta = p[d] - node.upper[d];
+        }
+        d2 += delta * delta;
+      }
+      return d2;
+    }
+
+    /**
+     * Find the k nearest neighbours of a point, ignoring the point with
+     * index exclude, and write them to the output arrays
+     */
+    void search_knn(
+        const vec3<double> &p,
+        std::size_t k,
+        std::size_t exclude,
+        std::size_t *indices,
+        double *distances) const {
+      std::priority_queue<neighbour> heap;
+      search_knn(0, p, k, exclude, heap);
+      DIALS_ASSERT(heap.size() == k);
+      for (std::size_t i = k; i > 0; --i) {
+        indices[i-1] = heap.top().second;
+        distances[i-1] = std::sqrt(heap.top().first);
+        heap.pop();
+      }
+    }
+
+    void search_knn(
+        std::size_t id,
+        const vec3<double> &p,
+        std::size_t k,
+        std::size_t exclude,
+        std::priority_queue<neighbour> &heap) const {
+      const Node &node = nodes_[id];
+      if (heap.size() == k && box_distance_sq(node, p) >= heap.top().first) {
+        return;
+      }
+      if (node.leaf) {
+        for (std::size_t i = node.begin; i < node.end; ++i) {
+          std::size_t j = index_[i];
+          if (j == exclude) {
+            continue;
+          }
+          double d2 = (points_[j] - p).length_sq();
+          if (heap.size() < k) {
+            heap.push(neighbour(d2, j));
+          } else if (d2 < heap.top().first) {
+            heap.pop();
+            heap.push(neighbour(d2, j));
+          }
+        }
+      } else if (p[node.dim] < node.split) {
+        search_knn(node.left, p, k, exclude, heap);
+        search_knn(node.right, p, k, exclude, heap);
+      } else {
+        search_knn(node.right, p, k, exclude, heap);
+        search_knn(node.left, p, k, exclude, heap);
+      }
+    }
+
+    void search_radius(
+        std::size_t id,
+        const vec3<double> &p,
+        double r2,
+        af::shared<std::size_t> &result) const {
+      const Node &node = nodes_[id];
+      if (box_distance_sq(node, p) > r2) {
+        return;
+      }
+      if (node.leaf) {
+        for (std::size_t i = node.begin; i < node.end; ++i) {
+          if ((points_[index_[i]] - p).length_sq() <= r2) {
+            result.push_back(index_[i]);
+          }
+        }
+      } else {
+        search_radius(node.left, p, r2, result);
+        search_radius(node.right, p, r2, result);
+      }
+    }
+
+    void search_box(
+        std::size_t id,
+        const vec3<double> &lower,
+        const vec3<double> &upper,
+        af::shared<std::size_t> &result) const {
+      const Node &node = nodes_[id];
+      for (std::size_t d = 0; d < 3; ++d) {
+        if (node.upper[d] < lower[d] || node.lower[d] > upper[d]) {
+          return;
+        }
+      }
+      if (node.leaf) {
+        for (std::size_t i = node.begin; i < node.end; ++i) {
+          const vec3<double> &q = points_[index_[i]];
+          if (q[0] >= lower[0] && q[0] <= upper[0] &&
+              q[1] >= lower[1] && q[1] <= upper[1] &&
+              q[2] >= lower[2] && q[2] <= upper[2]) {
+            result.push_back(index_[i]);
+          }
+        }
+      } else {
+        search_box(node.left, lower, upper, result);
+        search_box(node.right, lower, upper, result);
+      }
+    }
+
+    std::vector< vec3<double> > points_;
+    std::vector< std::size_t > index_;
+    std::vector< Node > nodes_;
+    std::size_t leaf_size_;
+  };
+
+  /**
+   * Find the bounding boxes which overlap any other bounding box in the same
+   * group and on the same panel. Boxes that just touch are not considered to
+   * overlap. A k-d tree of the box centres is used to find the candidate
+   * boxes, so the cost is O(n log n) rather than building the full overlap
+   * graph.
+   * @param group The group of each box (e.g. experiment or imageset id)
+   * @param panel The panel of each box
+   * @param bbox The bounding boxes
+   * @returns True for boxes which overlap another box
+   */
+  inline
+  af::shared<bool> overlapping_bbox_selection(
+      const af::const_ref<std::size_t> &group,
+      const af::const_ref<std::size_t> &panel,
+      const af::const_ref<int6> &bbox) {
+    DIALS_ASSERT(group.size() == bbox.size());
+    DIALS_ASSERT(panel.size() == bbox.size());
+    af::shared<bool> result(bbox.size(), false);
+
+    // Partition the boxes by group and panel
+    typedef std::map< std::pair<std::size_t, std::size_t>,
+                     std::vector<std::size_t> >
+      partition_type;
+    partition_type partition;
+    for (std::size_t i = 0; i < bbox.size(); ++i) {
+      DIALS_ASSERT(bbox[i][1] >= bbox[i][0]);
+      DIALS_ASSERT(bbox[i][3] >= bbox[i][2]);
+      DIALS_ASSERT(bbox[i][5] >= bbox[i][4]);
+      partition[std::make_pair(group[i], panel[i])].push_back(i);
+    }
+
+    for (partition_type::const_iterator it = partition.begin();
+         it != partition.end(); ++it) {
+      const std::vector<std::size_t> &members = it->second;
+      if (members.size() < 2) {
+        continue;
+      }
+
+      // Build the tree from the box centres and find the largest half size
+      af::shared< vec3<double> > centre(members.size());
+      vec3<double> max_half(0, 0, 0);
+      for (std::size_t i = 0; i < members.size(); ++i) {
+        const int6 &b = bbox[members[i]];
+        for (std::size_t d = 0; d < 3; ++d) {
+          centre[i][d] = (b[2*d] + b[2*d+1]) / 2.0;
+          max_half[d] = std::max(max_half[d], (b[2*d+1] - b[2*d]) / 2.0);
+        }
+      }
+      KdTree3 tree(centre.const_ref());
+
+      // Any box overlapping box i must have a centre within the sum of the
+      // half sizes. Check the candidates for a real overlap.
+      for (std::size_t i = 0; i < members.size(); ++i) {
+        if (result[members[i]]) {
+          continue;
+        }
+        const int6 &a = bbox[members[i]];
+        vec3<double> extent;
+        for (std::size_t d = 0; d < 3; ++d) {
+          extent[d] = (a[2*d+1] - a[2*d]) / 2.0 + max_half[d];
+        }
+        af::shared<std::size_t> candidates = tree.query_box(
+            centre[i] - extent, centre[i] + extent);
+        for (std::size_t j = 0; j < candidates.size(); ++j) {
+          if (candidates[j] == i) {
+            continue;
+          }
+          const int6 &b = bbox[members[candidates[j]]];
+          if (a[0] < b[1] && b[0] < a[1] &&
+              a[2] < b[3] && b[2] < a[3] &&
+              a[4] < b[5] && b[4] < a[5]) {
+            result[members[i]] = true;
+            result[members[candidates[j]]] = true;
+            break;
+          }
+        }
+      }
+    }
+    return result;
+  }
+
+}} // namespace dials::algorithms
+
+#endif // DIALS_ALGORITHMS_SPATIAL_INDEXING_KDTREE_H
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+#
+# reflection_index.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division, print_function
+
+
+class ReflectionSpatialIndex(object):
+  '''
+  A spatial index of the reflections in a reflection table.
+
+  The reflection positions are taken from a vec3_double or vec2_double column
+  or from a list of up to three double columns. A k-d tree is built for each
+  group of reflections sharing the values of the "per" columns (e.g. for each
+  panel) and all queries return indices of rows in the reflection table.
+
+  The index keeps a copy of the columns it was built from so that it can be
+  checked against the table; use reflection_table.spatial_index to get an
+  index which is rebuilt when the columns have changed.
+
+  '''
+
+  def __init__(self, reflections, columns='xyzobs.px.value', per='panel',
+               leaf_size=8):
+    '''
+    Build the index
+
+    :param reflections: The reflection table
+    :param columns: The position column or a list of coordinate columns
+    :param per: A column or list of columns to group the reflections by
+    :param leaf_size: The maximum number of points in a leaf of the trees
+
+    '''
+    from dials.algorithms.spatial_indexing import KdTree3
+    from dials.array_family import flex
+    if isinstance(columns, str):
+      columns = (columns,)
+    if per is None:
+      per = ()
+    elif isinstance(per, str):
+      per = (per,)
+    self.columns = tuple(columns)
+    self.per = tuple(per)
+    self._coords = self._positions(reflections, self.columns)
+    self._keys = [reflections[name].deep_copy() for name in self.per]
+
+    # Find the rows in each group
+    self._rows = {}
+    if len(self.per) == 0:
+      self._rows[None] = flex.size_t_range(len(reflections))
+    else:
+      self._find_groups(flex.bool(len(reflections), True), 0, ())
+
+    # Build a tree for each group
+    self._trees = dict(
+      (key, KdTree3(self._coords.select(rows), leaf_size=leaf_size))
+      for key, rows in self._rows.items())
+
+  def _find_groups(self, selection, depth, key):
+    '''
+    Split the selected rows by the values of the remaining per columns
+
+    '''
+    column = self._keys[depth]
+    for value in sorted(set(column.select(selection))):
+      subset = selection & (column == value)
+      if depth + 1 < len(self._keys):
+        self._find_groups(subset, depth + 1, key + (value,))
+      elif len(self._keys) == 1:
+        self._rows[value] = subset.iselection()
+      else:
+        self._rows[key + (value,)] = subset.iselection()
+
+  @staticmethod
+  def _positions(reflections, columns):
+    '''
+    Get the positions as a vec3_double array, padding with zeros
+
+    '''
+    from dials.array_family import flex
+    if len(columns) == 1:
+      data = reflections[columns[0]]
+      if isinstance(data, flex.vec3_double):
+        return data.deep_copy()
+      elif isinstance(data, flex.vec2_double):
+        x, y = data.parts()
+        return flex.vec3_double(x, y, flex.double(len(x), 0))
+    if len(columns) > 3:
+      raise RuntimeError('At most 3 coordinate columns can be indexed')
+    parts = []
+    for name in columns:
+      data = reflections[name]
+      if not isinstance(data, flex.double):
+        data = data.as_double()
+      parts.append(data)
+    while len(parts) < 3:
+      parts.append(flex.double(len(reflections), 0))
+    return flex.vec3_double(*parts)
+
+  def is_valid(self, reflections):
+    '''
+    Check the index is consistent with the columns of the reflection table
+
+    :param reflections: The reflection table
+    :return: True/False the index is valid
+
+    '''
+    if len(reflections) != len(self._coords):
+      return False
+    for name in self.columns + self.per:
+      if name not in reflections:
+        return False
+    coords = self._positions(reflections, self.columns)
+    if not (coords == self._coords).all_eq(True):
+      return False
+    for name, key in zip(self.per, self._keys):
+      if not (reflections[name] == key).all_eq(True):
+        return False
+    return True
+
+  def groups(self):
+    '''
+    :return: The sorted list of group keys
+
+    '''
+    return sorted(self._rows.keys())
+
+  def rows(self, group=None):
+    '''
+    :param group: The group key or None for all groups
+    :return: The rows in the group
+
+    '''
+    from dials.array_family import flex
+    if group is None and None not in self._rows:
+      return flex.size_t_range(len(self._coords))
+    return self._rows.get(group, flex.size_t())
+
+  def _query(self, function, group):
+    '''
+    Apply a query to the tree of a group, or all the trees, and return the
+    matching rows in order.
+
+    '''
+    from dials.array_family import flex
+    if group is not None or None in self._rows:
+      if group not in self._trees:
+        return flex.size_t()
+      return self._rows[group].select(function(self._trees[group]))
+    result = flex.size_t()
+    for key in self.groups():
+      result.extend(self._rows[key].select(function(self._trees[key])))
+    return result.select(flex.sort_permutation(result))
+
+  def box(self, lower, upper, group=None):
+    '''
+    Find the reflections within an axis aligned box (inclusive)
+
+    :param lower: The lower corner of the box
+    :param upper: The upper corner of the box
+    :param group: The group key or None for all groups
+    :return: The matching rows
+
+    '''
+    lower = tuple(lower) + (0,) * (3 - len(lower))
+    upper = tuple(upper) + (0,) * (3 - len(upper))
+    return self._query(lambda tree: tree.query_box(lower, upper), group)
+
+  def radius(self, point, radius, group=None):
+    '''
+    Find the reflections within a distance of a point
+
+    :param point: The point
+    :param radius: The radius
+    :param group: The group key or None for all groups
+    :return: The matching rows
+
+    '''
+    point = tuple(point) + (0,) * (3 - len(point))
+    return self._query(lambda tree: tree.query_radius(point, radius), group)
+
+  def knn(self, points, k=1, group=None):
+    '''
+    Find the k nearest reflections to each point within a group
+
+    :param points: The query points (vec3_double)
+    :param k: The number of neighbours
+    :param group: The group key. May be None only if there is one group.
+    :return: The rows and distances (npoints x k) sorted by distance
+
+    '''
+    from dials.array_family import flex
+    if group is None and None not in self._trees:
+      if len(self._trees) != 1:
+        raise RuntimeError('A group must be given for a k-NN query')
+      group = list(self._trees.keys())[0]
+    indices, distances = self._trees[group].knn(points, k)
+    rows = self._rows[group].select(indices.as_1d())
+    rows.reshape(flex.grid(len(points), k))
+    return rows, distances
+
+  def image_slices(self, group=None):
+    '''
+    Split the reflections into images using the third coordinate, where the
+    reflections on image i have i <= z < i + 1.
+
+    :param group: The group key or None for all groups
+    :return: A dictionary of image index and rows
+
+    '''
+    from dials.array_family import flex
+    from bisect import bisect_left
+    rows = self.rows(group)
+    if len(rows) == 0:
+      return {}
+    frame = flex.floor(self._coords.select(rows).parts()[2]).iround()
+    perm = flex.sort_permutation(frame)
+    rows = rows.select(perm)
+    frame = list(frame.select(perm))
+    result = {}
+    begin = 0
+    while begin < len(frame):
+      end = bisect_left(frame, frame[begin] + 1, begin)
+      result[frame[begin]] = rows[begin:end]
+      begin = end
+    return result
@@ -11,6 +11,7 @@
 #include <boost/python.hpp>
 #include <boost/python/def.hpp>
 #include <dials/algorithms/spot_finding/helpers.h>
+#include <dials/algorithms/spot_finding/spot_filters.h>
 
 namespace dials { namespace algorithms { namespace boost_python {
 
@@ -23,6 +24,19 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("shoeboxes", &StrongSpotCombiner::shoeboxes)
       ;
 
+    def("background_gradient_filter", &background_gradient_filter, (
+      arg("shoeboxes"),
+      arg("trusted_range"),
+      arg("buffer_size"),
+      arg("gradient_cutoff")));
+
+    def("spots_in_dense_bins", &spots_in_dense_bins, (
+      arg("x"),
+      arg("y"),
+      arg("xedges"),
+      arg("yedges"),
+      arg("dense")));
+
   }
 
 }}}
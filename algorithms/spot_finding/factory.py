@@ -1,6 +1,5 @@
 from __future__ import absolute_import, division, print_function
 
-import collections
 import logging
 logger = logging.getLogger(__name__)
 
@@ -83,6 +82,9 @@ def generate_phil_scope():
           .type = int(value_min=1)
         gradient_cutoff = 4
           .type = float(value_min=0)
+        nthreads = 1
+          .type = int(value_min=1)
+          .help = "The number of threads used to extract the shoeboxes"
       }
 
       spot_density
@@ -234,114 +236,55 @@ def __call__(self, flags, **kwargs):
 
 class BackgroundGradientFilter(object):
 
-  def __init__(self, background_size=2, gradient_cutoff=4):
+  def __init__(self, background_size=2, gradient_cutoff=4, nthreads=1):
     self.background_size = background_size
     self.gradient_cutoff = gradient_cutoff
+    self.nthreads = nthreads
 
   def run(self, flags, sweep=None, shoeboxes=None, **kwargs):
     from dials.array_family import flex
-    from dials.algorithms.shoebox import MaskCode
-    from dials.algorithms.background.simple import Linear2dModeller
-    bg_code = MaskCode.Valid | MaskCode.BackgroundUsed
-    fg_code = MaskCode.Valid | MaskCode.Foreground
-    strong_code = MaskCode.Valid | MaskCode.Strong
-
-    modeller = Linear2dModeller()
-    expanded_shoeboxes = flex.shoebox()
+    from dials.algorithms.spot_finding import background_gradient_filter
     detector = sweep.get_detector()
+    buffer_size = 1
+    bg_plus_buffer = self.background_size + buffer_size
 
-    zoffset = 0
-    if sweep.get_scan() is not None:
-      zoffset = sweep.get_scan().get_array_range()[0]
-
-    class image_data_cache(object):
-      def __init__(self, imageset, size=10):
-        self.imageset = imageset
-        self.size = size
-        self._image_data = collections.OrderedDict()
-
-      def __getitem__(self, i):
-        image_data = self._image_data.get(i)
-        if image_data is None:
-          image_data = self.imageset.get_raw_data(i)
-          if len(self._image_data) >= self.size:
-            # remove the oldest entry in the cache
-            del self._image_data[self._image_data.keys()[0]]
-          self._image_data[i] = image_data
-        return image_data
-
-    cache = image_data_cache(sweep)
-    #cache = sweep
-
-    # sort shoeboxes by centroid z
+    # select the spots still to be filtered, sorted by centroid z
+    isel = flags.iselection()
+    shoeboxes = shoeboxes.select(isel)
     frame = shoeboxes.centroid_all().position_frame()
     perm = flex.sort_permutation(frame)
+    isel = isel.select(perm)
     shoeboxes = shoeboxes.select(perm)
-    buffer_size = 1
-    bg_plus_buffer = self.background_size + buffer_size
 
-    import time
-    t0 = time.time()
-    for i, shoebox in enumerate(shoeboxes):
-      if not flags[perm[i]]:
-        continue
-      panel = detector[shoebox.panel]
-      trusted_range = panel.get_trusted_range()
-      max_x, max_y = panel.get_image_size()
-      bbox = shoebox.bbox
-      x1, x2, y1, y2, z1, z2 = bbox
-      # expand the bbox with a background region around the spotfinder shoebox
-      # perhaps also should use a buffer zone between the shoebox and the
-      # background region
-      expanded_bbox = (max(0, x1-bg_plus_buffer),
-                       min(max_x, x2+bg_plus_buffer),
-                       max(0, y1-bg_plus_buffer),
-                       min(max_y, y2+bg_plus_buffer),
-                       z1, z2)
-      shoebox.bbox = expanded_bbox
-    t1 = time.time()
-    logger.info("Time expand_shoebox: %s" %(t1-t0))
+    # expand the bbox with a background region around the spotfinder shoebox
+    panel = shoeboxes.panels()
+    max_x = flex.int([p.get_image_size()[0] for p in detector]).select(panel)
+    max_y = flex.int([p.get_image_size()[1] for p in detector]).select(panel)
+    x1, x2, y1, y2, z1, z2 = shoeboxes.bounding_boxes().parts()
+    x1 = x1 - bg_plus_buffer
+    x2 = x2 + bg_plus_buffer
+    y1 = y1 - bg_plus_buffer
+    y2 = y2 + bg_plus_buffer
+    x1.set_selected(x1 < 0, 0)
+    y1.set_selected(y1 < 0, 0)
+    x2.set_selected(x2 > max_x, max_x.select(x2 > max_x))
+    y2.set_selected(y2 > max_y, max_y.select(y2 > max_y))
 
     rlist = flex.reflection_table()
-    rlist['shoebox'] = shoeboxes
-    rlist['shoebox'].allocate()
-    rlist['panel'] = shoeboxes.panels()
-    rlist['bbox'] = shoeboxes.bounding_boxes()
-
-    t0 = time.time()
-    rlist.extract_shoeboxes(sweep)
-    t1 = time.time()
-
-    shoeboxes = rlist['shoebox']
-    shoeboxes.flatten()
-
-    t0 = time.time()
-    for i, shoebox in enumerate(shoeboxes):
-      if not flags[perm[i]]: continue
-      panel = detector[shoebox.panel]
-      trusted_range = panel.get_trusted_range()
-      max_x, max_y = panel.get_image_size()
-      ex1, ex2, ey1, ey2, ez1, ez2 = shoebox.bbox
-      data = shoebox.data
-      mask = flex.bool(data.accessor(), False)
-      for i_y, y in enumerate(range(ey1, ey2)):
-        for i_x, x in enumerate(range(ex1, ex2)):
-          value = data[0, i_y, i_x]
-          if (y >= (ey1+buffer_size) and y < (ey2-buffer_size) and
-              x >= (ex1+buffer_size) and x < (ex2-buffer_size)):
-            mask[0, i_y, i_x] = False # foreground
-          elif value > trusted_range[0] and value < trusted_range[1]:
-            mask[0, i_y, i_x] = True # background
-
-      model = modeller.create(data.as_double(), mask)
-      d, a, b = model.params()[:3]
-      c = -1
-
-      if abs(a) > self.gradient_cutoff or abs(b) > self.gradient_cutoff:
-        flags[perm[i]] = False
-
-    t1 = time.time()
-
+    rlist['panel'] = panel
+    rlist['bbox'] = flex.int6(x1, x2, y1, y2, z1, z2)
+    rlist['shoebox'] = flex.shoebox(rlist['panel'], rlist['bbox'],
+                                    allocate=True)
+    rlist.extract_shoeboxes(sweep, nthreads=self.nthreads)
+    rlist['shoebox'].flatten()
+
+    # fit a plane to the background of each shoebox and reject the spots
+    # with a steep gradient
+    trusted_range = flex.vec2_double(
+      [p.get_trusted_range() for p in detector])
+    keep = background_gradient_filter(
+      rlist['shoebox'], trusted_range, buffer_size, self.gradient_cutoff)
+    flags.set_selected(isel.select(~keep), False)
     return flags
 
   def __call__(self, flags, **kwargs):
@@ -394,13 +337,15 @@ def run(self, flags, sweep=None, observations=None, **kwargs):
           g < self.gradient_cutoff and gradients[i-1] < self.gradient_cutoff):
         cutoff = hist.slot_centers()[i-1]-0.5*hist.slot_width()
 
-    H_flex = flex.double(np.ascontiguousarray(H))
-    isel = (H_flex > cutoff).iselection()
-    sel = np.column_stack(np.where(H > cutoff))
-    for (ix, iy) in sel:
-      flags.set_selected(
-        ((obs_x > xedges[ix]) & (obs_x < xedges[ix+1]) &
-         (obs_y > yedges[iy]) & (obs_y < yedges[iy+1])), False)
+    if cutoff is None:
+      return flags
+
+    from dials.algorithms.spot_finding import spots_in_dense_bins
+    dense = flex.bool(np.ascontiguousarray(H > cutoff).flatten().tolist())
+    dense.reshape(flex.grid(H.shape))
+    flags.set_selected(spots_in_dense_bins(
+      obs_x, obs_y, flex.double(xedges.tolist()),
+      flex.double(yedges.tolist()), dense), False)
 
     if 0:
       from matplotlib import pyplot
@@ -563,7 +508,8 @@ def configure_filter(params):
       bg_filter_params = params.spotfinder.filter.background_gradient
       filters.append(BackgroundGradientFilter(
         background_size=bg_filter_params.background_size,
-        gradient_cutoff=bg_filter_params.gradient_cutoff))
+        gradient_cutoff=bg_filter_params.gradient_cutoff,
+        nthreads=bg_filter_params.nthreads))
 
     if params.spotfinder.filter.spot_density.filter:
       filters.append(SpotDensityFilter())
@@ -714,8 +714,8 @@ def stats_imageset(imageset, reflections, resolution_analysis=True, plot=False):
   noisiness_method_1 = []
   noisiness_method_2 = []
 
-  image_number = reflections['xyzobs.px.value'].parts()[2]
-  image_number = flex.floor(image_number)
+  image_slices = reflections.spatial_index(
+    'xyzobs.px.value', per=None).image_slices()
 
   try:
     start, end = imageset.get_array_range()
@@ -724,7 +724,7 @@ def stats_imageset(imageset, reflections, resolution_analysis=True, plot=False):
   for i in range(len(imageset)):
     stats = stats_single_image(
       imageset[i:i+1],
-      reflections.select(image_number==i+start), i=i+start,
+      reflections.select(image_slices.get(i+start, flex.size_t())), i=i+start,
       resolution_analysis=resolution_analysis, plot=plot)
     n_spots_total.append(stats.n_spots_total)
     n_spots_no_ice.append(stats.n_spots_no_ice)
@@ -0,0 +1,117 @@
+/*
+ * spot_filters.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_ALGORITHMS_SPOT_FINDING_SPOT_FILTERS_H
+#define DIALS_ALGORITHMS_SPOT_FINDING_SPOT_FILTERS_H
+
+#include <cmath>
+#include <algorithm>
+#include <scitbx/vec2.h>
+#include <dials/model/data/shoebox.h>
+#include <dials/algorithms/background/simple/modeller.h>
+#include <dials/array_family/scitbx_shared_and_versa.h>
+#include <dials/error.h>
+
+namespace dials { namespace algorithms {
+
+  using scitbx::vec2;
+  using dials::model::Shoebox;
+  using dials::algorithms::background::Linear2dModeller;
+  using dials::algorithms::background::Model;
+
+  /**
+   * Find the spots with a steep background gradient. A plane is fitted to
+   * the trusted pixels of each (flattened) shoebox outside the central
+   * region, which is the shoebox shrunk by the buffer size.
+   * @param shoeboxes The flattened shoeboxes with background regions
+   * @param trusted_range The trusted range of each panel
+   * @param buffer_size The size of the buffer around the central region
+   * @param gradient_cutoff The maximum background gradient
+   * @returns True for spots to keep
+   */
+  inline
+  af::shared<bool> background_gradient_filter(
+      const af::const_ref< Shoebox<> > &shoeboxes,
+      const af::const_ref< vec2<double> > &trusted_range,
+      int buffer_size,
+      double gradient_cutoff) {
+    DIALS_ASSERT(buffer_size >= 0);
+    Linear2dModeller modeller;
+    af::shared<bool> result(shoeboxes.size(), true);
+    for (std::size_t n = 0; n < shoeboxes.size(); ++n) {
+      const Shoebox<> &sbox = shoeboxes[n];
+      DIALS_ASSERT(sbox.is_consistent());
+      DIALS_ASSERT(sbox.panel < trusted_range.size());
+      DIALS_ASSERT(sbox.zsize() == 1);
+      double tmin = trusted_range[sbox.panel][0];
+      double tmax = trusted_range[sbox.panel][1];
+      int ysize = sbox.ysize();
+      int xsize = sbox.xsize();
+      af::c_grid<3> accessor(1, ysize, xsize);
+      af::versa< double, af::c_grid<3> > data(accessor);
+      af::versa< bool, af::c_grid<3> > mask(accessor, false);
+      for (int j = 0; j < ysize; ++j) {
+        for (int i = 0; i < xsize; ++i) {
+          double value = sbox.data(0, j, i);
+          bool central = (
+            j >= buffer_size && j < ysize - buffer_size &&
+            i >= buffer_size && i < xsize - buffer_size);
+          data(0, j, i) = value;
+          mask(0, j, i) = !central && value > tmin && value < tmax;
+        }
+      }
+      boost::shared_ptr<Model> model = modeller.create(
+          data.const_ref(), mask.const_ref());
+      af::shared<double> params = model->params();
+      if (std::abs(params[1]) > gradient_cutoff ||
+          std::abs(params[2]) > gradient_cutoff) {
+        result[n] = false;
+      }
+    }
+    return result;
+  }
+
+  /**
+   * Find the spots which fall in dense bins of a 2D histogram. A spot is in a
+   * bin if it lies strictly between the bin edges in both directions.
+   * @param x The spot x coordinates
+   * @param y The spot y coordinates
+   * @param xedges The increasing bin edges in x
+   * @param yedges The increasing bin edges in y
+   * @param dense The (nx, ny) flags of bins which are too dense
+   * @returns True for spots in a dense bin
+   */
+  inline
+  af::shared<bool> spots_in_dense_bins(
+      const af::const_ref<double> &x,
+      const af::const_ref<double> &y,
+      const af::const_ref<double> &xedges,
+      const af::const_ref<double> &yedges,
+      const af::const_ref< bool, af::c_grid<2> > &dense) {
+    DIALS_ASSERT(x.size() == y.size());
+    DIALS_ASSERT(xedges.size() >= 2 && yedges.size() >= 2);
+    DIALS_ASSERT(dense.accessor()[0] == xedges.size() - 1);
+    DIALS_ASSERT(dense.accessor()[1] == yedges.size() - 1);
+    af::shared<bool> result(x.size(), false);
+    for (std::size_t n = 0; n < x.size(); ++n) {
+      const double *xu = std::upper_bound(xedges.begin(), xedges.end(), x[n]);
+      const double *yu = std::upper_bound(yedges.begin(), yedges.end(), y[n]);
+      if (xu == xedges.begin() || xu == xedges.end() ||
+          yu == yedges.begin() || yu == yedges.end()) {
+        continue;
+      }
+      std::size_t ix = (xu - xedges.begin()) - 1;
+      std::size_t iy = (yu - yedges.begin()) - 1;
+      if (x[n] > xedges[ix] && y[n] > yedges[iy]) {
+        result[n] = dense(ix, iy);
+      }
+    }
+    return result;
+  }
+
+}} // namespace dials::algorithms
+
+#endif // DIALS_ALGORITHMS_SPOT_FINDING_SPOT_FILTERS_H
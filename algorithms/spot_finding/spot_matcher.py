@@ -10,6 +10,10 @@
 
 from __future__ import absolute_import, division
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 
 class SpotMatcher(object):
   '''Match the observed with predicted spots.'''
@@ -25,7 +29,7 @@ def __init__(self, max_separation=2):
     self._max_separation = max_separation
 
   def __call__(self, observed, predicted):
-    '''i
+    '''
     Match the observed reflections with the predicted.
 
     :param observed: The list of observed reflections.
@@ -34,27 +38,17 @@ def __call__(self, observed, predicted):
     :returns: The list of matched reflections
 
     '''
-    from dials.array_family import flex
-
     # Find the nearest neighbours and distances
-    # Command.start('Finding nearest neighbours')
-    nn, dist = self._find_nearest_neighbours(observed, predicted)
-    # Command.end('Found nearest neighbours')
+    oind, nn, dist = self._find_nearest_neighbours(observed, predicted)
 
     # Filter the matches by distance
-    # Command.start('Filtering matches by distance')
     index = self._filter_by_distance(nn, dist)
-    # Command.end('Filtered {0} matches by distance'.format(len(index)))
 
     # Filter out duplicates to just leave the closest pairs
-    # Command.start('Removing duplicate matches')
-    len_index = len(index)
     index = self._filter_duplicates(index, nn, dist)
-    len_diff = len_index - len(index)
-    # Command.end('Removed {0} duplicate match(es)'.format(len_diff))
 
-    # Copy all of the reflection data for the matched reflections
-    return flex.size_t(index), flex.size_t([nn[i] for i in index])
+    # Return the indices of the matched reflections
+    return oind.select(index), nn.select(index)
 
   def _find_nearest_neighbours(self, observed, predicted):
     '''
@@ -63,10 +57,10 @@ def _find_nearest_neighbours(self, observed, predicted):
     :param observed: The observed reflections
     :param predicted: The predicted reflections
 
-    :returns: (nearest neighbours, distance)
+    :returns: (observed indices, nearest neighbours, distance)
 
     '''
-    from scitbx.array_family import flex
+    from dials.array_family import flex
 
     # Get the predicted coordinates
     predicted_panel = predicted['panel']
@@ -79,22 +73,23 @@ def _find_nearest_neighbours(self, observed, predicted):
     max_panel2 = flex.max(observed_panel)
     max_panel = max([max_panel1, max_panel2])
 
+    oind_all = flex.size_t()
     nn_all = flex.size_t()
     dd_all = flex.double()
     for panel in range(max_panel+1):
-      pind = predicted_panel == panel
-      oind = observed_panel == panel
+      pind = (predicted_panel == panel).iselection()
+      oind = (observed_panel == panel).iselection()
+      if len(pind) == 0 or len(oind) == 0:
+        if len(oind) > 0:
+          logger.warning("Unable to match spots on panel %d" % panel)
+        continue
       pxyz = predicted_xyz.select(pind)
       oxyz = observed_xyz.select(oind)
-      try:
-        nn, d = self._find_nearest_neighbours_single(oxyz, pxyz)
-        indices = flex.size_t(range(len(pind))).select(pind)
-        indices = indices.select(flex.size_t(list(nn)))
-        nn_all.extend(indices)
-        dd_all.extend(d)
-      except Exception:
-        warn("Unable to match spots on panel %d" % panel)
-    return nn_all, dd_all
+      nn, d = self._find_nearest_neighbours_single(oxyz, pxyz)
+      oind_all.extend(oind)
+      nn_all.extend(pind.select(nn))
+      dd_all.extend(d)
+    return oind_all, nn_all, dd_all
 
   def _find_nearest_neighbours_single(self, oxyz, pxyz):
     '''
@@ -106,17 +101,13 @@ def _find_nearest_neighbours_single(self, oxyz, pxyz):
     :returns: (nearest neighbours, distance)
 
     '''
-    from annlib_ext import AnnAdaptor
-    from scitbx.array_family import flex
+    from dials.algorithms.spatial_indexing import KdTree3
 
-    # Create the KD Tree
-    ann = AnnAdaptor(pxyz.as_double().as_1d(), 3)
-
-    # Query to find all the nearest neighbours
-    ann.query(oxyz.as_double().as_1d())
+    # Create the KD Tree and query to find all the nearest neighbours
+    nn, distances = KdTree3(pxyz).knn(oxyz, k=1)
 
     # Return the nearest neighbours and distances
-    return ann.nn, flex.sqrt(ann.distances)
+    return nn.as_1d(), distances.as_1d()
 
   def _filter_by_distance(self, nn, dist):
     '''
@@ -128,9 +119,7 @@ def _filter_by_distance(self, nn, dist):
     :returns: A reduced list of nearest neighbours
 
     '''
-    from scitbx.array_family import flex
-    index = range(len(nn))
-    return flex.int([i for i in index if dist[i] <= self._max_separation])
+    return (dist <= self._max_separation).iselection()
 
   def _filter_duplicates(self, index, nn, dist):
     '''
@@ -143,17 +132,20 @@ def _filter_duplicates(self, index, nn, dist):
     :returns: A reduced list of nearest neighbours
 
     '''
-    seen = {}
-    for i in index:
-      p = nn[i]
-      if p in seen:
-        j = seen[p]
-        if dist[i] < dist[j]:
-          seen[p] = i
-      else:
-        seen[p] = i;
-
-    index = []
-    for k, v in seen.iteritems():
-      index.append(v)
-    return index
+    from dials.array_family import flex
+    if len(index) == 0:
+      return index
+
+    # Sort by distance and then (stably) by the predicted index so that the
+    # closest match to each predicted spot is first in each run
+    index = index.select(flex.sort_permutation(dist.select(index)))
+    index = index.select(flex.sort_permutation(nn.select(index), stable=True))
+
+    # Keep the first match to each predicted spot
+    sorted_nn = nn.select(index)
+    first = flex.bool(len(index), True)
+    first.set_selected(
+      flex.size_t_range(len(index) - 1) + 1,
+      sorted_nn[1:] != sorted_nn[:-1])
+    index = index.select(first)
+    return index.select(flex.sort_permutation(index))
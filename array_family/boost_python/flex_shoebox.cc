@@ -444,6 +444,20 @@ namespace dials { namespace af { namespace boost_python {
     return result;
   }
 
+  /**
+   * Keep only the given mask codes in the allocated shoeboxes
+   */
+  template <typename FloatType>
+  void reset_mask_values(
+      ref< Shoebox<FloatType> > a, int code) {
+    for (std::size_t i = 0; i < a.size(); ++i) {
+      af::ref< int, af::c_grid<3> > mask = a[i].mask.ref();
+      for (std::size_t j = 0; j < mask.size(); ++j) {
+        mask[j] &= code;
+      }
+    }
+  }
+
   /**
    * Get the maximum index of each shoebox
    */
@@ -1057,6 +1071,8 @@ namespace dials { namespace af { namespace boost_python {
           &bounding_boxes<FloatType>)
         .def("count_mask_values",
           &count_mask_values<FloatType>)
+        .def("reset_mask_values",
+          &reset_mask_values<FloatType>)
         .def("is_bbox_within_image_volume",
           &is_bbox_within_image_volume<FloatType>, (
             boost::python::arg("image_size"),
@@ -16,6 +16,25 @@ namespace dials { namespace af { namespace boost_python {
 
   using namespace boost::python;
 
+  /**
+   * Extract the next image with a number of threads. The GIL is released so
+   * that the next image can be read by another Python thread.
+   */
+  template <typename T>
+  void shoebox_extractor_next_threaded(
+      ShoeboxExtractor &self,
+      const Image<T> &image,
+      std::size_t nthreads) {
+    PyThreadState *state = PyEval_SaveThread();
+    try {
+      self.next_threaded(image, nthreads);
+    } catch (...) {
+      PyEval_RestoreThread(state);
+      throw;
+    }
+    PyEval_RestoreThread(state);
+  }
+
   void export_flex_shoebox_extractor()
   {
     class_<ShoeboxExtractor>("ShoeboxExtractor", no_init)
@@ -30,6 +49,9 @@ namespace dials { namespace af { namespace boost_python {
       .def("next", &ShoeboxExtractor::next<int>)
       .def("next", &ShoeboxExtractor::next<float>)
       .def("next", &ShoeboxExtractor::next<double>)
+      .def("next_threaded", &shoebox_extractor_next_threaded<int>)
+      .def("next_threaded", &shoebox_extractor_next_threaded<float>)
+      .def("next_threaded", &shoebox_extractor_next_threaded<double>)
       .def("finished", &ShoeboxExtractor::finished)
       .def("frame0", &ShoeboxExtractor::frame0)
       .def("frame1", &ShoeboxExtractor::frame1)
@@ -9,6 +9,7 @@
 #  included in the root directory of this package.
 from __future__ import absolute_import, division
 import boost.python
+import weakref
 from dials.model import data
 from dials_array_family_flex_ext import *
 from cctbx.array_family.flex import *
@@ -61,6 +62,9 @@ def default_centroid_algorithm():
   from dials.extensions.simple_centroid_ext import SimpleCentroidExt
   return strategy(SimpleCentroidExt)
 
+# Spatial indices of reflection tables, removed with the table
+_spatial_index_cache = weakref.WeakKeyDictionary()
+
 class reflection_table_aux(boost.python.injector, reflection_table):
   '''
   An injector class to add additional methods to the reflection table.
@@ -75,6 +79,11 @@ class reflection_table_aux(boost.python.injector, reflection_table):
   _background_algorithm = default_background_algorithm()
   _centroid_algorithm = default_centroid_algorithm()
 
+  # An optional object used by as_pickle instead of writing the file directly.
+  # This is set by the in-process idials pipeline so that output tables can be
+  # kept in memory and the pickle files written in the background
+  _pickle_writer = None
+
   @staticmethod
   def from_predictions(experiment,
                        dmin=None,
@@ -365,6 +374,9 @@ def as_pickle(self, filename):
     import six.moves.cPickle as pickle
     from libtbx import smart_open
 
+    if self._pickle_writer is not None:
+      self._pickle_writer.write(self, filename)
+      return
     with smart_open.for_writing(filename, 'wb') as outfile:
       pickle.dump(self, outfile, protocol=pickle.HIGHEST_PROTOCOL)
 
@@ -955,28 +967,107 @@ def extract_shoeboxes(self, imageset, mask=None, nthreads=1, verbose=False):
       frame0, frame1 = (0, len(imageset))
     extractor = ShoeboxExtractor(self, len(detector), frame0, frame1)
     logger.info(" Beginning to read images")
-    read_time = 0
-    extract_time = 0
-    for i in range(len(imageset)):
-      if verbose:
-        logger.info('  reading image %d' % i)
-      st = time()
-      image = imageset.get_corrected_data(i)
-      mask2 = imageset.get_mask(i)
-      if mask is not None:
-        assert(len(mask) == len(mask2))
-        mask2 = tuple(m1 & m2 for m1, m2 in zip(mask, mask2))
-      read_time += time() - st
-      st = time()
-      extractor.next(make_image(image, mask2))
-      extract_time += time() - st
-      del image
+    if nthreads > 1:
+      read_time, extract_time = self._extract_shoeboxes_threaded(
+        extractor, imageset, mask, nthreads, verbose)
+    else:
+      read_time = 0
+      extract_time = 0
+      for i in range(len(imageset)):
+        st = time()
+        image, mask2 = self._read_image_and_mask(imageset, i, mask, verbose)
+        read_time += time() - st
+        st = time()
+        extractor.next(make_image(image, mask2))
+        extract_time += time() - st
+        del image
     assert(extractor.finished())
     logger.info('  successfully read %d images' % (frame1 - frame0))
     logger.info('  read time: %g seconds' % read_time)
     logger.info('  extract time: %g seconds' % extract_time)
     return read_time, extract_time
 
+  @staticmethod
+  def _read_image_and_mask(imageset, index, mask=None, verbose=False):
+    '''
+    Read an image and its mask, combined with an optional external mask
+
+    '''
+    if verbose:
+      logger.info('  reading image %d' % index)
+    image = imageset.get_corrected_data(index)
+    mask2 = imageset.get_mask(index)
+    if mask is not None:
+      assert(len(mask) == len(mask2))
+      mask2 = tuple(m1 & m2 for m1, m2 in zip(mask, mask2))
+    return image, mask2
+
+  def _extract_shoeboxes_threaded(self, extractor, imageset, mask, nthreads,
+                                  verbose):
+    '''
+    Extract the shoeboxes with a number of threads. The images are read ahead
+    in a separate thread while the previous image is extracted; the pixels of
+    each image are copied to the shoeboxes in parallel, split by panel and
+    reflection.
+
+    :return: A tuple containing the time waiting for images and extract time
+
+    '''
+    from dials.model.data import make_image
+    from six.moves.queue import Queue, Empty, Full
+    from threading import Event, Thread
+    from time import time
+    import six
+    import sys
+
+    # Read the images ahead into a bounded queue. The reader stops early if
+    # extraction fails.
+    queue = Queue(maxsize=nthreads)
+    stop = Event()
+    def put(item):
+      while not stop.is_set():
+        try:
+          queue.put(item, timeout=0.1)
+          return
+        except Full:
+          pass
+    def reader():
+      try:
+        for i in range(len(imageset)):
+          if stop.is_set():
+            return
+          put((self._read_image_and_mask(imageset, i, mask, verbose), None))
+      except Exception:
+        put((None, sys.exc_info()))
+    thread = Thread(target=reader)
+    thread.daemon = True
+    thread.start()
+
+    # Extract the images in order
+    read_time = 0
+    extract_time = 0
+    try:
+      for i in range(len(imageset)):
+        st = time()
+        item, error = queue.get()
+        read_time += time() - st
+        if error is not None:
+          six.reraise(*error)
+        st = time()
+        extractor.next_threaded(make_image(*item), nthreads)
+        extract_time += time() - st
+        del item
+    finally:
+      # Stop the reader and drain the queue so it isn't blocked
+      stop.set()
+      while thread.is_alive():
+        try:
+          queue.get(timeout=0.1)
+        except Empty:
+          pass
+      thread.join()
+    return read_time, extract_time
+
   def is_overloaded(self, experiments_or_datablock):
     '''
     Check if the shoebox contains overloaded pixels.
@@ -1027,16 +1118,12 @@ def contains_invalid_pixels(self):
     self.set_flags(ninvfg > 0, self.flags.foreground_includes_bad_pixels)
     return (ntotal - nvalid) > 0
 
-  def find_overlaps(self, experiments=None, border=0):
+  def _overlap_groups(self, experiments=None, border=0):
     '''
-    Check for overlapping reflections.
-
-    :param experiments: The experiment list
-    :param tolerance: A positive integer specifying border around shoebox
-    :return: The overlap list
+    Get the group id, panel and expanded bounding boxes used to check for
+    overlapping reflections.
 
     '''
-    from dials.algorithms.shoebox import OverlapFinder
     from itertools import groupby
 
     # Expand the bbox if necessary
@@ -1054,7 +1141,6 @@ def find_overlaps(self, experiments=None, border=0):
 
     # Get the panel and id
     panel = self['panel']
-    exp_id = self['id']
 
     # Group according to imageset
     if experiments is not None:
@@ -1074,6 +1160,21 @@ def find_overlaps(self, experiments=None, border=0):
       group_id = flex.size_t(list(imageset_id))
     else:
       raise RuntimeError('Either need to supply experiments or have imageset_id')
+    return group_id, panel, bbox
+
+  def find_overlaps(self, experiments=None, border=0):
+    '''
+    Check for overlapping reflections.
+
+    :param experiments: The experiment list
+    :param tolerance: A positive integer specifying border around shoebox
+    :return: The overlap list
+
+    '''
+    from dials.algorithms.shoebox import OverlapFinder
+
+    # Get the groups and bounding boxes
+    group_id, panel, bbox = self._overlap_groups(experiments, border)
 
     # Create the overlap finder
     find_overlapping = OverlapFinder()
@@ -1085,6 +1186,50 @@ def find_overlaps(self, experiments=None, border=0):
     # Return the overlaps
     return overlaps
 
+  def find_overlapping_selection(self, experiments=None, border=0):
+    '''
+    Select the reflections which overlap any other reflection. This gives the
+    same reflections as the vertices with edges in the graph returned by
+    find_overlaps but uses a spatial index rather than building the graph.
+
+    :param experiments: The experiment list
+    :param border: A positive integer specifying border around shoebox
+    :return: A selection of overlapping reflections
+
+    '''
+    from dials.algorithms.spatial_indexing import overlapping_bbox_selection
+
+    # Get the groups and bounding boxes
+    group_id, panel, bbox = self._overlap_groups(experiments, border)
+
+    # Find the overlapping reflections
+    return overlapping_bbox_selection(group_id, panel, bbox)
+
+  def spatial_index(self, columns='xyzobs.px.value', per='panel'):
+    '''
+    Get a spatial index of the reflections for box, radius, nearest neighbour
+    and per-image queries. The index is cached and is rebuilt if the indexed
+    columns have changed since it was built.
+
+    :param columns: The position column or a list of coordinate columns
+    :param per: A column or list of columns to group the reflections by
+    :return: The spatial index
+
+    '''
+    from dials.algorithms.spatial_indexing.reflection_index \
+      import ReflectionSpatialIndex
+    if isinstance(columns, str):
+      columns = (columns,)
+    if per is not None and isinstance(per, str):
+      per = (per,)
+    key = (tuple(columns), tuple(per) if per is not None else ())
+    cache = _spatial_index_cache.setdefault(self, {})
+    index = cache.get(key)
+    if index is None or not index.is_valid(self):
+      index = ReflectionSpatialIndex(self, columns=columns, per=per)
+      cache[key] = index
+    return index
+
   def compute_shoebox_overlap_fraction(self, overlaps):
     '''
     Compute the fraction of shoebox overlapping.
@@ -20,6 +20,9 @@
 #include <numeric>
 #include <list>
 #include <vector>
+#include <boost/bind.hpp>
+#include <boost/thread.hpp>
+#include <boost/exception_ptr.hpp>
 #include <dials/model/data/image.h>
 #include <dials/model/data/shoebox.h>
 #include <dials/array_family/reflection_table.h>
@@ -98,50 +101,62 @@ namespace dials { namespace af {
      */
     template <typename T>
     void next(const Image<T> &image) {
-      typedef Shoebox<>::float_type float_type;
-      typedef af::ref<float_type, af::c_grid<3> > sbox_data_type;
-      typedef af::ref<int,        af::c_grid<3> > sbox_mask_type;
       DIALS_ASSERT(frame_ >= frame0_ && frame_ < frame1_);
       DIALS_ASSERT(image.npanels() == npanels_);
       for (std::size_t p = 0; p < image.npanels(); ++p) {
-        af::const_ref<std::size_t> ind = indices(frame_, p);
-        af::const_ref< T, af::c_grid<2> > data = image.data(p);
-        af::const_ref< bool, af::c_grid<2> > mask = image.mask(p);
-        DIALS_ASSERT(data.accessor().all_eq(mask.accessor()));
-        for (std::size_t i = 0; i < ind.size(); ++i) {
-          DIALS_ASSERT(ind[i] < shoebox_.size());
-          Shoebox<>& sbox = shoebox_[ind[i]];
-          int6 b = sbox.bbox;
-          sbox_data_type sdata = sbox.data.ref();
-          sbox_mask_type smask = sbox.mask.ref();
-          DIALS_ASSERT(b[1] > b[0]);
-          DIALS_ASSERT(b[3] > b[2]);
-          DIALS_ASSERT(b[5] > b[4]);
-          DIALS_ASSERT(frame_ >= b[4] && frame_ < b[5]);
-          int x0 = b[0];
-          int x1 = b[1];
-          int y0 = b[2];
-          int y1 = b[3];
-          int z0 = b[4];
-          std::size_t xs = x1 - x0;
-          std::size_t ys = y1 - y0;
-          std::size_t z = frame_ - z0;
-          std::size_t yi = data.accessor()[0];
-          std::size_t xi = data.accessor()[1];
-          int xb = x0 >= 0 ? 0 : std::abs(x0);
-          int yb = y0 >= 0 ? 0 : std::abs(y0);
-          int xe = x1 <= xi ? xs : xs-(x1-(int)xi);
-          int ye = y1 <= yi ? ys : ys-(y1-(int)yi);
-          DIALS_ASSERT(ye > yb && yb >= 0 && ye <= ys);
-          DIALS_ASSERT(xe > xb && xb >= 0 && xe <= xs);
-          DIALS_ASSERT(yb + y0 >= 0 && ye + y0 <= yi);
-          DIALS_ASSERT(xb + x0 >= 0 && xe + x0 <= xi);
-          DIALS_ASSERT(sbox.is_consistent());
-          for (std::size_t y = yb; y < ye; ++y) {
-            for (std::size_t x = xb; x < xe; ++x) {
-              sdata(z, y, x) = data(y+y0,x+x0);
-              smask(z, y, x) = mask(y+y0,x+x0) ? Valid : 0;
-            }
+        extract(image, p, 0, indices(frame_, p).size());
+      }
+      frame_++;
+    }
+
+    /**
+     * Extract the pixels from the image using a number of threads. The
+     * reflections on each panel are split into blocks which are processed in
+     * parallel. Each shoebox is written by only one thread since a shoebox
+     * appears at most once for each frame and panel.
+     * @param image The image to process
+     * @param nthreads The number of threads
+     */
+    template <typename T>
+    void next_threaded(const Image<T> &image, std::size_t nthreads) {
+      DIALS_ASSERT(nthreads > 0);
+      DIALS_ASSERT(frame_ >= frame0_ && frame_ < frame1_);
+      DIALS_ASSERT(image.npanels() == npanels_);
+
+      // Split the reflections on each panel into blocks
+      std::size_t total = 0;
+      for (std::size_t p = 0; p < npanels_; ++p) {
+        total += indices(frame_, p).size();
+      }
+      std::size_t block_size = std::max(
+          (std::size_t)1, total / (nthreads * 4) + 1);
+      std::vector<Task> tasks;
+      for (std::size_t p = 0; p < npanels_; ++p) {
+        std::size_t n = indices(frame_, p).size();
+        for (std::size_t i = 0; i < n; i += block_size) {
+          tasks.push_back(Task(p, i, std::min(n, i + block_size)));
+        }
+      }
+
+      // Process the blocks
+      if (nthreads == 1 || tasks.size() < 2) {
+        for (std::size_t i = 0; i < tasks.size(); ++i) {
+          extract(image, tasks[i].panel, tasks[i].begin, tasks[i].end);
+        }
+      } else {
+        std::size_t nworkers = std::min(nthreads, tasks.size());
+        std::vector<boost::exception_ptr> errors(nworkers);
+        boost::thread_group threads;
+        for (std::size_t t = 0; t < nworkers; ++t) {
+          threads.create_thread(boost::bind(
+            &ShoeboxExtractor::extract_tasks<T>, this,
+            boost::cref(image), boost::cref(tasks),
+            t, nworkers, boost::ref(errors[t])));
+        }
+        threads.join_all();
+        for (std::size_t t = 0; t < nworkers; ++t) {
+          if (errors[t]) {
+            boost::rethrow_exception(errors[t]);
           }
         }
       }
@@ -182,6 +197,97 @@ namespace dials { namespace af {
 
   private:
 
+    /**
+     * A block of reflections on a panel
+     */
+    struct Task {
+      std::size_t panel;
+      std::size_t begin;
+      std::size_t end;
+      Task(std::size_t panel_, std::size_t begin_, std::size_t end_)
+        : panel(panel_), begin(begin_), end(end_) {}
+    };
+
+    /**
+     * Process every nth task starting at the given offset, keeping the first
+     * exception thrown.
+     */
+    template <typename T>
+    void extract_tasks(
+        const Image<T> &image,
+        const std::vector<Task> &tasks,
+        std::size_t offset,
+        std::size_t step,
+        boost::exception_ptr &error) {
+      try {
+        for (std::size_t i = offset; i < tasks.size(); i += step) {
+          extract(image, tasks[i].panel, tasks[i].begin, tasks[i].end);
+        }
+      } catch (...) {
+        error = boost::current_exception();
+      }
+    }
+
+    /**
+     * Copy the pixels of a panel to a range of the shoeboxes recorded on the
+     * current frame and the panel.
+     * @param image The image
+     * @param p The panel
+     * @param begin The first index
+     * @param end The last index
+     */
+    template <typename T>
+    void extract(
+        const Image<T> &image,
+        std::size_t p,
+        std::size_t begin,
+        std::size_t end) {
+      typedef Shoebox<>::float_type float_type;
+      typedef af::ref<float_type, af::c_grid<3> > sbox_data_type;
+      typedef af::ref<int,        af::c_grid<3> > sbox_mask_type;
+      af::const_ref<std::size_t> ind = indices(frame_, p);
+      af::const_ref< T, af::c_grid<2> > data = image.data(p);
+      af::const_ref< bool, af::c_grid<2> > mask = image.mask(p);
+      DIALS_ASSERT(data.accessor().all_eq(mask.accessor()));
+      DIALS_ASSERT(begin <= end && end <= ind.size());
+      for (std::size_t i = begin; i < end; ++i) {
+        DIALS_ASSERT(ind[i] < shoebox_.size());
+        Shoebox<>& sbox = shoebox_[ind[i]];
+        int6 b = sbox.bbox;
+        sbox_data_type sdata = sbox.data.ref();
+        sbox_mask_type smask = sbox.mask.ref();
+        DIALS_ASSERT(b[1] > b[0]);
+        DIALS_ASSERT(b[3] > b[2]);
+        DIALS_ASSERT(b[5] > b[4]);
+        DIALS_ASSERT(frame_ >= b[4] && frame_ < b[5]);
+        int x0 = b[0];
+        int x1 = b[1];
+        int y0 = b[2];
+        int y1 = b[3];
+        int z0 = b[4];
+        std::size_t xs = x1 - x0;
+        std::size_t ys = y1 - y0;
+        std::size_t z = frame_ - z0;
+        std::size_t yi = data.accessor()[0];
+        std::size_t xi = data.accessor()[1];
+        int xb = x0 >= 0 ? 0 : std::abs(x0);
+        int yb = y0 >= 0 ? 0 : std::abs(y0);
+        int xe = x1 <= xi ? xs : xs-(x1-(int)xi);
+        int ye = y1 <= yi ? ys : ys-(y1-(int)yi);
+        DIALS_ASSERT(ye > yb && yb >= 0 && ye <= ys);
+        DIALS_ASSERT(xe > xb && xb >= 0 && xe <= xs);
+        DIALS_ASSERT(yb + y0 >= 0 && ye + y0 <= yi);
+        DIALS_ASSERT(xb + x0 >= 0 && xe + x0 <= xi);
+        DIALS_ASSERT(sbox.is_consistent());
+        for (std::size_t y = yb; y < ye; ++y) {
+          for (std::size_t x = xb; x < xe; ++x) {
+            sdata(z, y, x) = data(y+y0,x+x0);
+            smask(z, y, x) = mask(y+y0,x+x0) ? Valid : 0;
+          }
+        }
+      }
+    }
+
     /**
      * Get an index array specifying which reflections are recorded on a given
      * frame and panel.
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# dials.benchmark.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+from libtbx.phil import parse
+
+logger = logging.getLogger('dials.command_line.benchmark')
+
+help_message = '''
+
+Run reproducible performance benchmarks of the DIALS hot paths on synthetic
+data. The data are generated from simulated models at each of the requested
+scales. The best wall clock time of a number of repeats, the throughput and
+the peak memory of each benchmark are reported and appended to a JSON
+history. If a baseline is given, any benchmark whose throughput drops or
+whose peak memory rises by more than the tolerance is flagged as a
+regression.
+
+Examples::
+
+  dials.benchmark
+
+  dials.benchmark n_reflections=10000,1000000 n_panels=1,64
+
+  dials.benchmark benchmark=match_with_reference,table_io baseline=history.json
+
+'''
+
+phil_scope = parse('''
+
+  benchmark = *spot_finding *match_with_reference *outlier_detection \
+              *refinement_step *integration_block *export *table_io
+    .type = choice(multi=True)
+    .help = "The benchmarks to run"
+
+  n_reflections = 10000
+    .type = ints(value_min=1)
+    .help = "The numbers of reflections to synthesise"
+
+  n_panels = 1
+    .type = ints(value_min=1)
+    .help = "The numbers of detector panels to synthesise"
+
+  n_images = 10
+    .type = int(value_min=1)
+    .help = "The number of images to threshold in the spot finding benchmark"
+
+  max_shoeboxes = 10000
+    .type = int(value_min=1)
+    .help = "The maximum number of simulated shoeboxes to integrate"
+
+  repeats = 3
+    .type = int(value_min=1)
+    .help = "The number of repeats of each benchmark (the best time is kept)"
+
+  seed = 0
+    .type = int
+    .help = "The random seed"
+
+  isolate = True
+    .type = bool
+    .help = "Run each benchmark in a separate process to isolate peak memory"
+
+  baseline = None
+    .type = path
+    .help = "A JSON file of baseline results to compare against"
+
+  tolerance = 0.1
+    .type = float(value_min=0)
+    .help = "The fractional tolerance before flagging a regression"
+
+  output {
+    history = benchmark_history.json
+      .type = path
+      .help = "The JSON history to append the results to"
+
+    log = dials.benchmark.log
+      .type = str
+
+    debug_log = dials.benchmark.debug.log
+      .type = str
+  }
+
+''', process_includes=True)
+
+
+class Script(object):
+  '''A class for running the script.'''
+
+  def __init__(self):
+    '''Initialise the script.'''
+    from dials.util.options import OptionParser
+    import libtbx.load_env
+
+    usage = "usage: %s [options]" % libtbx.env.dispatcher_name
+
+    self.parser = OptionParser(
+      usage=usage,
+      phil=phil_scope,
+      epilog=help_message)
+
+  def run(self):
+    '''Execute the script.'''
+    from dials.util import log
+    from dials.util.benchmark import BenchmarkHistory, BenchmarkSetup
+    from dials.util.benchmark import benchmarks, run_benchmark
+    from dials.util.benchmark import find_regressions, load_baseline
+    from libtbx import table_utils
+    from libtbx.utils import Sorry
+
+    params, options = self.parser.parse_args(show_diff_phil=False)
+
+    log.config(info=params.output.log, debug=params.output.debug_log)
+
+    diff_phil = self.parser.diff_phil.as_str()
+    if diff_phil != '':
+      logger.info('The following parameters have been modified:\n')
+      logger.info(diff_phil)
+
+    if not params.benchmark:
+      raise Sorry('No benchmarks selected')
+
+    results = []
+    for n_panels in params.n_panels:
+      for n_reflections in params.n_reflections:
+        setup = BenchmarkSetup(
+          n_reflections=n_reflections,
+          n_panels=n_panels,
+          n_images=params.n_images,
+          max_shoeboxes=params.max_shoeboxes,
+          seed=params.seed)
+        for name, function in benchmarks:
+          if name not in params.benchmark:
+            continue
+          logger.info('Running %s with %s' % (name, setup.key()))
+          results.append(run_benchmark(
+            name, function, setup,
+            repeats=params.repeats,
+            isolate=params.isolate))
+
+    rows = [["Benchmark", "Scale", "Time (s)", "Items/s", "Peak RSS (MB)"]]
+    for r in results:
+      rows.append([
+        r['name'],
+        r['scale'],
+        '%.3f' % r['seconds'],
+        '%.1f' % r['throughput'],
+        '%.1f' % r['peak_rss_mb']])
+    logger.info(table_utils.format(rows, has_header=True, justify='left',
+                                   prefix='| ', postfix=' |'))
+
+    if params.baseline is not None:
+      regressions = find_regressions(
+        results, load_baseline(params.baseline), params.tolerance)
+      if len(regressions) == 0:
+        logger.info('No regressions against %s' % params.baseline)
+      for name, scale, quantity, reference, value in regressions:
+        logger.warning('Regression in %s (%s): %s %.3f -> %.3f' % (
+          name, scale, quantity, reference, value))
+
+    if params.output.history is not None:
+      history = BenchmarkHistory(params.output.history)
+      history.append(results)
+      history.save()
+      logger.info('Saved results to %s' % params.output.history)
+
+
+if __name__ == '__main__':
+  from dials.util import halraiser
+  try:
+    script = Script()
+    script.run()
+  except Exception as e:
+    halraiser(e)
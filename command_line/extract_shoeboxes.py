@@ -38,6 +38,10 @@
     .type = bool
     .help = "Pad the reflection as background"
 
+  nthreads = 1
+    .type = int(value_min=1)
+    .help = "The number of threads used to extract the shoeboxes"
+
   output {
     reflections = 'shoeboxes.pickle'
       .type = str
@@ -155,7 +159,10 @@ def run(self):
       allocate=True)
 
     # Extract the shoeboxes
-    reflections.extract_shoeboxes(imageset, verbose=True)
+    reflections.extract_shoeboxes(
+      imageset,
+      nthreads=params.nthreads,
+      verbose=True)
 
     # Preserve masking
     if old_shoebox is not None:
@@ -112,15 +112,9 @@ def hot_pixel_mask(imageset, reflections):
   return (mask,)
 
 def filter_reflections(reflections, depth):
-  xylist = []
-
-  for i in range(len(reflections)):
-    refl = reflections[i]
-    s = refl['shoebox']
-    if s.zsize() == depth:
-      xylist.append((s.xoffset(), s.yoffset()))
-
-  return xylist
+  x0, x1, y0, y1, z0, z1 = reflections['bbox'].parts()
+  selection = (z1 - z0) == depth
+  return list(zip(x0.select(selection), y0.select(selection)))
 
 if __name__ == '__main__':
   import sys
@@ -60,6 +60,12 @@
 commands changes the mode, sets the parameters and runs the program in a single
 line.
 
+If the program is started with the --in-memory option, the dials programs are
+run within the console process rather than as separate processes. The reflection
+tables are then kept in memory between commands and the output files are written
+in the background, which avoids the cost of starting the programs and reading
+the files back in on small datasets.
+
 The program implements a persistant state mechanism. If the program crashes, the
 state can be recovered by simply restarting the program in the same directory.
 
@@ -114,10 +120,12 @@ class Console(Cmd):
   # The default prompt
   prompt = ">> "
 
-  def __init__(self):
+  def __init__(self, in_memory=False):
     '''
     Initialise the console
 
+    :param in_memory: Run the dials programs in process
+
     '''
     from dials.util.idials import Controller
 
@@ -128,7 +136,7 @@ def __init__(self):
     self.command_history = open("command_history", "a")
 
     # Create the controller object
-    self.controller = Controller()
+    self.controller = Controller(in_memory=in_memory)
 
     # Set the prompt to show the current mode
     self.prompt = "%s >> " % self.controller.get_mode()
@@ -526,12 +534,13 @@ def _append_slash_if_dir(p):
 
 
 if __name__ == '__main__':
+  import sys
 
   # Print the console intro
   print(CONSOLE_INTRO)
 
   # Create the console
-  console = Console()
+  console = Console(in_memory='--in-memory' in sys.argv[1:])
 
   # Enter the command loop
   console.cmdloop()
@@ -54,6 +54,7 @@
 
 phil_scope = iotbx.phil.parse("""\
 include scope dials.algorithms.indexing.indexer.master_phil_scope
+include scope dials.util.result_cache.phil_scope
 output {
   experiments = experiments.json
     .type = path
@@ -107,6 +108,20 @@ def run(args):
     logger.info('The following parameters have been modified:\n')
     logger.info(diff_phil)
 
+  # Copy the results from the cache if available
+  from dials.util.result_cache import ResultCache
+  result_cache = ResultCache.from_parameters(params.result_cache)
+  if result_cache is not None:
+    cache_outputs = {
+      'output.experiments' : params.output.experiments,
+      'output.reflections' : params.output.reflections,
+      'output.unindexed_reflections' : params.output.unindexed_reflections,
+    }
+    cache_key = result_cache.key(
+      'dials.index', params.input, parser.diff_phil, cache_outputs)
+    if result_cache.fetch(cache_key, cache_outputs):
+      return
+
   datablocks = flatten_datablocks(params.input.datablock)
   experiments = flatten_experiments(params.input.experiments)
   reflections = flatten_reflections(params.input.reflections)
@@ -173,6 +188,10 @@ def run(args):
       idxr.export_reflections(idxr.unindexed_reflections,
                               file_name=params.output.unindexed_reflections)
 
+    # Store the results in the cache
+    if result_cache is not None:
+      result_cache.store(cache_key, cache_outputs)
+
   return
 
 
@@ -128,6 +128,7 @@
   include scope dials.algorithms.spot_prediction.reflection_predictor.phil_scope
   include scope dials.algorithms.integration.stills_significance_filter.phil_scope
   include scope dials.algorithms.integration.kapton_correction.absorption_phil_scope
+  include scope dials.util.result_cache.phil_scope
 
 ''', process_includes=True)
 
@@ -198,6 +199,20 @@ def run(self):
       logger.info('The following parameters have been modified:\n')
       logger.info(diff_phil)
 
+    # Copy the results from the cache if available
+    from dials.util.result_cache import ResultCache
+    result_cache = ResultCache.from_parameters(params.result_cache)
+    if result_cache is not None:
+      cache_outputs = {
+        'output.experiments' : params.output.experiments,
+        'output.reflections' : params.output.reflections,
+        'output.report'      : params.output.report,
+      }
+      cache_key = result_cache.key(
+        'dials.integrate', params.input, self.parser.diff_phil, cache_outputs)
+      if result_cache.fetch(cache_key, cache_outputs):
+        return
+
     for abs_params in params.absorption_correction:
       if abs_params.apply:
         if not (params.integration.debug.output and not params.integration.debug.separate_files):
@@ -376,6 +391,10 @@ def refl_extend(src, dest, eid):
     if params.output.report is not None:
       integrator.report().as_file(params.output.report)
 
+    # Store the results in the cache
+    if result_cache is not None:
+      result_cache.store(cache_key, cache_outputs)
+
     # Print the total time taken
     logger.info("\nTotal time taken: %f" % (time() - start_time))
 
@@ -41,6 +41,10 @@
           "the CBF file"
   .expert_level = 2
 
+nproc = 1
+  .type = int(value_min=1)
+  .help = "The number of processes used to read, sum and write the images"
+
 output {
   image_prefix = sum_
     .type = path
@@ -73,47 +77,39 @@ def get_raw_data_from_file(imageset, i):
   return (values,)
 
 
-def merge_cbf(imageset, n_images, out_prefix="sum_",
-    get_raw_data_from_imageset=True):
-
-  from dxtbx.format.FormatCBF import FormatCBF
-  assert issubclass(imageset.get_format_class(), FormatCBF), (
-    "Only CBF format images supported")
-
-  from cbflib_adaptbx import compress
-  import binascii
-
-  assert len(imageset) >= n_images
+class ImageReader(object):
+  """Read the raw data of an image of the imageset"""
 
-  n_output_images = len(imageset) // n_images
+  def __init__(self, imageset, get_raw_data_from_imageset=True):
+    self.imageset = imageset
+    self.get_raw_data_from_imageset = get_raw_data_from_imageset
 
-  in_oscillation = imageset.get_scan().get_oscillation()[1]
-  out_oscillation = in_oscillation * n_images
+  def __call__(self, i):
+    if self.get_raw_data_from_imageset:
+      data = self.imageset.get_raw_data(i)
+    else:
+      data = get_raw_data_from_file(self.imageset, i)
+    assert len(data) == 1
+    return data
 
-  for i_out in range(n_output_images):
-    data_out = None
 
-    for j in range(n_images):
+class MergedImageWriter(object):
+  """Write a summed image as a cbf file with the header of the first image of
+  the block, modified for the number of summed images"""
 
-      i_in = (i_out*n_images) + j
+  def __init__(self, imageset, n_images, out_prefix="sum_"):
+    self.imageset = imageset
+    self.n_images = n_images
+    self.out_prefix = out_prefix
 
-      if get_raw_data_from_imageset:
-        data_in = imageset.get_raw_data(i_in)
-      else:
-        data_in = get_raw_data_from_file(imageset, i_in)
+  def __call__(self, i_out, data_out):
+    from cbflib_adaptbx import compress
+    import binascii
 
-      assert len(data_in) == 1
-      data_in = data_in[0]
-      if data_out is None:
-        data_out = data_in
-      else:
-        # FIXME only add pixels to this which are > 0; image pixels < 0
-        # are meaningful and should be preserved;
-        # Achieved by setting -ve values here to 0 before +=
-        # This assumes that -ve values are constant over all images
-        data_special = data_in < 0
-        data_in.set_selected(data_special, 0)
-        data_out += data_in
+    imageset = self.imageset
+    n_images = self.n_images
+    out_prefix = self.out_prefix
+    data_out = data_out[0]
 
     out_image = "%s%04i.cbf" %(out_prefix, i_out+1)
 
@@ -179,6 +175,27 @@ def merge_cbf(imageset, n_images, out_prefix="sum_",
       f.write(''.join(new_header) + start_tag + compressed + tailer)
       print('%s written' % out_image)
 
+    return out_image
+
+
+def merge_cbf(imageset, n_images, out_prefix="sum_",
+    get_raw_data_from_imageset=True, nproc=1):
+
+  from dxtbx.format.FormatCBF import FormatCBF
+  assert issubclass(imageset.get_format_class(), FormatCBF), (
+    "Only CBF format images supported")
+
+  from dials.util.image_summation import sum_frame_blocks
+
+  assert len(imageset) >= n_images
+
+  n_output_images = len(imageset) // n_images
+
+  sum_frame_blocks(
+    ImageReader(imageset, get_raw_data_from_imageset),
+    MergedImageWriter(imageset, n_images, out_prefix),
+    n_images, n_output_images, nproc=nproc)
+
   return
 
 def run():
@@ -216,7 +233,8 @@ def run():
     imageset = imagesets[0]
 
   merge_cbf(imageset, n_images, out_prefix=out_prefix,
-      get_raw_data_from_imageset=params.get_raw_data_from_imageset)
+      get_raw_data_from_imageset=params.get_raw_data_from_imageset,
+      nproc=params.nproc)
 
 if __name__ == '__main__':
   run()
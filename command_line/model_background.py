@@ -30,6 +30,11 @@
       .type = str
       .help = "The output filename"
 
+    mapped_model = None
+      .type = str
+      .help = "Also write the model in a flat binary layout which integration"
+              "workers memory map and share rather than each loading a copy"
+
     log = 'dials.model_background.log'
       .type = str
       .help = "The log filename"
@@ -383,6 +388,10 @@ def run(self):
     with open(params.output.model, "wb") as outfile:
       import six.moves.cPickle as pickle
       pickle.dump(static_model, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    if params.output.mapped_model is not None:
+      from dials.algorithms.background.gmodel.algorithm import write_mapped_model
+      logger.info("Saving memory mapped background model to %s" % params.output.mapped_model)
+      write_mapped_model(static_model, params.output.mapped_model)
 
     # Output some diagnostic images
     image_generator = ImageGenerator(model)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#
+# dials.pixel_statistics.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+logger = logging.getLogger('dials.command_line.pixel_statistics')
+
+help_message = '''
+
+This program computes per pixel statistics over all the images in a
+datablock in a single pass of the data. For each pixel, the number of images
+on which it is strong, the minimum and maximum value and the mean, variance
+and index of dispersion of the background are accumulated. From these a hot
+pixel mask, a gain map and a background model (for use with the gmodel
+background algorithm) are written.
+
+The images are split into blocks which are processed in parallel. If a
+checkpoint file is given, the partial result is saved after each block and
+processing resumes from it if the program is restarted.
+
+Examples::
+
+  dials.pixel_statistics datablock.json
+
+  dials.pixel_statistics datablock.json nproc=8 checkpoint=stats.pickle
+
+'''
+
+# Set the phil scope
+from libtbx.phil import parse
+phil_scope = parse('''
+
+  output {
+    hot_mask = hot_pixels.pickle
+      .type = str
+      .help = "The hot pixel mask filename"
+
+    gain_map = None
+      .type = str
+      .help = "The per pixel gain map filename"
+
+    background_model = None
+      .type = str
+      .help = "The background model filename"
+
+    log = 'dials.pixel_statistics.log'
+      .type = str
+      .help = "The log filename"
+
+    debug_log = 'dials.pixel_statistics.debug.log'
+      .type = str
+      .help = "The debug log filename"
+  }
+
+  min_images = 10
+    .type = int(value_min=1)
+    .help = "The minimum number of images for a pixel to be considered"
+
+  hot_fraction = 1.0
+    .type = float(value_min=0, value_max=1, allow_none=False)
+    .help = "Pixels that are strong on at least this fraction of the images "
+            "are flagged as hot. Must be greater than zero."
+
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "The number of processes"
+
+  block_size = None
+    .type = int(value_min=1)
+    .help = "The number of images per block (default one block per process)"
+
+  checkpoint = None
+    .type = str
+    .help = "A checkpoint file to save to and resume from"
+
+  verbosity = 1
+    .type = int(value_min=0)
+    .help = "The verbosity level"
+
+  include scope dials.algorithms.spot_finding.factory.phil_scope
+
+''', process_includes=True)
+
+
+class Script(object):
+  '''A class for running the script.'''
+
+  def __init__(self):
+    '''Initialise the script.'''
+    from dials.util.options import OptionParser
+    import libtbx.load_env
+
+    # The script usage
+    usage = "usage: %s [options] [param.phil] datablock.json" \
+            % libtbx.env.dispatcher_name
+
+    # Initialise the base class
+    self.parser = OptionParser(
+      usage=usage,
+      phil=phil_scope,
+      epilog=help_message,
+      read_datablocks=True)
+
+  def run(self):
+    '''Execute the script.'''
+    from dials.algorithms.background.pixel_statistics import \
+      PixelStatisticsEngine
+    from dials.algorithms.spot_finding.factory import SpotFinderFactory
+    from dials.util.options import flatten_datablocks
+    from dials.util import log
+    from libtbx.utils import Sorry
+    from time import time
+    import six.moves.cPickle as pickle
+    start_time = time()
+
+    # Parse the command line
+    params, options = self.parser.parse_args(show_diff_phil=False)
+
+    # Configure the logging
+    log.config(
+      params.verbosity,
+      info=params.output.log,
+      debug=params.output.debug_log)
+
+    from dials.util.version import dials_version
+    logger.info(dials_version())
+
+    # Log the diff phil
+    diff_phil = self.parser.diff_phil.as_str()
+    if diff_phil != '':
+      logger.info('The following parameters have been modified:\n')
+      logger.info(diff_phil)
+
+    # Check the parameters
+    if params.hot_fraction <= 0:
+      raise Sorry("hot_fraction must be greater than zero")
+
+    # Ensure we have a data block
+    datablocks = flatten_datablocks(params.input.datablock)
+    if len(datablocks) == 0:
+      self.parser.print_help()
+      return
+    if len(datablocks) > 1:
+      raise Sorry("Only one DataBlock can be processed at a time")
+    imagesets = datablocks[0].extract_imagesets()
+    if len(imagesets) != 1:
+      raise Sorry("Can only process a single imageset at a time")
+    imageset = imagesets[0]
+
+    # Compute the statistics
+    engine = PixelStatisticsEngine(
+      threshold_function = SpotFinderFactory.configure_threshold(
+        params, datablocks[0]),
+      nproc      = params.nproc,
+      block_size = params.block_size,
+      checkpoint = params.checkpoint)
+    result = engine(imageset)
+
+    # Save the hot pixel mask
+    hot_mask = result.hot_pixel_mask(params.min_images, params.hot_fraction)
+    logger.info('Found %d hot pixels' % sum(m.count(False) for m in hot_mask))
+    logger.info('Saving hot pixel mask to %s' % params.output.hot_mask)
+    with open(params.output.hot_mask, 'wb') as outfile:
+      pickle.dump(hot_mask, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Save the gain map
+    try:
+      gain = result.gain(params.min_images)
+    except RuntimeError as e:
+      logger.warn('Unable to estimate gain: %s' % str(e))
+      gain = None
+    if gain is not None:
+      logger.info('Estimated gain: %.2f' % gain)
+    if gain is not None and params.output.gain_map is not None:
+      logger.info('Saving gain map to %s' % params.output.gain_map)
+      with open(params.output.gain_map, 'wb') as outfile:
+        pickle.dump(
+          result.gain_map(params.min_images),
+          outfile,
+          protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Save the background model
+    if params.output.background_model is not None:
+      logger.info('Saving background model to %s' % params.output.background_model)
+      with open(params.output.background_model, 'wb') as outfile:
+        pickle.dump(
+          result.background_model(params.min_images),
+          outfile,
+          protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Print the time
+    logger.info("Time Taken: %f" % (time() - start_time))
+
+
+if __name__ == '__main__':
+  from dials.util import halraiser
+  try:
+    script = Script()
+    script.run()
+  except Exception as e:
+    halraiser(e)
@@ -114,6 +114,7 @@
   }
 
   include scope dials.algorithms.refinement.refiner.phil_scope
+  include scope dials.util.result_cache.phil_scope
 ''', process_includes=True)
 
 # local overrides for refiner.phil_scope
@@ -241,6 +242,26 @@ def run(self):
       logger.info('The following parameters have been modified:\n')
       logger.info(diff_phil)
 
+    # Copy the results from the cache if available. Correlation plots are
+    # not cached so the cache is not used if they are requested.
+    from dials.util.result_cache import ResultCache
+    result_cache = None
+    if params.output.correlation_plot.filename is None:
+      result_cache = ResultCache.from_parameters(params.result_cache)
+    if result_cache is not None:
+      cache_outputs = {
+        'output.experiments'     : params.output.experiments,
+        'output.reflections'     : params.output.reflections,
+        'output.matches'         : params.output.matches,
+        'output.centroids'       : params.output.centroids,
+        'output.parameter_table' : params.output.parameter_table,
+        'output.history'         : params.output.history,
+      }
+      cache_key = result_cache.key(
+        'dials.refine', params.input, self.parser.diff_phil, cache_outputs)
+      if result_cache.fetch(cache_key, cache_outputs):
+        return
+
     # Modify options if necessary
     if params.output.correlation_plot.filename is not None:
       params.refinement.refinery.journal.track_parameter_correlation = True
@@ -394,6 +415,10 @@ def run(self):
           params.output.history))
         pickle.dump(history, handle)
 
+    # Store the results in the cache
+    if result_cache is not None:
+      result_cache.store(cache_key, cache_outputs)
+
     # Log the total time taken
     logger.info("\nTotal time taken: {0:.2f}s".format(time() - start_time))
 
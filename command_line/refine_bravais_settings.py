@@ -59,6 +59,12 @@
 cc_n_bins = None
   .type = int(value_min=1)
   .help = "Number of resolution bins to use for calculation of correlation coefficients"
+shared_outlier_rejection = False
+  .type = bool
+  .help = "Reject outliers once, after refinement of the triclinic solution, "
+          "and refine every Bravais setting against the remaining reflections "
+          "rather than repeating outlier rejection for each setting."
+  .expert_level = 1
 output {
   directory = "."
     .type = path
@@ -195,7 +201,8 @@ def run(args):
 
   Lfat = refined_settings_factory_from_refined_triclinic(
     params, experiments, reflections, lepage_max_delta=params.lepage_max_delta,
-    nproc=params.nproc, refiner_verbosity=params.verbosity)
+    nproc=params.nproc, refiner_verbosity=params.verbosity,
+    shared_outlier_rejection=params.shared_outlier_rejection)
   s = StringIO()
   possible_bravais_settings = set(solution['bravais'] for solution in Lfat)
   bravais_lattice_to_space_group_table(possible_bravais_settings)
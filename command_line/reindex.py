@@ -16,7 +16,6 @@
 
 import copy
 from libtbx.phil import command_line
-from libtbx import easy_pickle
 import iotbx.phil
 from cctbx import sgtbx
 from dxtbx.model import Crystal
@@ -236,7 +235,7 @@ def run(args):
     reflections['miller_index'].set_selected(~sel, (0,0,0))
 
     print("Saving reindexed reflections to %s" %params.output.reflections)
-    easy_pickle.dump(params.output.reflections, reflections)
+    reflections.as_pickle(params.output.reflections)
 
 
 if __name__ == '__main__':
@@ -67,6 +67,11 @@
   pixels_per_bin = 40
     .type = int(value_min=1)
 
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "The number of processes used to run the analysers"
+    .expert_level = 1
+
   centroid_diff_max = None
     .help = "Magnitude in pixels of shifts mapped to the extreme colours"
             "in the heatmap plots centroid_diff_x and centroid_diff_y"
@@ -129,6 +134,52 @@ def determine_grid_size(rlist, grid_size=None):
   n_rows = int(math.ceil(n_panels / n_cols))
   return n_cols, n_rows
 
+def select_report_columns(rlist, analyser):
+  ''' Select the columns used by an analyser, so that the other columns
+  (e.g. shoeboxes) are not copied for each analyser. An analyser without a
+  list of required_columns gets the full table. '''
+  columns = getattr(analyser, 'required_columns', None)
+  if columns is None:
+    return rlist
+  table = flex.reflection_table()
+  for key in columns:
+    if key in rlist:
+      table[key] = rlist[key]
+  return table
+
+def unit_bin_counts(values, n_bins):
+  ''' Count the values in the bins [i, i+1) for i in range(n_bins). '''
+  import numpy as np
+  if n_bins <= 0:
+    return []
+  index = flex.floor(values).iround()
+  index = index.select((index >= 0) & (index < n_bins))
+  return np.bincount(index.as_numpy_array(), minlength=n_bins).tolist()
+
+def unit_bin_statistics(values, lower, n_bins, data):
+  ''' Compute the number of values in the bins [lower+i, lower+i+1) for i
+  in range(n_bins) and the mean and root mean square of each of the data
+  arrays in each bin. '''
+  import numpy as np
+  index = flex.floor(values).iround() - lower
+  sel = (index >= 0) & (index < n_bins)
+  index = index.select(sel).as_numpy_array()
+  counts = np.bincount(index, minlength=n_bins)
+  nonzero = np.maximum(counts, 1)
+  means = []
+  rms = []
+  for d in data:
+    d = d.select(sel).as_numpy_array()
+    means.append(np.bincount(index, weights=d, minlength=n_bins) / nonzero)
+    rms.append(np.sqrt(
+      np.bincount(index, weights=d*d, minlength=n_bins) / nonzero))
+  return counts, means, rms
+
+def run_analyser(args):
+  ''' Run an analyser in a separate process. '''
+  analyse, rlist = args
+  return analyse(rlist)
+
 
 class per_panel_plot(object):
 
@@ -542,6 +593,10 @@ def plot_orientation(self, experiments):
 class StrongSpotsAnalyser(object):
   ''' Analyse a list of strong spots. '''
 
+  # The reflection table columns used by the analyser
+  required_columns = ('flags', 'id', 'imageset_id', 'panel',
+    'intensity.sum.variance', 'xyzobs.px.value')
+
   def __init__(self, pixels_per_bin=10):
     from os.path import join
 
@@ -611,18 +666,11 @@ def spot_count_per_image(self, rlist):
     spot_count_per_image = []
     indexed_per_image = []
     for j in range(flex.max(ids)+1):
-      spot_count_per_image.append([])
       ids_sel = (ids == j)
-      zsel = z.select(ids_sel)
-      for i in range(max_z):
-        sel = (zsel >= i) & (zsel < (i+1))
-        spot_count_per_image[j].append(sel.count(True))
+      spot_count_per_image.append(unit_bin_counts(z.select(ids_sel), max_z))
       if n_indexed > 0:
-        indexed_per_image.append([])
-        zsel = z.select(ids_sel & indexed_sel)
-        for i in range(max_z):
-          sel = (zsel >= i) & (zsel < (i+1))
-          indexed_per_image[j].append(sel.count(True))
+        indexed_per_image.append(
+          unit_bin_counts(z.select(ids_sel & indexed_sel), max_z))
 
     d = {
       'spot_count_per_image': {
@@ -671,11 +719,8 @@ def spot_count_per_image(self, rlist):
       ids = rlist['id']
       indexed_per_lattice_per_image = []
       for j in range(flex.max(ids)+1):
-        indexed_per_lattice_per_image.append([])
-        zsel = z.select((ids == j) & indexed_sel)
-        for i in range(max_z):
-          sel = (zsel >= i) & (zsel < (i+1))
-          indexed_per_lattice_per_image[j].append(sel.count(True))
+        indexed_per_lattice_per_image.append(
+          unit_bin_counts(z.select((ids == j) & indexed_sel), max_z))
 
       d.update({
         'indexed_per_lattice_per_image': {
@@ -826,6 +871,11 @@ def spot_count_per_panel(self, rlist):
 class CentroidAnalyser(object):
   ''' Analyse the reflection centroids. '''
 
+  # The reflection table columns used by the analyser
+  required_columns = ('flags', 'id', 'panel', 'partiality',
+    'intensity.sum.value', 'intensity.sum.variance', 'xyzcal.mm', 'xyzcal.px',
+    'xyzobs.mm.value', 'xyzobs.px.value')
+
   def __init__(self, grid_size=None, pixels_per_bin=10,
     centroid_diff_max=1.5):
     from os.path import join
@@ -1122,18 +1172,20 @@ def centroid_mean_diff_vs_phi(self, rlist, threshold):
     phi_obs_deg = RAD2DEG * zo
     phi = []
 
-    for i_phi in range(int(math.floor(flex.min(phi_obs_deg))),
-                   int(math.ceil(flex.max(phi_obs_deg)))):
-      sel = (phi_obs_deg >= i_phi) & (phi_obs_deg < (i_phi+1))
-      if sel.count(True) == 0:
+    phi_min = int(math.floor(flex.min(phi_obs_deg)))
+    phi_max = int(math.ceil(flex.max(phi_obs_deg)))
+    counts, means, rms = unit_bin_statistics(
+      phi_obs_deg, phi_min, phi_max - phi_min, (dx, dy, dphi))
+    for i in range(phi_max - phi_min):
+      if counts[i] == 0:
         continue
-      mean_residuals_x.append(flex.mean(dx.select(sel)))
-      mean_residuals_y.append(flex.mean(dy.select(sel)))
-      mean_residuals_phi.append(flex.mean(dphi.select(sel)))
-      rmsd_x.append(math.sqrt(flex.mean_sq(dx.select(sel))))
-      rmsd_y.append(math.sqrt(flex.mean_sq(dy.select(sel))))
-      rmsd_phi.append(math.sqrt(flex.mean_sq(dphi.select(sel))))
-      phi.append(i_phi)
+      mean_residuals_x.append(means[0][i])
+      mean_residuals_y.append(means[1][i])
+      mean_residuals_phi.append(means[2][i])
+      rmsd_x.append(rms[0][i])
+      rmsd_y.append(rms[1][i])
+      rmsd_phi.append(rms[2][i])
+      phi.append(phi_min + i)
 
     d = {
       'centroid_mean_differences_vs_phi': {
@@ -1440,6 +1492,11 @@ def centroid_xy_xz_zy_residuals(self, rlist, threshold):
 class BackgroundAnalyser(object):
   ''' Analyse the background. '''
 
+  # The reflection table columns used by the analyser
+  required_columns = ('flags', 'id', 'panel', 'background.mean',
+    'background.mse', 'intensity.sum.value', 'intensity.sum.variance',
+    'xyzcal.px')
+
   def __init__(self, grid_size=None, pixels_per_bin=10):
     from os.path import join
 
@@ -1661,6 +1718,11 @@ def rmsd_vs_ios(self, rlist):
 class IntensityAnalyser(object):
   ''' Analyse the intensities. '''
 
+  # The reflection table columns used by the analyser
+  required_columns = ('flags', 'id', 'panel', 'partiality',
+    'intensity.sum.value', 'intensity.sum.variance', 'intensity.prf.value',
+    'intensity.prf.variance', 'n_background', 'n_foreground', 'xyzcal.px')
+
   def __init__(self, grid_size=None, pixels_per_bin=10):
     from os.path import join
 
@@ -1911,6 +1973,11 @@ def num_foreground_hist(self, rlist):
 class ReferenceProfileAnalyser(object):
   ''' Analyse the reference profiles. '''
 
+  # The reflection table columns used by the analyser
+  required_columns = ('flags', 'id', 'panel', 'correlation.ideal.profile',
+    'd', 'intensity.prf.value', 'intensity.prf.variance',
+    'profile.correlation', 'xyzcal.px')
+
   def __init__(self, grid_size=None, pixels_per_bin=10):
     from os.path import join
 
@@ -2383,8 +2450,20 @@ def __call__(self, rlist=None, experiments=None):
     json_data = OrderedDict()
 
     if rlist is not None:
-      for analyse in self.analysers:
-        result = analyse(deepcopy(rlist))
+      nproc = min(self.params.nproc, len(self.analysers))
+      if nproc > 1:
+        from dials.util.mp import parallel_map
+        results = parallel_map(
+          func=run_analyser,
+          iterable=[(analyse, select_report_columns(rlist, analyse))
+                    for analyse in self.analysers],
+          processes=nproc,
+          method='multiprocessing',
+          preserve_order=True)
+      else:
+        results = [analyse(deepcopy(select_report_columns(rlist, analyse)))
+                   for analyse in self.analysers]
+      for result in results:
         if result is not None:
           json_data.update(result)
     else:
@@ -51,6 +51,10 @@
   reverse_phi = False
     .type = bool
     .optional = True
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "The number of processes to use. The images are split into"
+            "blocks which are mapped into separate grids and summed at the end."
 }
 """, process_includes=True)
 
@@ -101,6 +105,7 @@ def run(self):
         self.reverse_phi = params.rs_mapper.reverse_phi
         self.grid_size = params.rs_mapper.grid_size
         self.max_resolution = params.rs_mapper.max_resolution
+        self.nproc = params.rs_mapper.nproc
 
         self.grid = flex.double(flex.grid(self.grid_size, self.grid_size, self.grid_size), 0)
         self.cnts = flex.int(flex.grid(self.grid_size, self.grid_size, self.grid_size), 0)
@@ -121,32 +126,61 @@ def run(self):
                                 flex.std_string(["cctbx.miller.fft_map"]))
 
     def process_imageset(self, imageset):
-        rec_range = 1 / self.max_resolution
-
-        panel = imageset.get_detector()[0]
-        beam = imageset.get_beam()
-        s0 = beam.get_s0()
+        from dials.util.mp import parallel_map
+
+        # Split the images into a block per process
+        nproc = min(self.nproc, len(imageset))
+        block_size = int(math.ceil(len(imageset) / nproc))
+        blocks = [(i, min(i + block_size, len(imageset)))
+                  for i in range(0, len(imageset), block_size)]
+        args = [(imageset, first, last, self.grid_size, self.max_resolution,
+                 self.reverse_phi) for first, last in blocks]
+
+        # Sum the grids mapped from each block
+        for grid, cnts in parallel_map(
+                func=map_images, iterable=args, processes=nproc,
+                method='multiprocessing', preserve_order=True):
+            self.grid += grid
+            self.cnts += cnts
+
+def map_images(args):
+    '''
+    Map a block of images of an imageset into reciprocal space grids of
+    intensity sums and counts.
+
+    '''
+    imageset, first, last, grid_size, max_resolution, reverse_phi = args
+    rec_range = 1 / max_resolution
+    grid = flex.double(flex.grid(grid_size, grid_size, grid_size), 0)
+    cnts = flex.int(flex.grid(grid_size, grid_size, grid_size), 0)
+
+    beam = imageset.get_beam()
+    s0 = beam.get_s0()
+    axis = imageset.get_goniometer().get_rotation_axis()
+
+    # cache transformation for each panel
+    targets = []
+    for panel in imageset.get_detector():
+        xlim, ylim = panel.get_image_size()
+        xy = recviewer.get_target_pixels(panel, s0, xlim, ylim, max_resolution)
         pixel_size = panel.get_pixel_size()
-        xlim, ylim = imageset.get_raw_data(0)[0].all()
-
-        # cache transformation
-        xy = recviewer.get_target_pixels(panel, s0, xlim, ylim, self.max_resolution)
-
-        s1 = panel.get_lab_coord(xy * pixel_size[0]) # FIXME: assumed square pixel
+        x, y = xy.parts()
+        s1 = panel.get_lab_coord(
+            flex.vec2_double(x * pixel_size[0], y * pixel_size[1]))
         s1 = s1 / s1.norms() * (1 / beam.get_wavelength())
-        S = s1 - s0
-        npoints = self.grid.all()[0]
-
-        for i in xrange(len(imageset)):
-            step = 2 * rec_range / npoints
-            axis = imageset.get_goniometer().get_rotation_axis()
-            osc_range = imageset.get_scan(i).get_oscillation_range()
-            print("Oscillation range: %.1f - %.1f" % (osc_range[0], osc_range[1]))
-            angle = (osc_range[0] + osc_range[1]) / 2 / 180 * math.pi
-            if not self.reverse_phi: # FIXME: ???
-                angle *= -1
+        targets.append((xy, s1 - s0))
+
+    for i in range(first, last):
+        osc_range = imageset.get_scan(i).get_oscillation_range()
+        print("Oscillation range: %.1f - %.1f" % (osc_range[0], osc_range[1]))
+        angle = (osc_range[0] + osc_range[1]) / 2 / 180 * math.pi
+        if not reverse_phi: # FIXME: ???
+            angle *= -1
+        data = imageset.get_raw_data(i)
+        for image, (xy, S) in zip(data, targets):
             rotated_S = S.rotate_around_origin(axis, angle)
-            recviewer.fill_voxels(imageset.get_raw_data(i)[0], self.grid, self.cnts, rotated_S, xy, rec_range)
+            recviewer.fill_voxels(image, grid, cnts, rotated_S, xy, rec_range)
+    return grid, cnts
 
 if __name__ == '__main__':
   from dials.util import halraiser
@@ -79,11 +79,92 @@
 ''', process_includes=True)
 
 
+class origin_offset_scorer(object):
+  """Score trial detector origin offsets for one imageset.
+
+     A trial origin offset translates the whole detector, so the laboratory
+     coordinates of the spots are computed once and each trial only shifts
+     them and maps them to reciprocal space with array operations, instead of
+     building a new detector and goniometer for every trial."""
+
+  def __init__(self, spots_mm, imageset, solutions, amax):
+    detector = imageset.get_detector()
+    beam = imageset.get_beam()
+    goniometer = imageset.get_goniometer()
+    x, y, self.phi = spots_mm['xyzobs.mm.value'].parts()
+    panel_numbers = flex.size_t(spots_mm['panel'])
+    self.lab = flex.vec3_double(len(spots_mm))
+    for i_panel in range(len(detector)):
+      sel = (panel_numbers == i_panel)
+      self.lab.set_selected(sel, detector[i_panel].get_lab_coord(
+        flex.vec2_double(x.select(sel), y.select(sel))))
+    self.wavelength = beam.get_wavelength()
+    self.s0 = beam.get_s0()
+    # The spots must correspond to detector positions not to the correct RS
+    # position so any fixed rotation is ignored
+    if goniometer is not None:
+      self.setting_rotation_inverse = tuple(
+        matrix.sqr(goniometer.get_setting_rotation()).inverse())
+      self.rotation_axis = goniometer.get_rotation_axis_datum()
+    else:
+      self.setting_rotation_inverse = None
+      self.rotation_axis = None
+    self.solutions = solutions
+    self.amax = amax
+
+  def reciprocal_space_vectors(self, origin_offset):
+    s1 = self.lab + tuple(origin_offset)
+    s1 = s1/s1.norms() * (1/self.wavelength)
+    S = s1 - self.s0
+    if self.rotation_axis is not None:
+      S = (self.setting_rotation_inverse * S).rotate_around_origin(
+        self.rotation_axis, -self.phi)
+    return S
+
+  def score(self, origin_offset):
+    return sum_score_detail(
+      self.reciprocal_space_vectors(origin_offset), self.solutions,
+      amax=self.amax)
+
+
+def score_origin_offsets(args):
+  """Sum the scores of the imagesets for each of a list of origin offsets"""
+  scorers, origin_offsets = args
+  return flex.double(
+    sum(scorer.score(offset) for scorer in scorers)
+    for offset in origin_offsets)
+
+
 class better_experimental_model_discovery(object):
   def __init__(self, imagesets, spot_lists, solution_lists,
-               amax_lists, horizon_phil, wide_search_binning=1):
+               amax_lists, horizon_phil, wide_search_binning=1, nproc=1):
     from libtbx import adopt_init_args
     adopt_init_args(self, locals())
+    self.scorers = [
+      origin_offset_scorer(spots, imageset, solutions, amax)
+      for imageset, spots, solutions, amax in zip(
+        imagesets, spot_lists, solution_lists, amax_lists)]
+
+  def score_origin_offsets(self, origin_offsets):
+    """Score a grid of origin offsets, spread over nproc processes"""
+    origin_offsets = list(origin_offsets)
+    nproc = min(self.nproc, len(origin_offsets))
+    if nproc <= 1:
+      return score_origin_offsets((self.scorers, origin_offsets))
+    from libtbx import easy_mp
+    blocks = [origin_offsets[i::nproc] for i in range(nproc)]
+    results = easy_mp.parallel_map(
+      func=score_origin_offsets,
+      iterable=[(self.scorers, block) for block in blocks],
+      processes=nproc,
+      method="multiprocessing",
+      preserve_order=True,
+      preserve_exception_message=True)
+    scores = flex.double(len(origin_offsets))
+    for i, block_scores in enumerate(results):
+      scores.set_selected(
+        flex.size_t_range(i, len(origin_offsets), nproc), block_scores)
+    return scores
 
   def optimize_origin_offset_local_scope(self):
     """Local scope: find the optimal origin-offset closest to the current overall detector position
@@ -112,18 +193,10 @@ def optimize_origin_offset_local_scope(self):
       plot_px_sz *= self.wide_search_binning
       grid = max(1,int(scope/plot_px_sz))
       widegrid = 2 * grid + 1
-      scores = flex.double()
-      for y in xrange(-grid,grid+1):
-        for x in xrange(-grid,grid+1):
-          new_origin_offset = x*plot_px_sz*beamr1 + y*plot_px_sz*beamr2
-          score = 0
-          for i in range(len(self.imagesets)):
-            score += self.get_origin_offset_score(new_origin_offset,
-                                                  self.solution_lists[i],
-                                                  self.amax_lists[i],
-                                                  self.spot_lists[i],
-                                                  self.imagesets[i])
-          scores.append(score)
+      scores = self.score_origin_offsets(
+        x*plot_px_sz*beamr1 + y*plot_px_sz*beamr2
+        for y in xrange(-grid,grid+1)
+        for x in xrange(-grid,grid+1))
 
       def igrid(x): return x - (widegrid//2)
 
@@ -170,12 +243,8 @@ def target(selfOO, vector):
         if selfOO.wide_search_offset is not None:
           trial_origin_offset += selfOO.wide_search_offset
         target = 0
-        for i in range(len(self.imagesets)):
-          target -= self.get_origin_offset_score(trial_origin_offset,
-                                                 self.solution_lists[i],
-                                                 self.amax_lists[i],
-                                                 self.spot_lists[i],
-                                                 self.imagesets[i])
+        for scorer in self.scorers:
+          target -= scorer.score(trial_origin_offset)
         return target
 
     MIN = test_simplex_method(wide_search_offset=wide_search_offset)
@@ -185,18 +254,10 @@ def target(selfOO, vector):
       scope = self.horizon_phil.indexing.mm_search_scope
       plot_px_sz = self.imagesets[0].get_detector()[0].get_pixel_size()[0]
       grid = max(1,int(scope/plot_px_sz))
-      scores = flex.double()
-      for y in xrange(-grid,grid+1):
-        for x in xrange(-grid,grid+1):
-          new_origin_offset = x*plot_px_sz*beamr1 + y*plot_px_sz*beamr2
-          score = 0
-          for i in range(len(self.imagesets)):
-            score += self.get_origin_offset_score(new_origin_offset,
-                                                  self.solution_lists[i],
-                                                  self.amax_lists[i],
-                                                  self.spot_lists[i],
-                                                  self.imagesets[i])
-          scores.append(score)
+      scores = self.score_origin_offsets(
+        x*plot_px_sz*beamr1 + y*plot_px_sz*beamr2
+        for y in xrange(-grid,grid+1)
+        for x in xrange(-grid,grid+1))
 
       def show_plot(widegrid,excursi):
         excursi.reshape(flex.grid(widegrid, widegrid))
@@ -229,55 +290,47 @@ def igrid(x): return x - (widegrid//2)
     return dps_extended.get_new_detector(self.imagesets[0].get_detector(), new_offset)
 
   def get_origin_offset_score(self, trial_origin_offset, solutions, amax, spots_mm, imageset):
-    from rstbx.indexing_api import lattice # import dependency
-    from rstbx.indexing_api import dps_extended
-    trial_detector = dps_extended.get_new_detector(imageset.get_detector(), trial_origin_offset)
-
-    from dials.algorithms.indexing.indexer import indexer_base
-    # Key point for this is that the spots must correspond to detector
-    # positions not to the correct RS position => reset any fixed rotation
-    # to identity - copy in case called from elsewhere
-    import copy
-    gonio = copy.deepcopy(imageset.get_goniometer())
-    gonio.set_fixed_rotation((1, 0, 0, 0, 1, 0, 0, 0, 1))
-    indexer_base.map_centroids_to_reciprocal_space(
-      spots_mm, trial_detector, imageset.get_beam(), gonio)
-
-    return self.sum_score_detail(spots_mm['rlp'], solutions, amax=amax)
+    scorer = origin_offset_scorer(spots_mm, imageset, solutions, amax)
+    return scorer.score(trial_origin_offset)
 
   def sum_score_detail(self, reciprocal_space_vectors, solutions, granularity=None, amax=None):
-    """Evaluates the probability that the trial value of (S0_vector | origin_offset) is correct,
-       given the current estimate and the observations.  The trial value comes through the
-       reciprocal space vectors, and the current estimate comes through the short list of
-       DPS solutions. Actual return value is a sum of NH terms, one for each DPS solution, each ranging
-       from -1.0 to 1.0"""
-    import cmath
-    from rstbx.dps_core import Direction, Directional_FFT
-    nh = min(solutions.size(), 20) # extended API
-    sum_score = 0.0
-    for t in xrange(nh):
-      #if t!=unique:continue
-      dfft = Directional_FFT(
-        angle=Direction(solutions[t]), xyzdata=reciprocal_space_vectors,
-        granularity=5.0, amax=amax, # extended API XXX These values have to come from somewhere!
-        F0_cutoff = 11)
-      kval = dfft.kval();
-      kmax = dfft.kmax();
-      #kval_cutoff = self.raw_spot_input.size()/4.0; # deprecate record
-      kval_cutoff = reciprocal_space_vectors.size()/4.0; # deprecate record
-      if kval > kval_cutoff:
-        ff=dfft.fft_result;
-        kbeam = ((-dfft.pmin)/dfft.delta_p) + 0.5;
-        Tkmax = cmath.phase(ff[kmax]);
-        backmax = math.cos(Tkmax+(2*math.pi*kmax*kbeam/(2*ff.size()-1)));
-        ### Here it should be possible to calculate a gradient.
-        ### Then minimize with respect to two coordinates.  Use lbfgs?  Have second derivatives?
-        ### can I do something local to model the cosine wave?
-        ### direction of wave travel.  Period. phase.
-        sum_score += backmax;
-      #if t == unique:
-      #  print t, kmax, dfft.pmin, dfft.delta_p, Tkmax,(2*math.pi*kmax*kbeam/(2*ff.size()-1))
-    return sum_score
+    return sum_score_detail(
+      reciprocal_space_vectors, solutions, granularity=granularity, amax=amax)
+
+
+def sum_score_detail(reciprocal_space_vectors, solutions, granularity=None, amax=None):
+  """Evaluates the probability that the trial value of (S0_vector | origin_offset) is correct,
+     given the current estimate and the observations.  The trial value comes through the
+     reciprocal space vectors, and the current estimate comes through the short list of
+     DPS solutions. Actual return value is a sum of NH terms, one for each DPS solution, each ranging
+     from -1.0 to 1.0"""
+  import cmath
+  from rstbx.dps_core import Direction, Directional_FFT
+  nh = min(solutions.size(), 20) # extended API
+  sum_score = 0.0
+  for t in xrange(nh):
+    #if t!=unique:continue
+    dfft = Directional_FFT(
+      angle=Direction(solutions[t]), xyzdata=reciprocal_space_vectors,
+      granularity=5.0, amax=amax, # extended API XXX These values have to come from somewhere!
+      F0_cutoff = 11)
+    kval = dfft.kval();
+    kmax = dfft.kmax();
+    #kval_cutoff = self.raw_spot_input.size()/4.0; # deprecate record
+    kval_cutoff = reciprocal_space_vectors.size()/4.0; # deprecate record
+    if kval > kval_cutoff:
+      ff=dfft.fft_result;
+      kbeam = ((-dfft.pmin)/dfft.delta_p) + 0.5;
+      Tkmax = cmath.phase(ff[kmax]);
+      backmax = math.cos(Tkmax+(2*math.pi*kmax*kbeam/(2*ff.size()-1)));
+      ### Here it should be possible to calculate a gradient.
+      ### Then minimize with respect to two coordinates.  Use lbfgs?  Have second derivatives?
+      ### can I do something local to model the cosine wave?
+      ### direction of wave travel.  Period. phase.
+      sum_score += backmax;
+    #if t == unique:
+    #  print t, kmax, dfft.pmin, dfft.delta_p, Tkmax,(2*math.pi*kmax*kbeam/(2*ff.size()-1))
+  return sum_score
 
 
 def run_dps(args):
@@ -418,7 +471,7 @@ def discover_better_experimental_model(
   if dps_params.indexing.improve_local_scope == "origin_offset":
     discoverer = better_experimental_model_discovery(
       imagesets, spot_lists_mm, solution_lists, amax_list, dps_params,
-      wide_search_binning=wide_search_binning)
+      wide_search_binning=wide_search_binning, nproc=nproc)
     new_detector = discoverer.optimize_origin_offset_local_scope()
     old_panel, old_beam_centre = detector.get_ray_intersection(beam.get_s0())
     new_panel, new_beam_centre = new_detector.get_ray_intersection(beam.get_s0())
@@ -487,6 +540,10 @@ def run(args):
       filter_reflections_by_scan_range(refl, params.scan_range)
       for refl in reflections]
 
+  if params.nproc is libtbx.Auto:
+    from libtbx.introspection import number_of_processors
+    params.nproc = number_of_processors(return_value_if_unknown=-1)
+
   dps_params = dps_phil_scope.extract()
   # for development, we want an exhaustive plot of beam probability map:
   dps_params.indexing.plot_search_scope = params.plot_search_scope
@@ -2,19 +2,20 @@
 
 from __future__ import absolute_import, division, print_function
 
-def sum_images(in_template, out_image, start, end):
+def sum_images(in_template, out_image, start, end, nproc=1):
   from dials.util.rebin_images import main_sum
   in_images = [in_template % j for j in range(start, end + 1)]
-  main_sum(in_images, out_image)
+  main_sum(in_images, out_image, nproc=nproc)
   return
 
 if __name__ == '__main__':
   import sys
-  if len(sys.argv) != 5:
-    raise RuntimeError('%s in_\%d_0001.cbf out_1_0001.cbf start end' % \
+  if len(sys.argv) not in (5, 6):
+    raise RuntimeError('%s in_\%d_0001.cbf out_1_0001.cbf start end [nproc]' % \
       sys.argv[0])
   in_template = sys.argv[1]
   out_image = sys.argv[2]
   start = int(sys.argv[3])
   end = int(sys.argv[4])
-  sum_images(in_template, out_image, start, end)
+  nproc = int(sys.argv[5]) if len(sys.argv) == 6 else 1
+  sum_images(in_template, out_image, start, end, nproc=nproc)
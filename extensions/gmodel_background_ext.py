@@ -27,7 +27,9 @@ def phil(cls):
 
       model = None
         .type = str
-        .help = "The model filename"
+        .help = "The model filename. Either a pickled model or a model in the"
+                "flat binary layout which is memory mapped and shared between"
+                "processes"
 
     ''')
     return phil
@@ -107,3 +107,46 @@ def test_run(dials_regression, tmpdir):
   assert (scale3 > 0).count(False) == 0
   assert (scale4 > 0).count(False) == 0
   assert (diff1 < 1e-5).count(False) == 0
+
+def test_memory_mapped_model(tmpdir):
+  import six.moves.cPickle as pickle
+  import pytest
+  from dials.array_family import flex
+  from dials.algorithms.background.gmodel import StaticBackgroundModel
+  from dials.algorithms.background.gmodel import MemoryMappedBackgroundModel
+  from dials.algorithms.background.gmodel.algorithm import ModelCache
+  from dials.algorithms.background.gmodel.algorithm import write_mapped_model
+
+  tmpdir.chdir()
+
+  model = StaticBackgroundModel()
+  for size in [(20, 30), (7, 11), (40, 10)]:
+    data = flex.random_double(size[0] * size[1])
+    data.reshape(flex.grid(size))
+    model.add(data)
+  write_mapped_model(model, "model.bin")
+
+  # The model cache maps the file rather than unpickling it
+  mapped = ModelCache().get("model.bin")
+  assert isinstance(mapped, MemoryMappedBackgroundModel)
+  assert len(mapped) == len(model)
+  mapped.verify_all()
+  for i in range(len(model)):
+    assert mapped.data(i).all() == model.data(i).all()
+    assert mapped.data(i).all_eq(model.data(i))
+
+  # Pickling passes the filename so the copy maps the same file
+  mapped2 = pickle.loads(pickle.dumps(mapped))
+  assert mapped2.filename() == "model.bin"
+  assert mapped2.data(1).all_eq(model.data(1))
+
+  # A corrupted panel fails the checksum when first used
+  with open("model.bin", "rb") as infile:
+    contents = bytearray(infile.read())
+  contents[-1] ^= 0xff
+  with open("corrupt.bin", "wb") as outfile:
+    outfile.write(contents)
+  corrupt = MemoryMappedBackgroundModel("corrupt.bin")
+  assert corrupt.data(0).all_eq(model.data(0))
+  with pytest.raises(RuntimeError):
+    corrupt.data(2)
@@ -0,0 +1,92 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+def generate_images(nimages, size=(20, 30)):
+  from dials.array_family import flex
+  images = []
+  for i in range(nimages):
+    data = flex.random_double(size[0] * size[1]) * 100
+    data.reshape(flex.grid(size))
+    mask = flex.random_double(size[0] * size[1]) < 0.9
+    mask.reshape(flex.grid(size))
+    strong = flex.random_double(size[0] * size[1]) < 0.1
+    strong.reshape(flex.grid(size))
+    # Pixel (0, 0) is always valid and strong
+    mask[0, 0] = True
+    strong[0, 0] = True
+    images.append((data, mask, strong))
+  return images
+
+def accumulate(images, size=(20, 30)):
+  from dials.algorithms.background.modeller import PixelStatistics
+  stats = PixelStatistics(*size)
+  for data, mask, strong in images:
+    stats.add(data, mask, strong)
+  return stats
+
+def test_single_pass():
+  from dials.array_family import flex
+  images = generate_images(20)
+  stats = accumulate(images)
+  assert stats.num_images() == 20
+  mean = stats.mean(1)
+  variance = stats.variance(1)
+  dispersion = stats.dispersion(1)
+  num = stats.num()
+  num_valid = stats.num_valid()
+  num_strong = stats.num_strong()
+  for j, i in [(1, 1), (5, 7), (19, 29)]:
+    values = flex.double([d[j, i] for d, m, s in images if m[j, i]])
+    background = flex.double([
+      d[j, i] for d, m, s in images if m[j, i] and not s[j, i]])
+    assert num_valid[j, i] == len(values)
+    assert num_strong[j, i] == len(values) - len(background)
+    assert num[j, i] == len(background)
+    assert stats.min()[j, i] == flex.min(values)
+    assert stats.max()[j, i] == flex.max(values)
+    if len(background) > 0:
+      m = flex.mean(background)
+      v = flex.sum((background - m)**2) / len(background)
+      assert mean[j, i] == pytest.approx(m)
+      assert variance[j, i] == pytest.approx(v)
+      assert dispersion[j, i] == pytest.approx(v / m)
+
+  # Pixel (0, 0) is hot
+  hot_mask = stats.hot_pixel_mask(10)
+  assert hot_mask[0, 0] == False
+  assert hot_mask.count(False) == 1
+
+def test_merge_and_pickle():
+  import six.moves.cPickle as pickle
+  images = generate_images(30)
+  expected = accumulate(images)
+  stats = accumulate(images[0:7])
+  stats += pickle.loads(pickle.dumps(accumulate(images[7:20])))
+  stats += accumulate(images[20:])
+  assert stats.num_images() == expected.num_images()
+  assert stats.num().all_eq(expected.num())
+  assert stats.num_valid().all_eq(expected.num_valid())
+  assert stats.num_strong().all_eq(expected.num_strong())
+  assert stats.min().all_eq(expected.min())
+  assert stats.max().all_eq(expected.max())
+  assert stats.mean(1).all_approx_equal(expected.mean(1))
+  assert stats.variance(1).all_approx_equal(expected.variance(1))
+  assert stats.mask(10).all_eq(expected.mask(10))
+
+def test_gain_few_pixels():
+  from dials.array_family import flex
+  from dials.algorithms.background.pixel_statistics import PixelStatisticsResult
+  for size in [(1, 1), (1, 2)]:
+    images = []
+    for i in range(12):
+      data = flex.random_double(size[0] * size[1]) * 100 + 1
+      data.reshape(flex.grid(size))
+      mask = flex.bool(flex.grid(size), True)
+      strong = flex.bool(flex.grid(size), False)
+      images.append((data, mask, strong))
+    result = PixelStatisticsResult([accumulate(images, size)], range(12))
+    dispersion = result.gain_map(10)[0]
+    assert min(dispersion) <= result.gain(10) <= max(dispersion)
+    with pytest.raises(RuntimeError):
+      result.gain(20)
@@ -164,3 +164,23 @@ def __init__(self, experiment, reflections,
 
     print(self.misindexed_global, self.correct_global, len(self.reflections_global))
     print(self.misindexed_local, self.correct_local, len(self.reflections_local))
+
+
+def test_count_indexed():
+  from dials.algorithms.indexing import count_indexed
+  B = matrix.sqr((1/50, 0, 0, 0, 1/60, 0, 0, 0, 1/70))
+  A = random_rotation() * B
+  A_other = random_rotation() * B
+  A_double = A * matrix.sqr((2, 0, 0, 0, 1, 0, 0, 0, 1)).inverse()
+  hkl = flex.vec3_double()
+  for i in range(200):
+    hkl.append(tuple(random.randint(-10, 10) for j in range(3)))
+  hkl.append((0, 0, 0))
+  rlps = A.elems * hkl
+  counts = count_indexed(
+    rlps, flex.mat3_double([A.elems, A_other.elems, A_double.elems]),
+    tolerance=0.1)
+  expected = (hkl.norms() > 0).count(True)
+  assert counts[0] == expected
+  assert counts[1] < counts[0]
+  assert counts[2] == expected
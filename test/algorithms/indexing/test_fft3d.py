@@ -0,0 +1,36 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+
+import pytest
+
+@pytest.mark.parametrize('gridding', [(8, 8, 8), (10, 6, 9), (12, 15, 20)])
+@pytest.mark.parametrize('nthreads', [1, 3])
+def test_fft3d_real_part_squared(gridding, nthreads):
+  from dials.algorithms.indexing import fft3d_real_part_squared
+  from scitbx import fftpack
+  from scitbx.array_family import flex
+  grid = flex.random_double(gridding[0] * gridding[1] * gridding[2])
+  grid.reshape(flex.grid(gridding))
+
+  # The reference complex to complex transform
+  fft = fftpack.complex_to_complex_3d(gridding)
+  grid_complex = flex.complex_double(
+    reals=grid,
+    imags=flex.double(grid.size(), 0))
+  expected = flex.pow2(flex.real(fft.forward(grid_complex)))
+
+  fft3d_real_part_squared(grid, nthreads=nthreads)
+  assert grid.all() == gridding
+  assert grid.as_1d().all_approx_equal(expected.as_1d(), 1e-6)
+
+def test_fft3d_peak_mask():
+  from dials.algorithms.indexing import fft3d_peak_mask
+  from scitbx.array_family import flex
+  grid = flex.random_double(10 * 10 * 10)
+  grid.reshape(flex.grid(10, 10, 10))
+  rmsd = math.sqrt(flex.mean(flex.pow2(grid - flex.mean(grid))))
+  mask = fft3d_peak_mask(grid, rmsd_cutoff=3)
+  expected = ((grid >= 3 * rmsd) & (grid > 0)).as_int()
+  assert mask.all() == grid.all()
+  assert mask.as_1d().all_eq(expected.as_1d())
@@ -1,6 +1,9 @@
 from __future__ import absolute_import, division, print_function
 
-def test():
+import pytest
+
+@pytest.mark.parametrize('nthreads', [1, 2])
+def test(nthreads):
   from dials.algorithms.profile_model.modeller import ProfileModellerIface
   from dials.algorithms.profile_model.modeller import MultiExpProfileModeller
   from dials.array_family import flex
@@ -46,8 +49,8 @@ def finalize(self):
     modeller2.add(Modeller(idx, expected[idx]))
 
   # Model the reflections
-  modeller1.model(reflections)
-  modeller2.model(reflections)
+  modeller1.model(reflections, nthreads)
+  modeller2.model(reflections, nthreads)
 
   # Accumulate
   modeller1.accumulate(modeller2)
@@ -57,3 +60,48 @@ def finalize(self):
 
   # Check finalized
   assert(modeller1.finalized)
+
+def test_gaussian_rs_threaded(dials_regression):
+  from dials.algorithms.profile_model.modeller import MultiExpProfileModeller
+  from dials.array_family import flex
+  from dxtbx.model.experiment_list import ExperimentListFactory
+  from os.path import join
+
+  directory = join(dials_regression, "integration_test_data", "shoeboxes")
+  experiments = ExperimentListFactory.from_json_file(
+    join(directory, "integrated_experiments.json"),
+    check_format=False)
+  reflections = flex.reflection_table.from_pickle(
+    join(directory, "shoeboxes_0_0.pickle"))
+
+  # Prepare the shoeboxes as for the modelling pass
+  reflections.unset_flags(
+    flex.bool(len(reflections), True),
+    reflections.flags.used_in_modelling)
+  reflections.compute_partiality(experiments)
+  reflections.compute_mask(experiments)
+  reflections.compute_background(experiments)
+  reflections.compute_summed_intensity()
+
+  # Model the same reflections with one and several threads
+  results = []
+  for nthreads in [1, 4]:
+    table = reflections.copy()
+    modeller = MultiExpProfileModeller()
+    for experiment in experiments:
+      modeller.add(experiment.profile.fitting_class()(experiment))
+    modeller.model(table, nthreads)
+    results.append((modeller, table))
+
+  (modeller1, table1), (modeller2, table2) = results
+  used1 = table1.get_flags(table1.flags.used_in_modelling)
+  used2 = table2.get_flags(table2.flags.used_in_modelling)
+  assert used1.count(True) > 0
+  assert used1.all_eq(used2)
+  for i in range(len(experiments)):
+    m1, m2 = modeller1[i], modeller2[i]
+    assert len(m1) == len(m2)
+    for j in range(len(m1)):
+      assert m1.n_reflections(j) == m2.n_reflections(j)
+      if m1.n_reflections(j) > 0:
+        assert m1.data(j).all_approx_equal(m2.data(j), 1e-7)
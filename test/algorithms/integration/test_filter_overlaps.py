@@ -60,3 +60,60 @@ def is_overlap(code):
     for i, this_code in enumerate(mask_array):
       assert not is_overlap(this_code), \
           "Overlapping foreground and background found at (%d, %d)" % (i % shoebox.xsize(), i // shoebox.xsize())
+
+def make_shoeboxes(detector, bboxes, panels, foreground):
+  from dials.array_family import flex
+  from dials.algorithms.shoebox import MaskCode
+  shoeboxes = flex.shoebox(flex.size_t(panels), flex.int6(bboxes))
+  shoeboxes.allocate()
+  for sbox, (x0, x1, y0, y1) in zip(shoeboxes, foreground):
+    mask = sbox.mask
+    for j in range(sbox.ysize()):
+      for i in range(sbox.xsize()):
+        x, y = sbox.bbox[0] + i, sbox.bbox[2] + j
+        if x0 <= x < x1 and y0 <= y < y1:
+          mask[0, j, i] = MaskCode.Foreground | MaskCode.Valid
+        else:
+          mask[0, j, i] = MaskCode.Background | MaskCode.Valid
+    sbox.mask = mask
+  return shoeboxes
+
+def test_native_overlaps_filter():
+  from dials.algorithms.integration import ShoeboxOverlapsFilter
+  from dxtbx.model import Detector
+
+  detector = Detector()
+  for i in range(2):
+    panel = detector.add_panel()
+    panel.set_image_size((50, 40))
+
+  # Reflections 0 and 1 have overlapping foreground, reflection 2 has its
+  # foreground in the background of 3, reflection 4 is on the second panel
+  # in the same position as 0 and reflection 5 extends off the panel
+  bboxes = [(0, 10, 0, 10, 0, 1),
+            (5, 15, 5, 15, 0, 1),
+            (20, 30, 20, 30, 0, 1),
+            (25, 35, 20, 30, 0, 1),
+            (0, 10, 0, 10, 0, 1),
+            (45, 55, 35, 45, 0, 1)]
+  foreground = [(3, 8, 3, 8),
+                (7, 12, 7, 12),
+                (22, 27, 22, 27),
+                (30, 34, 22, 27),
+                (3, 8, 3, 8),
+                (47, 53, 37, 43)]
+  panels = [0, 0, 0, 0, 1, 1]
+  shoeboxes = make_shoeboxes(detector, bboxes, panels, foreground)
+  kernel = ShoeboxOverlapsFilter(detector, shoeboxes)
+
+  assert list(kernel.foreground_foreground()) == [
+    False, False, True, True, True, True]
+  assert list(kernel.foreground_background()) == [
+    False, False, False, False, True, True]
+
+  count = kernel.foreground_count(0)
+  assert count.all() == (40, 50)
+  assert count[7, 7] == 2
+  assert count[4, 4] == 1
+  assert count[24, 24] == 1
+  assert kernel.foreground_count(1)[39, 49] == 1
@@ -0,0 +1,86 @@
+"""
+Test that the managed reflection predictor reuses predictions only for
+experiments whose models are unchanged.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+def test_prediction_reuse():
+  from math import pi
+  from dials.array_family import flex
+  from libtbx.phil import parse
+  from libtbx.test_utils import approx_equal
+  import dials.test.algorithms.refinement.setup_geometry as setup_geometry
+  from dxtbx.model import ScanFactory
+  from dxtbx.model.experiment_list import ExperimentList, Experiment
+  from dials.algorithms.refinement.parameterisation.crystal_parameters import \
+      CrystalOrientationParameterisation
+  from dials.algorithms.spot_prediction import IndexGenerator
+  from dials.algorithms.spot_prediction import ray_intersection
+  from dials.algorithms.refinement.prediction import ScansRayPredictor, \
+    ExperimentsPredictor
+  from cctbx.sgtbx import space_group, space_group_symbols
+
+  master_phil = parse("""
+      include scope dials.test.algorithms.refinement.geometry_phil
+      """, process_includes=True)
+  models = setup_geometry.Extract(master_phil,
+    local_overrides="geometry.parameters.random_seed = 1")
+  crystal1 = models.crystal
+  models = setup_geometry.Extract(master_phil,
+    local_overrides="geometry.parameters.random_seed = 2")
+  crystal2 = models.crystal
+
+  scan = ScanFactory().make_scan(image_range=(1,900), exposure_times=0.1,
+    oscillation=(0, 0.1), epochs=range(900), deg=True)
+  sweep_range = scan.get_oscillation_range(deg=False)
+
+  experiments = ExperimentList()
+  for crystal in (crystal1, crystal2):
+    experiments.append(Experiment(beam=models.beam, detector=models.detector,
+      goniometer=models.goniometer, scan=scan, crystal=crystal,
+      imageset=None))
+
+  # Generate reflections for both experiments
+  index_generator = IndexGenerator(crystal1.get_unit_cell(),
+    space_group(space_group_symbols(1).hall()).type(), 3.0)
+  indices = index_generator.to_array()
+  ray_predictor = ScansRayPredictor(experiments, sweep_range)
+  reflections = flex.reflection_table()
+  for iexp in range(len(experiments)):
+    refs = ray_predictor(indices, experiment_id=iexp)
+    refs['id'] = flex.int(len(refs), iexp)
+    refs = refs.select(ray_intersection(models.detector, refs))
+    reflections.extend(refs)
+
+  predictor = ExperimentsPredictor(experiments, reuse_predictions=True)
+  reference = ExperimentsPredictor(experiments)
+  reflections = predictor(reflections)
+  assert len(predictor._cache) == 2
+  cached = dict(predictor._cache)
+
+  # Nothing changed so the cached predictions are used for both experiments
+  reflections = predictor(reflections)
+  assert predictor._cache[0] is cached[0]
+  assert predictor._cache[1] is cached[1]
+
+  # Rotate the second crystal. Only its predictions are recalculated
+  xlo_param = CrystalOrientationParameterisation(crystal2)
+  p_vals = xlo_param.get_param_vals()
+  xlo_param.set_param_vals([p + 2. for p in p_vals])
+  reflections = predictor(reflections)
+  assert predictor._cache[0] is cached[0]
+  assert predictor._cache[1] is not cached[1]
+
+  # The results are the same as without the cache
+  expected = reference(reflections.copy())
+  for key in ('s1', 'xyzcal.mm', 'xyzcal.px'):
+    for a, b in zip(reflections[key], expected[key]):
+      assert approx_equal(a, b)
+  assert (reflections.get_flags(reflections.flags.predicted) ==
+          expected.get_flags(expected.flags.predicted)).all_eq(True)
+
+  # Changing the reflections of an experiment also invalidates the cache
+  reflections['miller_index'][0] = (0, 0, 1)
+  reflections = predictor(reflections)
+  assert predictor._cache[0] is not cached[0]
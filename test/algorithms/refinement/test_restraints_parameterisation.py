@@ -425,3 +425,65 @@ def test_group_restraint_with_multiple_crystals_and_a_stills_refiner(dials_regre
     #print list(fd.round(6))
     #print
     assert an == pytest.approx(fd, abs=1e-5)
+
+@pytest.mark.parametrize('tie_class', ['MeanUnitCellTie',
+  'LowMemoryMeanUnitCellTie', 'MedianUnitCellTie'])
+def test_group_restraint_gradient_triplets(tie_class):
+  '''Check the sparse triplets against the per crystal gradient blocks'''
+
+  from copy import deepcopy
+  from scitbx import sparse
+  from dials.test.algorithms.refinement.setup_geometry import Extract
+  from dials.algorithms.refinement.restraints import restraints
+  from dials.algorithms.refinement.parameterisation.crystal_parameters import \
+      CrystalUnitCellParameterisation
+
+  master_phil = parse("""
+      include scope dials.test.algorithms.refinement.geometry_phil
+      """, process_includes=True)
+  models = Extract(master_phil)
+
+  # make five crystals with slightly different cells
+  xlucp = []
+  for i in range(5):
+    crystal = deepcopy(models.crystal)
+    param = CrystalUnitCellParameterisation(crystal, experiment_ids=[i])
+    p_vals = param.get_param_vals()
+    param.set_param_vals([random.gauss(p, abs(p) * 0.01) for p in p_vals])
+    xlucp.append(param)
+  col_starts = []
+  ncol = 0
+  for param in xlucp:
+    col_starts.append(ncol)
+    ncol += param.num_free()
+
+  tie = getattr(restraints, tie_class)(model_parameterisations=xlucp,
+                                        sigma=[1, 1, 1, 1, 1, 1])
+  residuals = tie.residuals()
+  nrows = len(residuals)
+
+  # the gradients assembled from the per crystal blocks
+  expected = sparse.matrix(nrows, ncol)
+  for icol, grads in zip(col_starts, tie.gradients()):
+    irow = 0
+    for grad in grads:
+      expected.assign_block(grad, irow, icol)
+      irow += grad.n_rows
+
+  rows, cols, values = tie.gradient_triplets(col_starts)
+  assert flex.max(rows) < nrows
+  dense = flex.double(flex.grid(nrows, ncol))
+  for r, c, v in zip(rows, cols, values):
+    dense[r, c] = v
+  for j in range(ncol):
+    col = flex.double([dense[i, j] for i in range(nrows)])
+    assert col == pytest.approx(expected.col(j).as_dense_vector(), abs=1e-12)
+
+  # changing the parameters of one crystal updates the residuals
+  p_vals = xlucp[2].get_param_vals()
+  p_vals[0] *= 1.01
+  xlucp[2].set_param_vals(p_vals)
+  cells = [p.get_model().get_unit_cell().parameters() for p in xlucp]
+  a = flex.double([cell[0] for cell in cells])
+  assert list(tie.residuals()[0:5]) == pytest.approx(
+    list(a - tie._target_value(a)))
@@ -0,0 +1,93 @@
+from __future__ import absolute_import, division, print_function
+
+import random
+
+import pytest
+
+@pytest.fixture
+def points():
+  from scitbx.array_family import flex
+  random.seed(0)
+  result = flex.vec3_double(200)
+  for i in range(len(result)):
+    result[i] = tuple(random.uniform(0, 100) for j in range(3))
+  return result
+
+def brute_force_knn(points, p, k, exclude=None):
+  d = [((points[j][0]-p[0])**2 +
+        (points[j][1]-p[1])**2 +
+        (points[j][2]-p[2])**2)**0.5
+       for j in range(len(points))]
+  order = [j for j in sorted(range(len(points)), key=lambda j: d[j])
+           if j != exclude]
+  return order[:k], [d[j] for j in order[:k]]
+
+def test_knn(points):
+  from dials.algorithms.spatial_indexing import KdTree3
+  from scitbx.array_family import flex
+  tree = KdTree3(points, leaf_size=4)
+  assert len(tree) == len(points)
+  query = flex.vec3_double([(10, 20, 30), (50, 50, 50), (-10, 0, 120)])
+  indices, distances = tree.knn(query, k=3)
+  assert indices.all() == (3, 3)
+  indices, distances = indices.as_1d(), distances.as_1d()
+  for i in range(len(query)):
+    expected, dist = brute_force_knn(points, query[i], 3)
+    assert list(indices[i*3:i*3+3]) == expected
+    assert list(distances[i*3:i*3+3]) == pytest.approx(dist)
+
+def test_knn_self(points):
+  from dials.algorithms.spatial_indexing import KdTree3
+  tree = KdTree3(points)
+  indices, distances = tree.knn_self(k=1)
+  indices, distances = indices.as_1d(), distances.as_1d()
+  for i in range(len(points)):
+    expected, dist = brute_force_knn(points, points[i], 1, exclude=i)
+    assert indices[i] == expected[0]
+    assert distances[i] == pytest.approx(dist[0])
+
+def test_radius_and_box(points):
+  from dials.algorithms.spatial_indexing import KdTree3
+  tree = KdTree3(points)
+  p, r = (40, 60, 50), 20
+  result = sorted(tree.query_radius(p, r))
+  expected = [j for j in range(len(points))
+              if sum((points[j][d]-p[d])**2 for d in range(3)) <= r*r]
+  assert result == expected
+
+  lower, upper = (10, 20, 30), (60, 50, 90)
+  result = sorted(tree.query_box(lower, upper))
+  expected = [j for j in range(len(points))
+              if all(lower[d] <= points[j][d] <= upper[d] for d in range(3))]
+  assert result == expected
+
+  first, second = tree.radius_pairs(10)
+  pairs = set(zip(first, second))
+  expected = set((i, j) for i in range(len(points))
+                 for j in range(i+1, len(points))
+                 if sum((points[i][d]-points[j][d])**2 for d in range(3)) <= 100)
+  assert pairs == expected
+
+def test_overlapping_bbox_selection():
+  from dials.algorithms.spatial_indexing import overlapping_bbox_selection
+  from dials.array_family import flex
+  random.seed(0)
+  n = 300
+  bbox = flex.int6(n)
+  for i in range(n):
+    x, y, z = random.randint(0, 200), random.randint(0, 200), random.randint(0, 20)
+    bbox[i] = (x, x+random.randint(1, 10),
+               y, y+random.randint(1, 10),
+               z, z+random.randint(1, 5))
+  group = flex.size_t([random.randint(0, 1) for i in range(n)])
+  panel = flex.size_t([random.randint(0, 1) for i in range(n)])
+  selection = overlapping_bbox_selection(group, panel, bbox)
+
+  def overlaps(a, b):
+    return all(a[2*d] < b[2*d+1] and b[2*d] < a[2*d+1] for d in range(3))
+  expected = [any(j != i and
+                  group[i] == group[j] and
+                  panel[i] == panel[j] and
+                  overlaps(bbox[i], bbox[j]) for j in range(n))
+              for i in range(n)]
+  assert list(selection) == expected
@@ -0,0 +1,70 @@
+from __future__ import absolute_import, division, print_function
+
+import random
+
+import pytest
+
+@pytest.fixture
+def reflections():
+  from dials.array_family import flex
+  random.seed(0)
+  table = flex.reflection_table()
+  table['xyzobs.px.value'] = flex.vec3_double([
+    (random.uniform(0, 100), random.uniform(0, 100), random.uniform(0, 10))
+    for i in range(300)])
+  table['panel'] = flex.size_t([random.randint(0, 2) for i in range(300)])
+  table['id'] = flex.int([random.randint(0, 1) for i in range(300)])
+  return table
+
+def test_box_and_radius(reflections):
+  index = reflections.spatial_index(per='panel')
+  assert index.groups() == [0, 1, 2]
+  xyz = reflections['xyzobs.px.value']
+  panel = reflections['panel']
+
+  lower, upper = (10, 20, 2), (60, 50, 8)
+  expected = [i for i in range(len(xyz))
+              if all(lower[d] <= xyz[i][d] <= upper[d] for d in range(3))]
+  assert list(index.box(lower, upper)) == expected
+  assert list(index.box(lower, upper, group=1)) == [
+    i for i in expected if panel[i] == 1]
+
+  p, r = (50, 50, 5), 20
+  expected = [i for i in range(len(xyz))
+              if sum((xyz[i][d]-p[d])**2 for d in range(3)) <= r*r]
+  assert list(index.radius(p, r)) == expected
+
+def test_knn(reflections):
+  from dials.array_family import flex
+  index = reflections.spatial_index(per=('id', 'panel'))
+  xyz = reflections['xyzobs.px.value']
+  query = flex.vec3_double([(10, 10, 1), (90, 40, 7)])
+  rows, distances = index.knn(query, k=2, group=(1, 2))
+  assert rows.all() == (2, 2)
+  rows = rows.as_1d()
+  group = [i for i in range(len(xyz))
+           if reflections['id'][i] == 1 and reflections['panel'][i] == 2]
+  for j, q in enumerate(query):
+    expected = sorted(group, key=lambda i: sum(
+      (xyz[i][d]-q[d])**2 for d in range(3)))[:2]
+    assert list(rows[j*2:j*2+2]) == expected
+
+  with pytest.raises(RuntimeError):
+    index.knn(query)
+
+def test_image_slices(reflections):
+  index = reflections.spatial_index(per=None)
+  z = reflections['xyzobs.px.value'].parts()[2]
+  slices = index.image_slices()
+  assert sorted(slices.keys()) == list(range(10))
+  for frame, rows in slices.items():
+    assert sorted(rows) == [i for i in range(len(z)) if int(z[i]) == frame]
+
+def test_cache_invalidation(reflections):
+  index = reflections.spatial_index()
+  assert reflections.spatial_index() is index
+  reflections['xyzobs.px.value'][0] = (200, 200, 5)
+  assert not index.is_valid(reflections)
+  new_index = reflections.spatial_index()
+  assert new_index is not index
+  assert list(new_index.box((150, 150, 0), (250, 250, 10))) == [0]
@@ -0,0 +1,63 @@
+from __future__ import absolute_import, division, print_function
+
+import random
+
+def make_shoebox(gradient_x, gradient_y, size=9):
+  from dials.array_family import flex
+  from dials.model.data import Shoebox
+  shoebox = Shoebox(0, (10, 10 + size, 20, 20 + size, 0, 1))
+  shoebox.allocate()
+  data = shoebox.data
+  for j in range(size):
+    for i in range(size):
+      data[0, j, i] = 100 + gradient_x * (i + 0.5) + gradient_y * (j + 0.5)
+  shoebox.data = data
+  return shoebox
+
+def test_background_gradient_filter():
+  from dials.array_family import flex
+  from dials.algorithms.spot_finding import background_gradient_filter
+  shoeboxes = flex.shoebox([
+    make_shoebox(0, 0),
+    make_shoebox(1, 2),
+    make_shoebox(5, 0),
+    make_shoebox(0, -5)])
+  trusted_range = flex.vec2_double([(-1, 1e6)])
+  keep = background_gradient_filter(shoeboxes, trusted_range, 1, 4)
+  assert list(keep) == [True, True, False, False]
+
+  # untrusted pixels are excluded from the fit
+  shoebox = make_shoebox(0, 0)
+  data = shoebox.data
+  data[0, 0, 0] = 1e7
+  shoebox.data = data
+  keep = background_gradient_filter(
+    flex.shoebox([shoebox]), trusted_range, 1, 4)
+  assert list(keep) == [True]
+
+def test_spots_in_dense_bins():
+  from dials.array_family import flex
+  from dials.algorithms.spot_finding import spots_in_dense_bins
+  random.seed(0)
+  x = flex.double([random.uniform(-1, 11) for i in range(500)])
+  y = flex.double([random.uniform(-1, 11) for i in range(500)])
+  x.extend(flex.double([2.0, 5.5]))
+  y.extend(flex.double([5.5, 10.0]))
+  xedges = flex.double(range(11))
+  yedges = flex.double(range(0, 11, 2))
+  dense = flex.bool(flex.grid(10, 5), False)
+  dense[3, 1] = True
+  dense[2, 2] = True
+  dense[5, 4] = True
+  result = spots_in_dense_bins(x, y, xedges, yedges, dense)
+
+  expected = flex.bool(len(x), False)
+  for ix in range(10):
+    for iy in range(5):
+      if dense[ix, iy]:
+        expected.set_selected(
+          (x > xedges[ix]) & (x < xedges[ix+1]) &
+          (y > yedges[iy]) & (y < yedges[iy+1]), True)
+  assert list(result) == list(expected)
+  # spots on bin edges are not in any bin
+  assert not result[-2] and not result[-1]
@@ -711,7 +711,8 @@ def test_copy():
   assert(table.is_consistent())
   assert(table2.is_consistent())
 
-def test_extract_shoeboxes():
+@pytest.mark.parametrize('nthreads', [1, 4])
+def test_extract_shoeboxes(nthreads):
   from dials.array_family import flex
   from random import randint, seed
   from dials.algorithms.shoebox import MaskCode
@@ -782,7 +783,7 @@ def get_mask(self, index):
       return tuple(im >= 0 for im in image)
   imageset = FakeImageSet()
 
-  reflections.extract_shoeboxes(imageset)
+  reflections.extract_shoeboxes(imageset, nthreads=nthreads)
 
   for i in range(len(reflections)):
     sbox = reflections[i]["shoebox"]
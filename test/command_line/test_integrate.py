@@ -8,6 +8,7 @@
 
 from dials.array_family import flex  # import dependency
 import procrunner
+import pytest
 
 def test2(dials_regression, tmpdir):
   tmpdir.chdir()
@@ -161,6 +162,42 @@ def test_multi_sweep(dials_regression, tmpdir):
   I2 = I2.select(F2)
   assert flex.abs(I1 - I2) < 1e-6
 
+@pytest.mark.parametrize('cache', ['reference', 'all'])
+def test_cache_shoeboxes(dials_regression, tmpdir, cache):
+  tmpdir.chdir()
+
+  # Integrate reading the images in each pass and with cached shoeboxes
+  tables = []
+  for mode in ['none', cache]:
+    result = procrunner.run_process([
+        'dials.integrate',
+        os.path.join(dials_regression, "integration_test_data", 'multi_sweep', 'experiments.json'),
+        os.path.join(dials_regression, "integration_test_data", 'multi_sweep', 'indexed.pickle'),
+        'prediction.padding=0',
+        'integration.integrator=3d',
+        'profile.validation.number_of_partitions=2',
+        'profile.validation.min_partition_size=10',
+        'profile.cache_shoeboxes=%s' % mode,
+        'output.reflections=integrated_%s.pickle' % mode,
+    ])
+    assert result['exitcode'] == 0
+    assert result['stderr'] == ''
+    with open('integrated_%s.pickle' % mode, 'rb') as fh:
+      tables.append(pickle.load(fh))
+
+  # The results should be the same
+  T1, T2 = tables
+  assert len(T1) == len(T2)
+  assert 'shoebox' not in T2
+  assert 'profile.index' not in T2
+  F1 = T1.get_flags(T1.flags.integrated_prf)
+  F2 = T2.get_flags(T2.flags.integrated_prf)
+  assert F1 == F2
+  for name in ['intensity.sum.value', 'intensity.prf.value']:
+    I1 = T1[name].select(F1)
+    I2 = T2[name].select(F2)
+    assert flex.abs(I1 - I2) < 1e-6
+
 def test_multi_lattice(dials_regression, tmpdir):
   tmpdir.chdir()
 
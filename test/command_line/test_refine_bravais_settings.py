@@ -159,3 +159,31 @@ def test_refine_bravais_settings_554(dials_regression, tmpdir):
   assert bravais_summary['5']['bravais'] == 'hR'
   assert bravais_summary['5']['rmsd'] == pytest.approx(0.104, abs=1e-2)
   assert bravais_summary['5']['recommended'] == True
+
+def test_refine_bravais_settings_shared_outlier_rejection(dials_regression, tmpdir):
+  tmpdir.chdir()
+
+  data_dir = os.path.join(dials_regression, "indexing_test_data", "i04_weak_data")
+  pickle_path = os.path.join(data_dir, "indexed.pickle")
+  experiments_path = os.path.join(data_dir, "experiments.json")
+  commands = ["dials.refine_bravais_settings",
+              pickle_path,
+              experiments_path,
+              "reflections_per_degree=5",
+              "minimum_sample_size=500",
+              "beam.fix=all",
+              "detector.fix=all",
+              "shared_outlier_rejection=True",
+              "nproc=2"]
+  command = " ".join(commands)
+  print(command)
+  result = easy_run.fully_buffered(command=command).raise_if_errors()
+  with open("bravais_summary.json", "rb") as fh:
+    bravais_summary = json.load(fh)
+  assert sorted(bravais_summary.keys()) == [str(i) for i in range(1, 10)]
+  assert bravais_summary['9']['unit_cell'] == pytest.approx(
+    [57.78, 57.78, 150.0, 90.0, 90.0, 90.0], abs=1e-1)
+  assert bravais_summary['9']['bravais'] == 'tP'
+  assert bravais_summary['9']['recommended'] == True
+  # every setting is refined against the same reflections
+  assert len(set(s['nspots'] for s in bravais_summary.values())) == 1
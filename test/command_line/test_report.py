@@ -0,0 +1,47 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+def test_unit_bin_aggregates():
+  from dials.array_family import flex
+  from dials.command_line.report import unit_bin_counts, unit_bin_statistics
+
+  z = flex.double([0.1, 0.9, 1.0, 2.5, 2.99, 4.0, -0.5])
+  assert unit_bin_counts(z, 4) == [
+    ((z >= i) & (z < i + 1)).count(True) for i in range(4)]
+  assert unit_bin_counts(z, 0) == []
+
+  data = flex.double([1, 2, 3, 4, 5, 6, 7])
+  counts, means, rms = unit_bin_statistics(z, -1, 5, (data,))
+  for i in range(5):
+    sel = (z >= i - 1) & (z < i)
+    assert counts[i] == sel.count(True)
+    if counts[i] > 0:
+      assert means[0][i] == pytest.approx(flex.mean(data.select(sel)))
+      assert rms[0][i] == pytest.approx(flex.mean_sq(data.select(sel))**0.5)
+
+def test_analyser_required_columns():
+  import inspect
+  import re
+  from dials.array_family import flex
+  from dials.command_line import report
+
+  # Every column an analyser reads must be in its required_columns
+  analysers = [
+    report.StrongSpotsAnalyser, report.CentroidAnalyser,
+    report.BackgroundAnalyser, report.IntensityAnalyser,
+    report.ReferenceProfileAnalyser]
+  for analyser in analysers:
+    source = inspect.getsource(analyser)
+    used = set(re.findall(r"""rlist\[['"]([\w.]+)['"]\]""", source))
+    used.update(re.findall(r"""['"]([\w.]+)['"] (?:not )?in rlist""", source))
+    assert used <= set(analyser.required_columns), analyser.__name__
+
+  # Only the required columns are selected, and an analyser without a list
+  # of columns gets the full table
+  rlist = flex.reflection_table()
+  rlist['id'] = flex.int(3, 0)
+  rlist['shoebox'] = flex.shoebox(3)
+  selected = report.select_report_columns(rlist, report.IntensityAnalyser)
+  assert list(selected.keys()) == ['id']
+  assert report.select_report_columns(rlist, object()) is rlist
@@ -30,3 +30,23 @@ def test_rs_mapper(dials_regression, tmpdir):
 
   assert m.header_mean == pytest.approx(0.018606403842568398, abs=1e-6)
   assert flex.mean(m.data) == pytest.approx(0.018606403842568398, abs=1e-6)
+
+def test_rs_mapper_nproc(dials_regression, tmpdir):
+  tmpdir.chdir()
+
+  # The map should not depend on the number of processes
+  for nproc in (1, 3):
+    result = procrunner.run_process([
+        'dials.rs_mapper',
+        os.path.join(dials_regression, "centroid_test_data", "datablock.json"),
+        'map_file="junk_%d.ccp4"' % nproc,
+        'nproc=%d' % nproc,
+    ])
+    assert result['exitcode'] == 0
+    assert result['stderr'] == ''
+
+  from iotbx import ccp4_map
+  m1 = ccp4_map.map_reader(file_name="junk_1.ccp4")
+  m3 = ccp4_map.map_reader(file_name="junk_3.ccp4")
+  assert m1.data.all() == m3.data.all()
+  assert list(m1.data) == pytest.approx(list(m3.data))
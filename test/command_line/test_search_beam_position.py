@@ -142,3 +142,32 @@ def test_thing_3(tmpdir, dials_regression):
   shift = (scitbx.matrix.col(detector_1[0].get_origin()) -
            scitbx.matrix.col(detector_2[0].get_origin()))
   assert shift.elems == pytest.approx((-0.976, 2.497, 0.0), abs=1e-1)
+
+
+def test_origin_offset_scorer(dials_regression):
+  from dxtbx.serialize import load
+  from libtbx import easy_pickle
+  from rstbx.indexing_api import dps_extended
+  from dials.algorithms.indexing.indexer import indexer_base
+  from dials.command_line.search_beam_position import \
+    origin_offset_scorer, run_dps, dps_phil_scope
+
+  data_dir = os.path.join(dials_regression, "indexing_test_data", "trypsin")
+  datablocks = load.datablock(
+    os.path.join(data_dir, "datablock_P1_X6_1.json"), check_format=False)
+  imageset = datablocks[0].extract_imagesets()[0]
+  spots = easy_pickle.load(
+    os.path.join(data_dir, "strong_P1_X6_1_0-1.pickle"))
+  spots_mm = indexer_base.map_spots_pixel_to_mm_rad(
+    spots, imageset.get_detector(), imageset.get_scan())
+  dps = run_dps((imageset, spots_mm, None, dps_phil_scope.extract()))
+  scorer = origin_offset_scorer(
+    spots_mm, imageset, dps["solutions"], dps["amax"])
+
+  # The shifted reciprocal space vectors match those mapped with a new detector
+  for offset in [(0, 0, 0), (0.5, -0.3, 0), (-1, 1, 0)]:
+    detector = dps_extended.get_new_detector(imageset.get_detector(), offset)
+    indexer_base.map_centroids_to_reciprocal_space(
+      spots_mm, detector, imageset.get_beam(), imageset.get_goniometer())
+    rlp = scorer.reciprocal_space_vectors(offset)
+    assert (rlp - spots_mm["rlp"]).norms().all_lt(1e-8)
@@ -0,0 +1,100 @@
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+
+def _result(name, throughput, peak_rss_mb, scale='nrefl=10000,npanels=1'):
+  return {
+    'name' : name,
+    'scale' : scale,
+    'n_reflections' : 10000,
+    'n_panels' : 1,
+    'n_items' : 10000,
+    'seconds' : 10000 / throughput,
+    'throughput' : throughput,
+    'peak_rss_mb' : peak_rss_mb,
+  }
+
+def test_find_regressions():
+  from dials.util.benchmark import find_regressions
+
+  baseline = [
+    _result('table_io', 1000.0, 100.0),
+    _result('export', 1000.0, 100.0),
+  ]
+  results = [
+    _result('table_io', 950.0, 105.0),
+    _result('export', 500.0, 200.0),
+    _result('export', 10.0, 1000.0, scale='nrefl=1000000,npanels=1'),
+  ]
+  regressions = find_regressions(results, baseline, tolerance=0.1)
+  assert len(regressions) == 2
+  assert regressions[0][:3] == ('export', 'nrefl=10000,npanels=1', 'throughput')
+  assert regressions[1][:3] == ('export', 'nrefl=10000,npanels=1', 'peak_rss_mb')
+  assert regressions[0][3:] == (1000.0, 500.0)
+
+def test_history_and_baseline(tmpdir):
+  from dials.util.benchmark import BenchmarkHistory, load_baseline
+
+  filename = os.path.join(tmpdir.strpath, 'history.json')
+  history = BenchmarkHistory(filename)
+  assert history.runs == []
+  history.append([_result('table_io', 1000.0, 100.0)])
+  history.save()
+  history = BenchmarkHistory(filename)
+  history.append([_result('table_io', 2000.0, 100.0)])
+  history.save()
+
+  with open(filename) as infile:
+    runs = json.load(infile)
+  assert len(runs) == 2
+  assert 'version' in runs[0]
+
+  # The last run in the history is the baseline
+  baseline = load_baseline(filename)
+  assert len(baseline) == 1
+  assert baseline[0]['throughput'] == 2000.0
+
+  # A plain list of results is also accepted
+  filename = os.path.join(tmpdir.strpath, 'baseline.json')
+  with open(filename, 'w') as outfile:
+    json.dump([_result('export', 10.0, 1.0)], outfile)
+  assert load_baseline(filename)[0]['name'] == 'export'
+
+def test_benchmark_small_scale():
+  from dials.util.benchmark import BenchmarkSetup, run_benchmark
+  from dials.util.benchmark import benchmark_match_with_reference
+
+  setup = BenchmarkSetup(n_reflections=1000)
+  result = run_benchmark(
+    'match_with_reference', benchmark_match_with_reference, setup,
+    repeats=1, isolate=False)
+  assert result['n_items'] == 1000
+  assert result['throughput'] > 0
+  assert result['peak_rss_mb'] > 0
+
+def _exit_without_result(setup):
+  os._exit(3)
+
+def test_benchmark_process_exits():
+  import pytest
+  from dials.util.benchmark import BenchmarkSetup, run_benchmark
+
+  setup = BenchmarkSetup(n_reflections=10)
+  with pytest.raises(RuntimeError) as e:
+    run_benchmark('exit', _exit_without_result, setup, repeats=1)
+  assert 'code 3' in str(e.value)
+
+def _random_items(setup):
+  from dials.array_family import flex
+  return 1.0, int(flex.random_size_t(1, 1000000)[0])
+
+def test_benchmark_repeats_reseeded():
+  from dials.util.benchmark import BenchmarkSetup, _BenchmarkTask
+
+  # Every run generates the same data, so the last run of a repeated task
+  # gives the same result as a single run
+  setup = BenchmarkSetup(n_reflections=10)
+  once = _BenchmarkTask('random', _random_items, setup, repeats=1)()
+  repeated = _BenchmarkTask('random', _random_items, setup, repeats=3)()
+  assert once['n_items'] == repeated['n_items']
@@ -0,0 +1,114 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+
+def test_in_process_module_name():
+  from dials.util.idials import InProcessCommand
+  assert InProcessCommand.module_name('dials.import') == \
+    'dials.command_line.dials_import'
+  assert InProcessCommand.module_name('dials.find_spots') == \
+    'dials.command_line.find_spots'
+
+def test_checkpoint_writer(tmpdir):
+  from dials.array_family import flex
+  from dials.util.idials import CheckpointWriter
+  from dials.util.phil import ReflectionTableConverters
+
+  table = flex.reflection_table()
+  table['id'] = flex.int(range(10))
+  filename = tmpdir.join('reflections.pickle').strpath
+
+  writer = CheckpointWriter()
+  flex.reflection_table._pickle_writer = writer
+  try:
+    table.as_pickle(filename)
+  finally:
+    flex.reflection_table._pickle_writer = None
+
+  # Modifying the table after saving must not change the saved copy
+  table['id'][0] = 100
+  writer.fill_cache()
+  cached = ReflectionTableConverters().from_string(filename).data
+  assert list(cached['id']) == list(range(10))
+
+  # Modifying the cached table must not change the table held in memory
+  cached['id'][0] = 100
+  writer.clear_cache()
+  assert filename not in ReflectionTableConverters.cache
+  writer.fill_cache()
+  cached = ReflectionTableConverters().from_string(filename).data
+  assert list(cached['id']) == list(range(10))
+  writer.clear_cache()
+
+  # The file is written in the background
+  writer.wait()
+  assert os.path.exists(filename)
+  assert not writer.is_pending(filename)
+  assert list(flex.reflection_table.from_pickle(filename)['id']) == list(range(10))
+
+  # Written tables can be removed from memory
+  writer.evict(keep=[filename])
+  assert filename in writer.tables
+  writer.evict()
+  assert filename not in writer.tables
+
+def test_checkpoint_writer_in_child_process(tmpdir):
+  from dials.array_family import flex
+  from dials.util.idials import CheckpointWriter
+  if not hasattr(os, 'fork'):
+    pytest.skip('fork not available')
+
+  table = flex.reflection_table()
+  table['id'] = flex.int(range(10))
+  filename = tmpdir.join('child.pickle').strpath
+
+  # A forked child has no writer thread so must write the file itself
+  writer = CheckpointWriter()
+  flex.reflection_table._pickle_writer = writer
+  try:
+    pid = os.fork()
+    if pid == 0:
+      try:
+        table.as_pickle(filename)
+      finally:
+        os._exit(0)
+    os.waitpid(pid, 0)
+  finally:
+    flex.reflection_table._pickle_writer = None
+  assert os.path.exists(filename)
+  assert filename not in writer.tables
+  assert list(flex.reflection_table.from_pickle(filename)['id']) == list(range(10))
+
+def test_in_process_commands(dials_regression, tmpdir):
+  import logging
+  from dials.array_family import flex
+  from dials.util.idials import CheckpointWriter, InProcessCommand
+  from dials.util.phil import ReflectionTableConverters
+  tmpdir.chdir()
+
+  template = os.path.join(
+    dials_regression, "centroid_test_data", "centroid_####.cbf")
+  writer = CheckpointWriter()
+  handlers = list(logging.getLogger('dials').handlers)
+  for command in [
+      ['dials.import', 'template=%s' % template],
+      ['dials.find_spots', 'datablock.json'],
+      ['dials.index', 'datablock.json', 'strong.pickle']]:
+    run = InProcessCommand(writer)
+    run(command)
+    assert run.result == 0
+    assert len(ReflectionTableConverters.cache) == 0
+    assert logging.getLogger('dials').handlers == handlers
+
+  # The tables held in memory are those written to disk, and are not
+  # changed by the commands which read them
+  writer.wait()
+  for filename in ['strong.pickle', 'indexed.pickle']:
+    on_disk = flex.reflection_table.from_pickle(filename)
+    in_memory = writer.tables[filename]
+    assert sorted(on_disk.keys()) == sorted(in_memory.keys())
+    assert len(on_disk) == len(in_memory)
+    assert on_disk['xyzobs.px.value'].as_double().all_eq(
+      in_memory['xyzobs.px.value'].as_double())
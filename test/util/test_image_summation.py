@@ -0,0 +1,60 @@
+from __future__ import absolute_import, division, print_function
+
+class FrameReader(object):
+  def __call__(self, i):
+    from scitbx.array_family import flex
+    data = flex.int(flex.grid(3, 4), i)
+    data[0] = -1
+    return (data,)
+
+def test_sum_frames():
+  from scitbx.array_family import flex
+  from dials.util.image_summation import sum_frames, max_int_value
+  a = flex.int(flex.grid(2, 2), [-1, 1, 2, max_int_value - 1])
+  b = flex.int(flex.grid(2, 2), [-1, -2, 3, 10])
+  total, = sum_frames([(a,), (b,)])
+  assert isinstance(total, flex.int)
+  assert total.all() == (2, 2)
+  # special values of the first frame are kept, negative values ignored and
+  # overflowing sums saturate
+  assert list(total) == [-1, 1, 5, max_int_value]
+
+def test_frame_sum():
+  from dials.util.image_summation import FrameSum, sum_frames
+  reader = FrameReader()
+  summed = FrameSum()
+  for i in range(4):
+    summed.add(reader(i))
+  total, = summed.result()
+  assert total.all() == (3, 4)
+  assert total[0] == -1
+  assert list(total[1:]) == [0+1+2+3] * 11
+  # frames may be generated lazily
+  expected, = sum_frames(reader(i) for i in range(4))
+  assert expected.all_eq(total)
+
+def test_sum_frame_range():
+  from dials.util.image_summation import sum_frame_range
+  for nproc in (1, 2, 3):
+    total, = sum_frame_range(FrameReader(), 2, 9, nproc=nproc)
+    assert total[0] == -1
+    assert list(total[1:]) == [sum(range(2, 9))] * 11
+
+class ChangingMaskReader(object):
+  def __call__(self, i):
+    from scitbx.array_family import flex
+    data = flex.int(flex.grid(3, 4), 10)
+    data[i % 12] = -1
+    return (data,)
+
+def test_sum_frame_range_special_values():
+  from dials.util.image_summation import sum_frame_range
+  expected, = sum_frame_range(ChangingMaskReader(), 0, 6, nproc=1)
+  for nproc in (2, 3):
+    total, = sum_frame_range(ChangingMaskReader(), 0, 6, nproc=nproc)
+    assert total.all_eq(expected)
+
+def test_sum_frame_blocks():
+  from dials.util.image_summation import sum_frame_blocks, return_frame
+  blocks = sum_frame_blocks(FrameReader(), return_frame, 3, 3, nproc=2)
+  assert [b[0][1] for b in blocks] == [0+1+2, 3+4+5, 6+7+8]
@@ -99,3 +99,73 @@ def test_filter_shadowed_reflections(dials_regression):
       experiments, predicted, experiment_goniometer=experiment_goniometer)
     assert shadowed.count(True) == 17
     assert shadowed.count(False) == 674
+
+def test_resolution_mask_ranges():
+  from dxtbx.model import BeamFactory, DetectorFactory
+  from dials.util.ext import ResolutionMaskGenerator
+  from scitbx.array_family import flex
+
+  beam = BeamFactory.simple(1.0)
+  detector = DetectorFactory.simple(
+    'PAD', 100, (25, 25), '+x', '-y', (0.5, 0.5), (100, 100), (0, 1e6))
+  generator = ResolutionMaskGenerator(beam, detector[0])
+  ranges = [(0, 2.5), (3.0, 3.2), (3.1, 3.5), (10, 1e9)]
+
+  # A single pass over all ranges gives the same mask as one pass per range
+  expected = flex.bool(flex.grid(100, 100), True)
+  for d_min, d_max in ranges:
+    generator.apply(expected, d_min, d_max)
+  mask = flex.bool(flex.grid(100, 100), True)
+  generator.apply_ranges(mask, flex.vec2_double(ranges))
+  assert mask.count(False) > 0
+  assert mask.all_eq(expected)
+
+def test_mask_generator_cache():
+  from copy import deepcopy
+  from dxtbx.model import BeamFactory, DetectorFactory
+  from scitbx.array_family import flex
+  from dials.util import masking
+  from dials.util.masking import MaskGenerator, phil_scope
+
+  class ImageSet(object):
+    def __init__(self, detector, beam, image):
+      self.detector, self.beam, self.image = detector, beam, image
+    def get_detector(self):
+      return self.detector
+    def get_beam(self):
+      return self.beam
+    def get_raw_data(self, index):
+      return (self.image,)
+
+  beam = BeamFactory.simple(1.0)
+  detector = DetectorFactory.simple(
+    'PAD', 100, (25, 25), '+x', '-y', (0.5, 0.5), (100, 100), (-1, 1e6))
+  params = phil_scope.fetch(source=phil_scope.parse(
+    'border=2\nd_min=2.5\nresolution_range=3,3.2')).extract()
+  del masking._geometry_mask_cache[:]
+
+  # The cache is shared by generators created for each image (e.g. stills)
+  image1 = flex.int(flex.grid(100, 100), 1)
+  image2 = image1.deep_copy()
+  image2[40, 60] = -2
+  mask1 = MaskGenerator(params).generate(ImageSet(detector, beam, image1))
+  generator = MaskGenerator(params)
+  mask2 = generator.generate(ImageSet(deepcopy(detector), beam, image2))
+
+  # The geometry mask is reused but the trusted range comes from each image
+  assert len(masking._geometry_mask_cache) == 1
+  assert mask1[0][40, 60] and not mask2[0][40, 60]
+  mask2[0][40, 60] = True
+  assert mask1[0].all_eq(mask2[0])
+
+  # A different geometry generates a new mask
+  other = deepcopy(detector)
+  other[0].set_frame((1, 0, 0), (0, -1, 0), (-10, 10, -100))
+  generator.generate(ImageSet(other, beam, image1))
+  assert len(masking._geometry_mask_cache) == 2
+
+  # Different mask parameters generate a new mask
+  params.border = 3
+  mask3 = MaskGenerator(params).generate(ImageSet(detector, beam, image1))
+  assert len(masking._geometry_mask_cache) == 3
+  assert mask3[0].count(False) > mask1[0].count(False)
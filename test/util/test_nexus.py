@@ -125,3 +125,40 @@ def test_run(dials_regression, tmpdir):
     uc2 = c2.get_unit_cell_at_scan_point(i)
     for p1, p2 in zip(uc1.parameters(), uc2.parameters()):
       assert(abs(p1-p2) < EPS)
+
+def test_columns_chunked_and_compressed(tmpdir):
+  import h5py
+  from dials.array_family import flex
+  from dials.util.nexus import nx_reflections
+
+  n = 1000
+  table = flex.reflection_table()
+  table['miller_index'] = flex.miller_index(
+    flex.int_range(n), -flex.int_range(n), flex.int(n, 3))
+  table['id'] = flex.int(n, 0)
+  table['flags'] = flex.size_t_range(n)
+  table['entering'] = flex.bool(n, True)
+  table['intensity.sum.value'] = flex.double_range(n) * 0.5
+  table['xyzobs.px.value'] = flex.vec3_double(
+    flex.double_range(n), flex.double(n, 1), flex.double(n, 2))
+  table['bbox'] = flex.int6(n, (0, 1, 2, 3, 4, 5))
+
+  filename = tmpdir.join('columns.nxs').strpath
+  with h5py.File(filename, 'w') as handle:
+    for key, data in table.cols():
+      nx_reflections.write(handle, key, data)
+    nx_reflections.make_vlen_uint(
+      handle, 'overlaps', [[], [0, 2], [1]], 'Reflection overlap list')
+
+  with h5py.File(filename, 'r') as handle:
+    for name in ['h', 'flags', 'int_sum', 'observed_px_x', 'bounding_box']:
+      assert handle[name].chunks is not None
+      assert handle[name].compression == 'gzip'
+    assert list(handle['overlaps'][1]) == [0, 2]
+    for key in table.keys():
+      data = nx_reflections.read(handle, key)
+      assert data.__class__ == table[key].__class__
+      if key in ('bbox', 'xyzobs.px.value'):
+        assert list(data) == list(table[key])
+      else:
+        assert data.all_eq(table[key])
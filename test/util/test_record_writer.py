@@ -0,0 +1,32 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+def test_write_records(tmpdir):
+  from dials.array_family import flex
+  from dials.util.record_writer import write_records
+
+  h = flex.int([1, -2, 30, 4])
+  I = flex.double([1.5, -22.25, 1234.5678, 0])
+  psi = flex.double([0.1, 179.9, -45, 1e-6])
+  expected = ''.join(
+    '%4d%8.2f %f\n' % values for values in zip(h, I, psi))
+
+  filename = tmpdir.join('records.txt').strpath
+  with open(filename, 'w') as fout:
+    write_records(fout, [('%4d', h), ('%8.2f', I), (' %f', psi)], block_size=3)
+  with open(filename) as fin:
+    assert fin.read() == expected
+
+  with pytest.raises(TypeError):
+    write_records(None, [('%d', flex.size_t(4))])
+  with pytest.raises(RuntimeError):
+    write_records(None, [('%d', I)])
+
+def test_format_column():
+  from dials.array_family import flex
+  from dials.util.record_writer import format_column
+
+  assert list(format_column('%d', flex.int([1, -20]))) == ['1', '-20']
+  assert list(format_column('%.3g', flex.double([0.5, 12345]))) == \
+    ['0.5', '1.23e+04']
@@ -0,0 +1,91 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+
+def make_input(tmpdir, content):
+  from dials.util.phil import FilenameDataWrapper
+  from libtbx import group_args
+  filename = tmpdir.join('input.json').strpath
+  with open(filename, 'w') as outfile:
+    outfile.write(content)
+  return group_args(
+    experiments=[FilenameDataWrapper(filename, None)],
+    reflections=[])
+
+def diff_phil(text):
+  from libtbx.phil import parse
+  master = parse('''
+    input.experiments = None
+      .type = str
+    output.experiments = None
+      .type = str
+    d_min = None
+      .type = float
+  ''')
+  return master.fetch_diff(source=master.fetch(parse(text)))
+
+def test_result_cache(tmpdir):
+  from dials.util.result_cache import ResultCache
+
+  cache = ResultCache(tmpdir.join('cache').strpath, max_size=1)
+  output = tmpdir.join('output.json').strpath
+  outputs = {'output.experiments' : output}
+
+  # The key depends on the input content and parameters but not on filenames
+  key = cache.key('dials.test', make_input(tmpdir, 'a'),
+                  diff_phil('d_min=2\noutput.experiments=a.json'), outputs)
+  assert key == cache.key('dials.test', make_input(tmpdir, 'a'),
+                          diff_phil('d_min=2\noutput.experiments=b.json'), outputs)
+  assert key != cache.key('dials.test', make_input(tmpdir, 'b'),
+                          diff_phil('d_min=2'), outputs)
+  assert key != cache.key('dials.test', make_input(tmpdir, 'a'),
+                          diff_phil('d_min=3'), outputs)
+
+  # Miss, store and hit
+  assert not cache.fetch(key, outputs)
+  with open(output, 'w') as outfile:
+    outfile.write('result')
+  cache.store(key, outputs)
+  os.remove(output)
+  assert cache.fetch(key, outputs)
+  with open(output) as infile:
+    assert infile.read() == 'result'
+
+  # The least recently used result is evicted when the cache is full
+  os.utime(os.path.join(cache.directory, key, 'complete'), (0, 0))
+  with open(output, 'w') as outfile:
+    outfile.write('x' * 1024 * 1024)
+  cache.store('0' * 40, outputs)
+  assert not os.path.exists(os.path.join(cache.directory, key))
+  assert cache.statistics() == {'hits' : 1, 'misses' : 1, 'evictions' : 1}
+
+def test_result_cache_optional_outputs(tmpdir):
+  from dials.util.result_cache import ResultCache
+
+  cache = ResultCache(tmpdir.join('cache').strpath)
+  output = tmpdir.join('output.json').strpath
+  optional = tmpdir.join('optional.json').strpath
+  key = '1' * 40
+
+  # A first run without the optional output
+  with open(output, 'w') as outfile:
+    outfile.write('result')
+  cache.store(key, {'output.experiments' : output, 'output.optional' : None})
+
+  # A run asking for the optional output misses without copying anything
+  outputs = {'output.experiments' : output, 'output.optional' : optional}
+  os.remove(output)
+  assert not cache.fetch(key, outputs)
+  assert not os.path.exists(output)
+
+  # Its outputs are added to the existing entry so later runs hit
+  with open(output, 'w') as outfile:
+    outfile.write('result')
+  with open(optional, 'w') as outfile:
+    outfile.write('optional')
+  cache.store(key, outputs)
+  os.remove(output)
+  os.remove(optional)
+  assert cache.fetch(key, outputs)
+  with open(optional) as infile:
+    assert infile.read() == 'optional'
@@ -293,18 +293,41 @@ def __init__(self, i_obs, batches, params):
       i_obs = i_obs.customized_copy(space_group_info=self._params.space_group,
                                     info=i_obs.info())
 
-    import iotbx.merging_statistics
-    self._merging_statistics = iotbx.merging_statistics.dataset_statistics(
-      i_obs=i_obs,
-      n_bins=self._params.nbins,
-      cc_one_half_significance_level=self._params.cc_half_significance_level,
-      cc_one_half_method=self._params.cc_half_method,
-      binning_method=self._params.binning_method,
-      anomalous=params.anomalous,
-      use_internal_variance=False,
-      eliminate_sys_absent=False,
-      assert_is_not_unique_set_under_symmetry=False,
-    )
+    self._i_obs = i_obs
+    self._merging_statistics = None
+    self._bin_values_cache = {}
+
+  @property
+  def merging_statistics(self):
+    '''The binned merging statistics, computed once on first use and shared
+    by all the resolution criteria.'''
+    if self._merging_statistics is None:
+      import iotbx.merging_statistics
+      self._merging_statistics = iotbx.merging_statistics.dataset_statistics(
+        i_obs=self._i_obs,
+        n_bins=self._params.nbins,
+        cc_one_half_significance_level=self._params.cc_half_significance_level,
+        cc_one_half_method=self._params.cc_half_method,
+        binning_method=self._params.binning_method,
+        anomalous=self._params.anomalous,
+        use_internal_variance=False,
+        eliminate_sys_absent=False,
+        assert_is_not_unique_set_under_symmetry=False,
+      )
+    return self._merging_statistics
+
+  def _bin_values(self, name):
+    '''Get the list of values of a binned statistic, from low to high
+    resolution. The values are extracted once and cached; 'd_star_sq' gives
+    1/d_min^2 for each bin.'''
+    if name not in self._bin_values_cache:
+      bins = self.merging_statistics.bins
+      if name == 'd_star_sq':
+        values = [1/b.d_min**2 for b in bins]
+      else:
+        values = [getattr(b, name) for b in bins]
+      self._bin_values_cache[name] = values
+    return self._bin_values_cache[name]
 
   @classmethod
   def from_unmerged_mtz(cls, scaled_unmerged, params):
@@ -382,9 +405,9 @@ def resolution_rmerge(self, limit=None, log=None):
       limit = self._params.rmerge
 
     rmerge_s = flex.double(
-      [b.r_merge for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('r_merge')).reversed()
     s_s = flex.double(
-      [1/b.d_min**2 for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('d_star_sq')).reversed()
 
     sel = rmerge_s > 0
     rmerge_s = rmerge_s.select(sel)
@@ -433,9 +456,9 @@ def resolution_i_mean_over_sigma_mean(self, limit=None, log=None):
       limit = self._params.i_mean_over_sigma_mean
 
     isigma_s = flex.double(
-      [b.i_mean_over_sigi_mean for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('i_mean_over_sigi_mean')).reversed()
     s_s = flex.double(
-      [1/b.d_min**2 for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('d_star_sq')).reversed()
 
     sel = isigma_s > 0
     isigma_s = isigma_s.select(sel)
@@ -480,9 +503,9 @@ def resolution_unmerged_isigma(self, limit=None, log=None):
       limit = self._params.isigma
 
     isigma_s = flex.double(
-      [b.unmerged_i_over_sigma_mean for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('unmerged_i_over_sigma_mean')).reversed()
     s_s = flex.double(
-      [1/b.d_min**2 for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('d_star_sq')).reversed()
 
     sel = isigma_s > 0
     isigma_s = isigma_s.select(sel)
@@ -527,9 +550,9 @@ def resolution_merged_isigma(self, limit=None, log=None):
       limit = self._params.misigma
 
     misigma_s = flex.double(
-      [b.i_over_sigma_mean for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('i_over_sigma_mean')).reversed()
     s_s = flex.double(
-      [1/b.d_min**2 for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('d_star_sq')).reversed()
 
     sel = misigma_s > 0
     misigma_s = misigma_s.select(sel)
@@ -577,9 +600,9 @@ def resolution_completeness(self, limit=None, log=None):
       limit = self._params.completeness
 
     comp_s = flex.double(
-      [b.completeness for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('completeness')).reversed()
     s_s = flex.double(
-      [1/b.d_min**2 for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('d_star_sq')).reversed()
 
     if flex.min(comp_s) > limit:
       r_comp = 1.0 / math.sqrt(flex.max(s_s))
@@ -624,25 +647,25 @@ def resolution_cc_half(self, limit=None, log=None):
 
     if self._params.cc_half_method == 'sigma_tau':
       cc_s = flex.double(
-        [b.cc_one_half_sigma_tau for b in self._merging_statistics.bins]).reversed()
+        self._bin_values('cc_one_half_sigma_tau')).reversed()
     else:
       cc_s = flex.double(
-        [b.cc_one_half for b in self._merging_statistics.bins]).reversed()
+        self._bin_values('cc_one_half')).reversed()
     s_s = flex.double(
-      [1/b.d_min**2 for b in self._merging_statistics.bins]).reversed()
+      self._bin_values('d_star_sq')).reversed()
 
     p = self._params.cc_half_significance_level
     if p is not None:
       if self._params.cc_half_method == 'sigma_tau':
         significance = flex.bool(
-          [b.cc_one_half_sigma_tau_significance for b in self._merging_statistics.bins]).reversed()
+          self._bin_values('cc_one_half_sigma_tau_significance')).reversed()
         cc_half_critical_value = flex.double(
-          [b.cc_one_half_sigma_tau_critical_value for b in self._merging_statistics.bins]).reversed()
+          self._bin_values('cc_one_half_sigma_tau_critical_value')).reversed()
       else:
         significance = flex.bool(
-          [b.cc_one_half_significance for b in self._merging_statistics.bins]).reversed()
+          self._bin_values('cc_one_half_significance')).reversed()
         cc_half_critical_value = flex.double(
-          [b.cc_one_half_critical_value for b in self._merging_statistics.bins]).reversed()
+          self._bin_values('cc_one_half_critical_value')).reversed()
       # index of last insignificant bin
       i = flex.last_index(significance, False)
       if i is None or i == len(significance) - 1:
@@ -0,0 +1,575 @@
+'''
+Reproducible performance benchmarks of the DIALS hot paths.
+
+Data are synthesised from simple models, predicted with the standard
+reflection predictor and resampled to the requested scale, so that each run of
+a benchmark with the same setup sees exactly the same input. Each benchmark
+returns the wall clock time spent in the timed section only; the data
+generation is not timed.
+
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb():
+  '''
+  Return the peak resident set size of this process in MB.
+
+  '''
+  import resource
+  import sys
+  maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # getrusage returns kb on linux, bytes on mac
+  if sys.platform == 'darwin':
+    return maxrss / (1024 * 1024)
+  return maxrss / 1024
+
+
+class BenchmarkSetup(object):
+  '''
+  The scale and random seed of a single benchmark run.
+
+  '''
+
+  def __init__(self,
+               n_reflections=10000,
+               n_panels=1,
+               n_images=10,
+               max_shoeboxes=10000,
+               seed=0):
+    self.n_reflections = n_reflections
+    self.n_panels = n_panels
+    self.n_images = n_images
+    self.max_shoeboxes = max_shoeboxes
+    self.seed = seed
+
+  def key(self):
+    '''
+    A string identifying the scale of the benchmark.
+
+    '''
+    return 'nrefl=%d,npanels=%d' % (self.n_reflections, self.n_panels)
+
+  def seed_random(self):
+    '''
+    Seed the random number generators used when synthesising the data.
+
+    '''
+    import random
+    from dials.array_family import flex
+    random.seed(self.seed)
+    flex.set_random_seed(self.seed)
+
+
+def synthetic_detector(n_panels=1,
+                       distance=200.0,
+                       pixel_size=0.172,
+                       n_pixels=1450):
+  '''
+  Create a flat detector of n_pixels x n_pixels split into a grid of n_panels.
+
+  The overall area is independent of the number of panels so that the number
+  of predicted reflections is (roughly) the same for every panel count.
+
+  '''
+  from dxtbx.model import Detector
+  from math import ceil, sqrt
+  ncols = int(ceil(sqrt(n_panels)))
+  nrows = int(ceil(n_panels / ncols))
+  size_fast = n_pixels // ncols
+  size_slow = n_pixels // nrows
+  x0 = -0.5 * n_pixels * pixel_size
+  y0 = 0.5 * n_pixels * pixel_size
+  detector = Detector()
+  for i in range(n_panels):
+    row, col = divmod(i, ncols)
+    panel = detector.add_panel()
+    panel.set_name('panel%d' % i)
+    panel.set_type('SENSOR_PAD')
+    panel.set_frame(
+      (1, 0, 0),
+      (0, -1, 0),
+      (x0 + col * size_fast * pixel_size,
+       y0 - row * size_slow * pixel_size,
+       -distance))
+    panel.set_pixel_size((pixel_size, pixel_size))
+    panel.set_image_size((size_fast, size_slow))
+    panel.set_trusted_range((-1, 1000000))
+  return detector
+
+
+def synthetic_experiment(n_panels=1, n_images=900, oscillation=0.2):
+  '''
+  Create a rotation experiment with a triclinic crystal and a synthetic
+  detector.
+
+  '''
+  from dxtbx.model import BeamFactory, Crystal, GoniometerFactory, ScanFactory
+  from dxtbx.model.experiment_list import Experiment
+  beam = BeamFactory.make_beam(unit_s0=(0, 0, -1), wavelength=0.9795)
+  goniometer = GoniometerFactory.known_axis((1, 0, 0))
+  scan = ScanFactory.make_scan(
+    image_range=(1, n_images),
+    exposure_times=0.1,
+    oscillation=(0, oscillation),
+    epochs=list(range(n_images)),
+    deg=True)
+  crystal = Crystal(
+    (57.8, 0.0, 0.0),
+    (0.0, 57.8, 0.0),
+    (0.0, 0.0, 150.0),
+    space_group_symbol='P 1')
+  return Experiment(
+    beam=beam,
+    detector=synthetic_detector(n_panels),
+    goniometer=goniometer,
+    scan=scan,
+    crystal=crystal,
+    imageset=None)
+
+
+def synthetic_reflections(experiment, n_reflections, d_min=2.0):
+  '''
+  Predict reflections for the experiment and resample them (with replacement)
+  to the requested number of rows. Observed centroids are the predictions with
+  Gaussian noise of about half a pixel and a tenth of an image.
+
+  '''
+  from dials.array_family import flex
+  predicted = flex.reflection_table.from_predictions(experiment, dmin=d_min)
+  assert len(predicted) > 0, 'No reflections predicted'
+  reflections = predicted.select(
+    flex.random_size_t(n_reflections, len(predicted)))
+  reflections['id'] = flex.int(len(reflections), 0)
+
+  # Perturb the predictions to get observed centroids
+  n = len(reflections)
+  x, y, z = reflections['xyzcal.px'].parts()
+  px = experiment.detector[0].get_pixel_size()
+  osc = experiment.scan.get_oscillation(deg=False)[1]
+  dx = flex.normal_distribution(0, 0.5).random_double(n)
+  dy = flex.normal_distribution(0, 0.5).random_double(n)
+  dz = flex.normal_distribution(0, 0.1).random_double(n)
+  reflections['xyzobs.px.value'] = flex.vec3_double(x + dx, y + dy, z + dz)
+  reflections['xyzobs.px.variance'] = flex.vec3_double(n, (0.25, 0.25, 0.01))
+  xmm, ymm, phi = reflections['xyzcal.mm'].parts()
+  reflections['xyzobs.mm.value'] = flex.vec3_double(
+    xmm + dx * px[0], ymm + dy * px[1], phi + dz * osc)
+  reflections['xyzobs.mm.variance'] = flex.vec3_double(
+    n, ((px[0] / 2) ** 2, (px[1] / 2) ** 2, (osc / 2) ** 2))
+  reflections['intensity.sum.value'] = flex.random_double(n) * 1000 + 10
+  reflections['intensity.sum.variance'] = reflections['intensity.sum.value']
+  reflections['partiality'] = flex.double(n, 1.0)
+  reflections.set_flags(flex.bool(n, True), reflections.flags.strong)
+  reflections.set_flags(flex.bool(n, True), reflections.flags.indexed)
+  reflections.set_flags(flex.bool(n, True), reflections.flags.integrated_sum)
+  return reflections
+
+
+def synthetic_image(experiment, reflections, frame, background=10.0,
+                    intensity=500.0):
+  '''
+  Render the reflections on a given frame as single pixel spots on top of a
+  random background, returning a tuple of panel images.
+
+  '''
+  from dials.array_family import flex
+  images = []
+  x, y, z = reflections['xyzcal.px'].parts()
+  panel = reflections['panel']
+  on_frame = (z >= frame) & (z < frame + 1)
+  for i, p in enumerate(experiment.detector):
+    width, height = p.get_image_size()
+    image = flex.random_double(width * height) * 2 * background
+    image.reshape(flex.grid(height, width))
+    sel = on_frame & (panel == i)
+    for xx, yy in zip(x.select(sel), y.select(sel)):
+      xi, yi = int(xx), int(yy)
+      if 0 <= xi < width and 0 <= yi < height:
+        image[yi, xi] += intensity
+    images.append(image)
+  return tuple(images)
+
+
+def benchmark_spot_finding(setup):
+  '''
+  Threshold and label setup.n_images synthetic images.
+
+  '''
+  from dials.algorithms.spot_finding.threshold import DispersionThresholdStrategy
+  from dials.array_family import flex
+  from dials.model.data import PixelList, PixelListLabeller
+  experiment = synthetic_experiment(setup.n_panels)
+  reflections = synthetic_reflections(experiment, setup.n_reflections)
+  images = [synthetic_image(experiment, reflections, frame)
+            for frame in range(setup.n_images)]
+  masks = tuple(flex.bool(im.accessor(), True) for im in images[0])
+  threshold = DispersionThresholdStrategy(gain=1)
+  st = time.time()
+  labellers = [PixelListLabeller() for p in experiment.detector]
+  for frame, image in enumerate(images):
+    for im, mk, labeller in zip(image, masks, labellers):
+      labeller.add(PixelList(frame, im, threshold(im, mk)))
+  shoeboxes = flex.shoebox()
+  for i, labeller in enumerate(labellers):
+    if labeller.num_pixels() > 0:
+      creator = flex.PixelListShoeboxCreator(
+        labeller, i, 0, False, 1, 1000, False)
+      shoeboxes.extend(creator.result())
+  elapsed = time.time() - st
+  return elapsed, sum(len(im) for image in images for im in image)
+
+
+def benchmark_match_with_reference(setup):
+  '''
+  Match observations against the predictions.
+
+  '''
+  experiment = synthetic_experiment(setup.n_panels)
+  observed = synthetic_reflections(experiment, setup.n_reflections)
+  predicted = observed.copy()
+  st = time.time()
+  predicted.match_with_reference(observed)
+  return time.time() - st, len(observed)
+
+
+def benchmark_outlier_detection(setup):
+  '''
+  Run Tukey centroid outlier rejection on the residuals.
+
+  '''
+  from dials.algorithms.refinement.outlier_detection.tukey import Tukey
+  experiment = synthetic_experiment(setup.n_panels)
+  reflections = synthetic_reflections(experiment, setup.n_reflections)
+  xo, yo, zo = reflections['xyzobs.mm.value'].parts()
+  xc, yc, zc = reflections['xyzcal.mm'].parts()
+  reflections['x_resid'] = xc - xo
+  reflections['y_resid'] = yc - yo
+  reflections['phi_resid'] = zc - zo
+  reflections.set_flags(
+    reflections.get_flags(reflections.flags.indexed),
+    reflections.flags.used_in_refinement)
+  outlier = Tukey()
+  st = time.time()
+  outlier(reflections)
+  return time.time() - st, len(reflections)
+
+
+def benchmark_refinement_step(setup):
+  '''
+  Set up a refiner and run a single step of the refinement engine.
+
+  '''
+  from dials.algorithms.refinement.refiner import RefinerFactory, phil_scope
+  from dxtbx.model.experiment_list import ExperimentList
+  experiment = synthetic_experiment(setup.n_panels)
+  experiments = ExperimentList([experiment])
+  reflections = synthetic_reflections(experiment, setup.n_reflections)
+  params = phil_scope.extract()
+  params.refinement.refinery.max_iterations = 1
+  params.refinement.reflections.outlier.algorithm = 'null'
+  params.refinement.reflections.reflections_per_degree = None
+  params.refinement.verbosity = 0
+  st = time.time()
+  refiner = RefinerFactory.from_parameters_data_experiments(
+    params, reflections, experiments)
+  refiner.run()
+  return time.time() - st, len(reflections)
+
+
+def benchmark_prediction_reuse(setup):
+  '''
+  Predict the reflections of two experiments repeatedly while only one of the
+  crystals moves, as for refinement of a single experiment among several,
+  with the reuse of unchanged predictions enabled. Comparing the time with
+  reuse_predictions=False shows the gain.
+
+  '''
+  from dials.algorithms.refinement.prediction import ExperimentsPredictor
+  from dials.array_family import flex
+  from dxtbx.model.experiment_list import ExperimentList
+  from copy import deepcopy
+  from scitbx import matrix
+  experiment1 = synthetic_experiment(setup.n_panels)
+  experiment2 = deepcopy(experiment1)
+  experiments = ExperimentList([experiment1, experiment2])
+  reflections = flex.reflection_table()
+  for i, experiment in enumerate(experiments):
+    refs = synthetic_reflections(experiment, setup.n_reflections // 2)
+    refs['id'] = flex.int(len(refs), i)
+    reflections.extend(refs)
+  predictor = ExperimentsPredictor(experiments, reuse_predictions=True)
+  rotation = matrix.col((0, 0, 1)).axis_and_angle_as_r3_rotation_matrix(
+    0.01, deg=True)
+  n_steps = 10
+  st = time.time()
+  for i in range(n_steps):
+    U = matrix.sqr(experiment2.crystal.get_U())
+    experiment2.crystal.set_U(rotation * U)
+    predictor(reflections)
+  return time.time() - st, n_steps * len(reflections)
+
+
+def benchmark_integration_block(setup):
+  '''
+  Compute the background, centroid and summed intensity for a block of
+  simulated shoeboxes. The number of shoeboxes is capped at
+  setup.max_shoeboxes as the simulation itself is slow.
+
+  '''
+  from dials.algorithms.simulation.reciprocal_space import Simulator
+  from dxtbx.model.experiment_list import ExperimentList
+  from math import pi
+  experiment = synthetic_experiment(1)
+  simulate = Simulator(experiment, 0.058 * pi / 180, 0.157 * pi / 180, 3)
+  nrefl = min(setup.n_reflections, setup.max_shoeboxes)
+  reflections = simulate.with_random_intensity(nrefl, 1000, 10, 0, 0, 0)
+  experiments = ExperimentList([experiment])
+  st = time.time()
+  reflections.compute_background(experiments)
+  reflections.compute_centroid(experiments)
+  reflections.compute_summed_intensity()
+  return time.time() - st, len(reflections)
+
+
+def benchmark_export(setup):
+  '''
+  Export the reflections to XDS_ASCII.
+
+  '''
+  from dials.util.export_xds_ascii import export_xds_ascii
+  from dxtbx.model.experiment_list import ExperimentList
+  import tempfile
+  import shutil
+  experiment = synthetic_experiment(1)
+  reflections = synthetic_reflections(experiment, setup.n_reflections)
+  tmpdir = tempfile.mkdtemp()
+  try:
+    st = time.time()
+    export_xds_ascii(reflections, ExperimentList([experiment]),
+                     os.path.join(tmpdir, 'DIALS.HKL'), summation=True)
+    elapsed = time.time() - st
+  finally:
+    shutil.rmtree(tmpdir)
+  return elapsed, len(reflections)
+
+
+def benchmark_table_io(setup):
+  '''
+  Write and read back the reflection table as a pickle.
+
+  '''
+  from dials.array_family import flex
+  import tempfile
+  import shutil
+  experiment = synthetic_experiment(setup.n_panels)
+  reflections = synthetic_reflections(experiment, setup.n_reflections)
+  tmpdir = tempfile.mkdtemp()
+  try:
+    filename = os.path.join(tmpdir, 'reflections.pickle')
+    st = time.time()
+    reflections.as_pickle(filename)
+    flex.reflection_table.from_pickle(filename)
+    elapsed = time.time() - st
+  finally:
+    shutil.rmtree(tmpdir)
+  return elapsed, len(reflections)
+
+
+# The available benchmarks in the order in which they are run
+benchmarks = [
+  ('spot_finding', benchmark_spot_finding),
+  ('match_with_reference', benchmark_match_with_reference),
+  ('outlier_detection', benchmark_outlier_detection),
+  ('refinement_step', benchmark_refinement_step),
+  ('prediction_reuse', benchmark_prediction_reuse),
+  ('integration_block', benchmark_integration_block),
+  ('export', benchmark_export),
+  ('table_io', benchmark_table_io),
+]
+
+
+class _BenchmarkTask(object):
+  '''
+  Run a benchmark and return the timing, throughput and peak memory. This is a
+  class so that it can be pickled and run in a separate process.
+
+  '''
+
+  def __init__(self, name, function, setup, repeats):
+    self.name = name
+    self.function = function
+    self.setup = setup
+    self.repeats = repeats
+
+  def __call__(self):
+    times = []
+    n_items = 0
+    for i in range(self.repeats):
+      # Reseed for each run so that every run generates the same data
+      self.setup.seed_random()
+      elapsed, n_items = self.function(self.setup)
+      times.append(elapsed)
+    best = min(times)
+    return {
+      'name' : self.name,
+      'scale' : self.setup.key(),
+      'n_reflections' : self.setup.n_reflections,
+      'n_panels' : self.setup.n_panels,
+      'n_items' : n_items,
+      'seconds' : best,
+      'throughput' : n_items / best if best > 0 else float('inf'),
+      'peak_rss_mb' : peak_rss_mb(),
+    }
+
+
+def _run_isolated(task, queue):
+  try:
+    queue.put((True, task()))
+  except Exception as e:
+    queue.put((False, '%s: %s' % (type(e).__name__, str(e))))
+
+
+def run_benchmark(name, function, setup, repeats=3, isolate=True):
+  '''
+  Run a single benchmark.
+
+  If isolate is True, the benchmark is run in a fresh process so that the
+  peak memory reported is that of the benchmark alone.
+
+  :param name: The name of the benchmark
+  :param function: The benchmark function
+  :param setup: The benchmark setup
+  :param repeats: The number of times to repeat (the best time is kept)
+  :param isolate: Run the benchmark in a separate process
+  :return: A dictionary with the results
+
+  '''
+  task = _BenchmarkTask(name, function, setup, repeats)
+  if not isolate:
+    return task()
+  import multiprocessing
+  queue = multiprocessing.Queue()
+  process = multiprocessing.Process(target=_run_isolated, args=(task, queue))
+  process.start()
+  try:
+    success, result = _wait_for_result(process, queue)
+  finally:
+    process.join()
+  if not success:
+    raise RuntimeError('Benchmark %s failed: %s' % (name, result))
+  return result
+
+
+def _wait_for_result(process, queue, poll_interval=1.0):
+  '''
+  Wait for the result of an isolated benchmark. The queue is polled so that a
+  child process which dies without a result (e.g. killed for using too much
+  memory) is reported as a failure rather than blocking forever.
+
+  '''
+  from six.moves.queue import Empty
+  while True:
+    try:
+      return queue.get(timeout=poll_interval)
+    except Empty:
+      pass
+    if not process.is_alive():
+      # The result may have been put just before the process exited
+      try:
+        return queue.get(timeout=poll_interval)
+      except Empty:
+        return (False, 'process exited with code %s without a result' %
+                process.exitcode)
+
+
+class BenchmarkHistory(object):
+  '''
+  A JSON history of benchmark runs.
+
+  Each run records the DIALS version, host, time and the list of results. The
+  file is rewritten in full on each save.
+
+  '''
+
+  def __init__(self, filename):
+    self.filename = filename
+    if filename is not None and os.path.exists(filename):
+      with open(filename) as infile:
+        self.runs = json.load(infile)
+    else:
+      self.runs = []
+
+  def append(self, results):
+    '''
+    Add a run to the history.
+
+    '''
+    from dials.util.version import dials_version
+    import platform
+    self.runs.append({
+      'version' : dials_version(),
+      'host' : platform.node(),
+      'time' : time.strftime('%Y-%m-%d %H:%M:%S'),
+      'results' : results,
+    })
+
+  def save(self):
+    '''
+    Write the history to file.
+
+    '''
+    with open(self.filename, 'w') as outfile:
+      json.dump(self.runs, outfile, indent=2, sort_keys=True)
+
+
+def load_baseline(filename):
+  '''
+  Load a baseline from a JSON file. The file can be either a history (in which
+  case the last run is used) or a plain list of results.
+
+  '''
+  with open(filename) as infile:
+    data = json.load(infile)
+  if len(data) > 0 and 'results' in data[-1]:
+    data = data[-1]['results']
+  return data
+
+
+def find_regressions(results, baseline, tolerance=0.1):
+  '''
+  Compare results against a baseline.
+
+  A regression is flagged when the throughput of a benchmark drops, or its
+  peak memory rises, by more than the given fractional tolerance. Benchmarks
+  not present in the baseline are ignored.
+
+  :param results: The list of results
+  :param baseline: The list of baseline results
+  :param tolerance: The fractional tolerance
+  :return: A list of (name, scale, quantity, baseline, value) tuples
+
+  '''
+  lookup = dict(((r['name'], r['scale']), r) for r in baseline)
+  regressions = []
+  for result in results:
+    reference = lookup.get((result['name'], result['scale']))
+    if reference is None:
+      continue
+    if result['throughput'] < reference['throughput'] * (1.0 - tolerance):
+      regressions.append((
+        result['name'], result['scale'], 'throughput',
+        reference['throughput'], result['throughput']))
+    if result['peak_rss_mb'] > reference['peak_rss_mb'] * (1.0 + tolerance):
+      regressions.append((
+        result['name'], result['scale'], 'peak_rss_mb',
+        reference['peak_rss_mb'], result['peak_rss_mb']))
+  return regressions
@@ -6,6 +6,7 @@
 #include <boost/python/def.hpp>
 #include <dials/util/scale_down_array.h>
 #include <dials/util/masking.h>
+#include <dials/util/record_formatter.h>
 
 namespace dials { namespace util { namespace boost_python {
 
@@ -46,6 +47,23 @@ namespace dials { namespace util { namespace boost_python {
     class_<ResolutionMaskGenerator>("ResolutionMaskGenerator", no_init)
       .def(init<const BeamBase&,const Panel&>())
       .def("apply", &ResolutionMaskGenerator::apply)
+      .def("apply_ranges", &ResolutionMaskGenerator::apply_ranges)
       ;
+
+    class_<RecordFormatter>("RecordFormatter", no_init)
+      .def(init<std::size_t>((arg("nrows"))))
+      .def("add_int", &RecordFormatter::add_int, (
+            arg("data"), arg("format")))
+      .def("add_double", &RecordFormatter::add_double, (
+            arg("data"), arg("format")))
+      .def("nrows", &RecordFormatter::nrows)
+      .def("format", &RecordFormatter::format, (
+            arg("begin"), arg("end")))
+      ;
+
+    def("format_column", &format_int_column, (
+          arg("data"), arg("format")));
+    def("format_column", &format_double_column, (
+          arg("data"), arg("format")));
   }
 }}}
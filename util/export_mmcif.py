@@ -3,6 +3,7 @@
 import datetime
 import logging
 import math
+from collections import OrderedDict
 
 import dials.util.version
 import iotbx.cif.model
@@ -147,39 +148,47 @@ def write(self, experiments, reflections):
 
     # Write reflection data
     # FIXME there are three intensity fields. I've put summation in I and Isum
-    cif_loop = iotbx.cif.model.loop(
-      header=("_pdbx_diffrn_unmerged_refln.reflection_id",
-              "_pdbx_diffrn_unmerged_refln.scan_id",
-              "_pdbx_diffrn_unmerged_refln.image_id_begin",
-              "_pdbx_diffrn_unmerged_refln.image_id_end",
-              "_pdbx_diffrn_unmerged_refln.index_h",
-              "_pdbx_diffrn_unmerged_refln.index_k",
-              "_pdbx_diffrn_unmerged_refln.index_l",
-              "_pdbx_diffrn_unmerged_refln.intensity_meas",
-              "_pdbx_diffrn_unmerged_refln.intensity_sigma",
-              "_pdbx_diffrn_unmerged_refln.intensity_sum",
-              "_pdbx_diffrn_unmerged_refln.intensity_sum_sigma",
-              "_pdbx_diffrn_unmerged_refln.intensity_profile",
-              "_pdbx_diffrn_unmerged_refln.intensity_profile_sigma",
-              "_pdbx_diffrn_unmerged_refln.scan_angle_reflection",
-              "_pdbx_diffrn_unmerged_refln.partiality",
-              "_pdbx_diffrn_unmerged_refln.scale_value"))
-    for i, r in enumerate(reflections):
-      refl_id       = i + 1
-      scan_id       = r['id'] + 1
-      _,_,_,_,z0,z1 = r['bbox']
-      h, k, l       = r['miller_index']
-      I             = r['intensity.sum.value']
-      sigI          = r['intensity.sum.variance']
-      Isum          = r['intensity.sum.value']
-      sigIsum       = r['intensity.sum.variance']
-      Iprf          = r['intensity.prf.value']
-      sigIprf       = r['intensity.prf.variance']
-      phi           = r['xyzcal.mm'][2] * RAD2DEG
-      partiality    = r['partiality']
-      scale         = 1.0
-      cif_loop.add_row((refl_id, scan_id, z0, z1, h, k, l, I, sigI, Isum,
-          sigIsum, Iprf, sigIprf, phi, partiality, scale))
+    from dials.array_family import flex
+    from dials.util.record_writer import format_column
+    z0, z1 = reflections['bbox'].parts()[4:6]
+    h, k, l = reflections['miller_index'].as_vec3_double().parts()
+    phi = reflections['xyzcal.mm'].parts()[2] * RAD2DEG
+    float_fmt = '%.8g'
+    columns = [
+      ("_pdbx_diffrn_unmerged_refln.reflection_id",
+        format_column('%d', flex.int_range(1, len(reflections)+1))),
+      ("_pdbx_diffrn_unmerged_refln.scan_id",
+        format_column('%d', reflections['id'] + 1)),
+      ("_pdbx_diffrn_unmerged_refln.image_id_begin",
+        format_column('%d', z0)),
+      ("_pdbx_diffrn_unmerged_refln.image_id_end",
+        format_column('%d', z1)),
+      ("_pdbx_diffrn_unmerged_refln.index_h",
+        format_column('%d', h.iround())),
+      ("_pdbx_diffrn_unmerged_refln.index_k",
+        format_column('%d', k.iround())),
+      ("_pdbx_diffrn_unmerged_refln.index_l",
+        format_column('%d', l.iround())),
+      ("_pdbx_diffrn_unmerged_refln.intensity_meas",
+        format_column(float_fmt, reflections['intensity.sum.value'])),
+      ("_pdbx_diffrn_unmerged_refln.intensity_sigma",
+        format_column(float_fmt, reflections['intensity.sum.variance'])),
+      ("_pdbx_diffrn_unmerged_refln.intensity_sum",
+        format_column(float_fmt, reflections['intensity.sum.value'])),
+      ("_pdbx_diffrn_unmerged_refln.intensity_sum_sigma",
+        format_column(float_fmt, reflections['intensity.sum.variance'])),
+      ("_pdbx_diffrn_unmerged_refln.intensity_profile",
+        format_column(float_fmt, reflections['intensity.prf.value'])),
+      ("_pdbx_diffrn_unmerged_refln.intensity_profile_sigma",
+        format_column(float_fmt, reflections['intensity.prf.variance'])),
+      ("_pdbx_diffrn_unmerged_refln.scan_angle_reflection",
+        format_column(float_fmt, phi)),
+      ("_pdbx_diffrn_unmerged_refln.partiality",
+        format_column(float_fmt, reflections['partiality'])),
+      ("_pdbx_diffrn_unmerged_refln.scale_value",
+        format_column(float_fmt, flex.double(len(reflections), 1.0))),
+    ]
+    cif_loop = iotbx.cif.model.loop(data=OrderedDict(columns))
     cif_block.add_loop(cif_loop)
 
     # Add the block
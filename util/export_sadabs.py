@@ -188,59 +188,77 @@ def export_sadabs(integrated_data, experiment_list, hklout, run=0,
   else:
     static = False
 
-  fout = open(hklout, 'w')
-
-  for j in range(nref):
+  from dials.util.record_writer import write_records
 
-    h, k, l = miller_index[j]
+  if predict:
+    x_mm, y_mm, z_rad = integrated_data['xyzcal.mm'].parts()
+  else:
+    x_mm, y_mm, z_rad = integrated_data['xyzobs.mm.value'].parts()
 
-    if predict:
-      x_mm, y_mm, z_rad = integrated_data['xyzcal.mm'][j]
-    else:
-      x_mm, y_mm, z_rad = integrated_data['xyzobs.mm.value'][j]
+  z0 = integrated_data['xyzcal.px'].parts()[2]
+  istol = (10000 * unit_cell.stol(miller_index)).iround()
 
-    z0 = integrated_data['xyzcal.px'][j][2]
-    istol = int(round(10000 * unit_cell.stol((h, k, l))))
+  if predict or static:
+    # work from a scan static model & assume perfect goniometer
+    # FIXME maybe should work back in the option to predict spot positions
+    UB = matrix.sqr(experiment.crystal.get_A())
+    FUB = flex.mat3_double(nref, (F * UB).elems)
+  else:
+    # properly compute RUB for every reflection
+    scan_points = z0.iround()
+    FUB = flex.mat3_double(nref)
+    for i in sorted(set(scan_points)):
+      sel = scan_points == i
+      UB = matrix.sqr(experiment.crystal.get_A_at_scan_point(i))
+      FUB.set_selected(sel, (F * UB).elems)
+  phi = (phi_start + z0 * phi_range) * (math.pi / 180)
 
-    if predict or static:
-      # work from a scan static model & assume perfect goniometer
-      # FIXME maybe should work back in the option to predict spot positions
-      UB = matrix.sqr(experiment.crystal.get_A())
-      phi = phi_start + z0 * phi_range
-      R = axis.axis_and_angle_as_r3_rotation_matrix(phi, deg=True)
-      RUB = S * R * F * UB
-    else:
-      # properly compute RUB for every reflection
-      UB = matrix.sqr(experiment.crystal.get_A_at_scan_point(int(round(z0))))
-      phi = phi_start + z0 * phi_range
-      R = axis.axis_and_angle_as_r3_rotation_matrix(phi, deg=True)
-      RUB = S * R * F * UB
+  def rotate(v):
+    return S.elems * (FUB * v).rotate_around_origin(axis.elems, phi)
 
-    x = RUB * (h, k, l)
-    s = (s0 + x).normalize()
+  x = rotate(miller_index.as_vec3_double())
+  s = (x + s0.elems).each_normalize()
 
-    # can also compute s based on centre of mass of spot
-    # s = (origin + x_mm * fast_axis + y_mm * slow_axis).normalize()
+  # can also compute s based on centre of mass of spot
+  # s = (origin + x_mm * fast_axis + y_mm * slow_axis).normalize()
 
-    astar = (RUB * (1, 0, 0)).normalize()
-    bstar = (RUB * (0, 1, 0)).normalize()
-    cstar = (RUB * (0, 0, 1)).normalize()
+  astar = rotate(flex.vec3_double(nref, (1, 0, 0))).each_normalize()
+  bstar = rotate(flex.vec3_double(nref, (0, 1, 0))).each_normalize()
+  cstar = rotate(flex.vec3_double(nref, (0, 0, 1))).each_normalize()
 
-    ix = beam.dot(astar)
-    iy = beam.dot(bstar)
-    iz = beam.dot(cstar)
+  beam_array = flex.vec3_double(nref, beam.elems)
+  ix = beam_array.dot(astar)
+  iy = beam_array.dot(bstar)
+  iz = beam_array.dot(cstar)
 
-    dx = s.dot(astar)
-    dy = s.dot(bstar)
-    dz = s.dot(cstar)
+  dx = s.dot(astar)
+  dy = s.dot(bstar)
+  dz = s.dot(cstar)
 
-    x = x_mm * scl_x
-    y = y_mm * scl_y
-    z = (z_rad * 180 / math.pi - phi_start) / phi_range
+  x = x_mm * scl_x
+  y = y_mm * scl_y
+  z = (z_rad * 180 / math.pi - phi_start) / phi_range
 
-    fout.write('%4d%4d%4d%8.2f%8.2f%4d%8.5f%8.5f%8.5f%8.5f%8.5f%8.5f' % \
-               (h, k, l, I[j], sigI[j], run, ix, dx, iy, dy, iz, dz))
-    fout.write('%7.2f%7.2f%8.2f%7.2f%5d\n' % (x, y, z, detector2t, istol))
+  h, k, l = miller_index.as_vec3_double().parts()
 
+  fout = open(hklout, 'w')
+  write_records(fout, [
+    ('%4d', h.iround()),
+    ('%4d', k.iround()),
+    ('%4d', l.iround()),
+    ('%8.2f', I),
+    ('%8.2f', sigI),
+    ('%4d', flex.int(nref, run)),
+    ('%8.5f', ix),
+    ('%8.5f', dx),
+    ('%8.5f', iy),
+    ('%8.5f', dy),
+    ('%8.5f', iz),
+    ('%8.5f', dz),
+    ('%7.2f', x),
+    ('%7.2f', y),
+    ('%8.2f', z),
+    ('%7.2f', flex.double(nref, detector2t)),
+    ('%5d', istol)])
   fout.close()
   logger.info('Output %d reflections to %s' % (nref, hklout))
@@ -122,7 +122,7 @@ def export_xds_ascii(integrated_data, experiment_list, hklout, summation=False,
   if 'partiality' in integrated_data:
     partiality = 100 * integrated_data['partiality']
   else:
-    prof_corr = flex.double(nref, 100.0)
+    partiality = flex.double(nref, 100.0)
 
   if summation:
     I = integrated_data['intensity.sum.value'] * scl
@@ -207,32 +207,48 @@ def export_xds_ascii(integrated_data, experiment_list, hklout, summation=False,
 
   # then write the data records
 
+  import math
+  from dials.util.record_writer import write_records
   s0 = Rd * matrix.col(experiment.beam.get_s0())
 
-  for j in range(nref):
-    x, y, z = integrated_data['xyzcal.px'][j]
-    phi = phi_start + z * phi_range
-    h, k, l = miller_index[j]
-    X = (UB * (h, k, l)).rotate(axis, phi, deg=True)
-    s = s0 + X
-    g = s.cross(s0).normalize()
-    f = (s - s0).normalize()
-
-    # find component of beam perpendicular to f, e
-    e = - (s + s0).normalize()
-    if h == k and k == l:
-      u = (h, -h, 0)
-    else:
-      u = (k - l, l - h, h - k)
-    q = (matrix.col(u).transpose() * UB.inverse()).normalize(
-        ).transpose().rotate(axis, phi, deg=True)
-
-    psi = q.angle(g, deg=True)
-    if q.dot(e) < 0:
-      psi *= -1
-
-    fout.write('%d %d %d %f %f %f %f %f %f %.1f %.1f %f\n' %
-               (h, k, l, I[j], sigI[j], x, y, z, scl[j], partiality[j], prof_corr[j], psi))
+  x, y, z = integrated_data['xyzcal.px'].parts()
+  phi = (phi_start + z * phi_range) * (math.pi / 180)
+  hkl = miller_index.as_vec3_double()
+  X = (UB.elems * hkl).rotate_around_origin(axis.elems, phi)
+  s = X + s0.elems
+  s0_array = flex.vec3_double(nref, s0.elems)
+  g = s.cross(s0_array).each_normalize()
+
+  # find component of beam perpendicular to f, e
+  e = (s + s0_array).each_normalize() * -1.0
+  h, k, l = hkl.parts()
+  u = flex.vec3_double(k - l, l - h, h - k)
+  sel = (h == k) & (k == l)
+  u.set_selected(sel, flex.vec3_double(
+    h.select(sel), -h.select(sel), flex.double(sel.count(True), 0)))
+  q = (UB.inverse().transpose().elems * u).each_normalize(
+    ).rotate_around_origin(axis.elems, phi)
+
+  cos_psi = q.dot(g)
+  cos_psi.set_selected(cos_psi > 1, 1)
+  cos_psi.set_selected(cos_psi < -1, -1)
+  psi = flex.acos(cos_psi) * (180 / math.pi)
+  sel = q.dot(e) < 0
+  psi.set_selected(sel, -psi.select(sel))
+
+  write_records(fout, [
+    ('%d', h.iround()),
+    (' %d', k.iround()),
+    (' %d', l.iround()),
+    (' %f', I),
+    (' %f', sigI),
+    (' %f', x),
+    (' %f', y),
+    (' %f', z),
+    (' %f', scl),
+    (' %.1f', partiality),
+    (' %.1f', prof_corr),
+    (' %f', psi)])
 
   fout.write('!END_OF_DATA\n')
   fout.close()
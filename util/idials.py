@@ -12,6 +12,7 @@
 from __future__ import absolute_import, division, print_function
 
 import sys
+import threading
 
 class ActionError(RuntimeError):
   '''
@@ -135,6 +136,324 @@ def __call__(self, command,
             raise RuntimeError('Error: external command failed')
 
 
+def _save_logging():
+  '''
+  Save the handlers and levels of the existing loggers
+
+  '''
+  import logging
+  loggers = [logging.getLogger()] + [
+    logger for logger in logging.Logger.manager.loggerDict.values()
+    if isinstance(logger, logging.Logger)]
+  return dict(
+    (logger.name, (list(logger.handlers), logger.level, logger.propagate))
+    for logger in loggers)
+
+
+def _restore_logging(saved):
+  '''
+  Restore the saved handlers and levels and close any handlers which were
+  added since they were saved (e.g. the log files of a command)
+
+  '''
+  import logging
+  loggers = [logging.getLogger()] + [
+    logger for logger in logging.Logger.manager.loggerDict.values()
+    if isinstance(logger, logging.Logger)]
+  for logger in loggers:
+    if logger.name in saved:
+      handlers, level, propagate = saved[logger.name]
+    else:
+      handlers, level, propagate = [], logging.NOTSET, True
+    for handler in logger.handlers:
+      if handler not in handlers:
+        handler.close()
+    logger.handlers = handlers
+    logger.setLevel(level)
+    logger.propagate = propagate
+
+
+class InProcessCommand(object):
+  '''
+  Class to run a dials command in the current process. The command module is
+  executed as __main__ with the given arguments so that the interpreter and
+  the imported modules are reused between commands and input files already
+  loaded by the phil converters are not read again.
+
+  The command replaces the global sys.argv, sys.stdout and sys.stderr while it
+  is running, so only one in-process command may run at a time; a lock shared
+  by all instances serialises the calls.
+
+  '''
+
+  lock = threading.Lock()
+
+  def __init__(self, checkpoint_writer=None):
+    '''
+    :param checkpoint_writer: The writer used for output reflection tables
+
+    '''
+    self.checkpoint_writer = checkpoint_writer
+
+  @staticmethod
+  def module_name(program):
+    '''
+    Get the module name for a dials program
+
+    :param program: The program name (e.g. dials.find_spots)
+    :return: The module name
+
+    '''
+    if not program.startswith('dials.'):
+      raise RuntimeError('Unable to run %s in process' % program)
+    name = program[len('dials.'):]
+    if name == 'import':
+      name = 'dials_import'
+    return 'dials.command_line.%s' % name
+
+  def __call__(self,
+               command,
+               stdout=sys.stdout,
+               stderr=sys.stderr,
+               stdout_filename=None,
+               stderr_filename=None):
+    '''
+    Run the command
+
+    :param command: The command to run as a list
+    :param stdout: File object to write stdout
+    :param stderr: File object to write stderr
+    :param stdout_filename The filename to log stdout
+    :param stderr_filename The filename to log stderr
+
+    '''
+    # Create the list of file handles to write to
+    files = []
+    stdout = [stdout]
+    stderr = [stderr]
+    if stdout_filename is not None:
+      stdout_file = open(stdout_filename, "w")
+      files.append(stdout_file)
+      stdout.append(stdout_file)
+    if stderr_filename is not None:
+      if stderr_filename == stdout_filename:
+        stderr_file = stdout_file
+      else:
+        stderr_file = open(stderr_filename, "w")
+        files.append(stderr_file)
+      stderr.append(stderr_file)
+
+    # Run the module as __main__ with the arguments and output redirected
+    with InProcessCommand.lock:
+      self._run_module(command, stdout, stderr, files)
+
+  def _run_module(self, command, stdout, stderr, files):
+    '''
+    Run the command module with the global state replaced. Must be called
+    with the lock held.
+
+    '''
+    from dials.array_family import flex
+    import runpy
+
+    # A class to write to several streams
+    class TeeStream(object):
+      def __init__(self, output):
+        self.output = output
+      def write(self, text):
+        for out in self.output:
+          out.write(text)
+      def flush(self):
+        for out in self.output:
+          out.flush()
+
+    saved = sys.argv, sys.stdout, sys.stderr
+    saved_logging = _save_logging()
+    sys.argv = list(command)
+    sys.stdout = TeeStream(stdout)
+    sys.stderr = TeeStream(stderr)
+    flex.reflection_table._pickle_writer = self.checkpoint_writer
+    if self.checkpoint_writer is not None:
+      self.checkpoint_writer.fill_cache()
+    self.result = 0
+    try:
+      runpy.run_module(
+        self.module_name(command[0]),
+        run_name='__main__',
+        alter_sys=True)
+    except SystemExit as e:
+      if e.code is not None and e.code != 0:
+        self.result = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+      sys.stderr.write('%s\n' % str(e))
+      self.result = 1
+    finally:
+      flex.reflection_table._pickle_writer = None
+      if self.checkpoint_writer is not None:
+        self.checkpoint_writer.clear_cache()
+      sys.stdout.flush()
+      sys.stderr.flush()
+      _restore_logging(saved_logging)
+      sys.argv, sys.stdout, sys.stderr = saved
+      for f in files:
+        f.close()
+
+
+class RunInProcessCommand(RunExternalCommand):
+    '''
+    Helper function to run command in the current process
+
+    :param checkpoint_writer: The writer used for output reflection tables
+
+    '''
+    def __init__(self, checkpoint_writer=None):
+        self.command_run = InProcessCommand(checkpoint_writer)
+
+
+class CheckpointWriter(object):
+  '''
+  A class to keep reflection tables written by in-process commands in memory
+  and write the pickle files in a background thread.
+
+  The tables held by the writer are never modified. Before each command a
+  fresh copy of each table is put into the cache of the reflection table phil
+  converter, so the next command picks it up without reading the file, and
+  the cache is cleared when the command finishes so that changes a command
+  makes to its input are not seen by later commands. Files are written to a
+  temporary name and renamed when complete so that a partially written file
+  is never read.
+
+  Only the process which created the writer uses the background thread;
+  tables saved in any other process (e.g. forked workers) are written
+  directly.
+
+  '''
+
+  def __init__(self):
+    '''
+    Start the writer thread
+
+    '''
+    from six.moves.queue import Queue
+    import os
+    self.queue = Queue()
+    self.lock = threading.Lock()
+    self.pending = set()
+    self.errors = []
+    self.tables = {}
+    self.pid = os.getpid()
+    self.thread = threading.Thread(target=self._run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def write(self, table, filename):
+    '''
+    Keep the table in memory and queue it to be written
+
+    :param table: The reflection table
+    :param filename: The output filename
+
+    '''
+    import os
+    if os.getpid() != self.pid or not self.thread.is_alive():
+      self._dump(table, filename)
+      return
+
+    # Take a copy as the table may be modified after it has been saved
+    table = table.copy()
+    with self.lock:
+      self.pending.add(filename)
+      self.tables[filename] = table
+    self.queue.put((table, filename))
+
+  def fill_cache(self):
+    '''
+    Put a copy of each table held in memory into the phil converter cache
+
+    '''
+    from dials.util.phil import ReflectionTableConverters
+    from dials.util.phil import FilenameDataWrapper
+    with self.lock:
+      tables = list(self.tables.items())
+    for filename, table in tables:
+      ReflectionTableConverters.cache[filename] = FilenameDataWrapper(
+        filename, table.copy())
+
+  def clear_cache(self):
+    '''
+    Remove all tables from the phil converter cache
+
+    '''
+    from dials.util.phil import ReflectionTableConverters
+    ReflectionTableConverters.cache.clear()
+
+  def wait(self):
+    '''
+    Wait for all queued files to be written
+
+    '''
+    self.queue.join()
+    with self.lock:
+      errors, self.errors = self.errors, []
+    if len(errors) > 0:
+      raise RuntimeError('Error writing checkpoint: %s' % errors[0])
+
+  def is_pending(self, filename):
+    '''
+    Check if a file is waiting to be written
+
+    :param filename: The filename
+    :return: True/False the file is waiting to be written
+
+    '''
+    with self.lock:
+      return filename in self.pending
+
+  def evict(self, keep=None):
+    '''
+    Remove reflection tables from memory which have been written to disk
+
+    :param keep: The filenames to keep in memory
+
+    '''
+    if keep is None:
+      keep = []
+    with self.lock:
+      for filename in list(self.tables.keys()):
+        if filename not in keep and filename not in self.pending:
+          del self.tables[filename]
+
+  @staticmethod
+  def _dump(table, filename):
+    '''
+    Write the table to a temporary file and rename it when complete
+
+    '''
+    import six.moves.cPickle as pickle
+    import os
+    temp_filename = '%s.tmp' % filename
+    with open(temp_filename, 'wb') as outfile:
+      pickle.dump(table, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(temp_filename, filename)
+
+  def _run(self):
+    '''
+    Write the queued tables
+
+    '''
+    while True:
+      table, filename = self.queue.get()
+      try:
+        self._dump(table, filename)
+      except Exception as e:
+        with self.lock:
+          self.errors.append('%s: %s' % (filename, str(e)))
+      finally:
+        with self.lock:
+          self.pending.discard(filename)
+        self.queue.task_done()
+
+
 class UndoStack(object):
   '''
   A class to implement an undo stack
@@ -636,10 +955,18 @@ class Command(object):
 
   name = None
 
-  def __init__(self, parent=None, index=None, phil_scope=None, workspace=None):
+  def __init__(self,
+               parent=None,
+               index=None,
+               phil_scope=None,
+               workspace=None,
+               checkpoint_writer=None):
     '''
     Initialise the action
 
+    :param checkpoint_writer: If set, run the command in process and use the
+                              writer for the output reflections
+
     '''
     from os.path import join
     import copy
@@ -690,6 +1017,9 @@ def __init__(self, parent=None, index=None, phil_scope=None, workspace=None):
     if self.state.parent is not None:
       self.state.parent.children.append(self.state)
 
+    # Set the checkpoint writer
+    self.checkpoint_writer = checkpoint_writer
+
   def apply(self, stdout=sys.stdout, stderr=sys.stderr):
     '''
     Apply the command
@@ -726,6 +1056,15 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     '''
     pass
 
+  def command_runner(self):
+    '''
+    Get the object to run a dials program
+
+    '''
+    if self.checkpoint_writer is not None:
+      return RunInProcessCommand(self.checkpoint_writer)
+    return RunExternalCommand()
+
   def generate_report(self, stdout=sys.stdout, stderr=sys.stderr):
     '''
     Helper function to run dials.report
@@ -745,7 +1084,7 @@ def generate_report(self, stdout=sys.stdout, stderr=sys.stderr):
     command.append('input.reflections=%s' % self.state.reflections)
     command.append('output.html=%s' % self.state.report)
     command.append('output.external_dependencies=local')
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(command, stdout=stdout, stderr=stderr)
 
   def check_files_exist(self, filenames=None):
@@ -756,7 +1095,8 @@ def check_files_exist(self, filenames=None):
     from os.path import exists
     def assert_exists(name):
       if name is not None and name is not 'None' and not exists(name):
-        raise RuntimeError("File %s could not be found" % name)
+        if self.checkpoint_writer is None or not self.checkpoint_writer.is_pending(name):
+          raise RuntimeError("File %s could not be found" % name)
     if filenames is not None:
       for name in filenames:
         assert_exists(name)
@@ -893,7 +1233,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.import', self.state.parameters],
       stdout=stdout,
@@ -944,7 +1284,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run find spots
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.find_spots', self.state.parameters],
       stdout=stdout,
@@ -998,7 +1338,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.search_beam_position', self.state.parameters],
       stdout=stdout,
@@ -1064,7 +1404,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.index', self.state.parameters],
       stdout=stdout,
@@ -1118,7 +1458,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.refine_bravais_settings', self.state.parameters],
       stdout=stdout,
@@ -1206,7 +1546,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.reindex', self.state.parameters],
       stdout=stdout,
@@ -1269,7 +1609,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.refine', self.state.parameters],
       stdout=stdout,
@@ -1331,7 +1671,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.integrate', self.state.parameters],
       stdout=stdout,
@@ -1388,7 +1728,7 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     outfile.close()
 
     # Run the command
-    self.external_command = RunExternalCommand()
+    self.external_command = self.command_runner()
     self.external_command(
       ['dials.export', self.state.parameters],
       stdout=stdout,
@@ -1450,6 +1790,9 @@ def __init__(self, workspace=None, memento=None):
     # Get the global parameters
     self.parameters = GlobalParameterManager()
 
+    # The checkpoint writer if commands are run in process
+    self.checkpoint_writer = None
+
     # Init the state
     if memento is None:
       self.counter = Counter()
@@ -1471,10 +1814,11 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     '''
     # Create the command
     self.command = self.CommandClass[self.mode](
-      parent     = self.current,
-      index      = self.counter.current(),
-      phil_scope = self.parameters[self.mode],
-      workspace  = self.workspace)
+      parent            = self.current,
+      index             = self.counter.current(),
+      phil_scope        = self.parameters[self.mode],
+      workspace         = self.workspace,
+      checkpoint_writer = self.checkpoint_writer)
 
     # Increment the counter
     self.counter.incr()
@@ -1482,6 +1826,11 @@ def run(self, stdout=sys.stdout, stderr=sys.stderr):
     # Apply the command
     self.current = self.command.apply(stdout=stdout, stderr=stderr)
 
+    # Only keep the latest reflections in memory
+    if self.checkpoint_writer is not None:
+      self.checkpoint_writer.evict(
+        keep=[getattr(self.current, 'reflections', None)])
+
   def goto(self, index):
     '''
     Goto a specific command
@@ -1599,13 +1948,17 @@ class Controller(object):
   def __init__(self,
                directory=".",
                state_filename="dials.state",
-               recover=True):
+               recover=True,
+               in_memory=False):
     '''
     Initialise the controller
 
     :param directory: The output directory
     :param state_filename: The filename to save the state to
     :param recover: Recover the state if available
+    :param in_memory: Run the programs in process, keeping the reflections in
+                      memory between commands and writing them in the
+                      background
 
     '''
     from multiprocessing import Lock
@@ -1632,6 +1985,12 @@ def find_directory(working_directory):
           counter += 1
       self.state = ApplicationState(find_directory(abspath(directory)))
 
+    # Create the checkpoint writer and make sure files are written on exit
+    if in_memory:
+      import atexit
+      self.state.checkpoint_writer = CheckpointWriter()
+      atexit.register(self.state.checkpoint_writer.wait)
+
   def set_mode(self, mode):
     '''
     Set the current mode.
@@ -1773,6 +2132,14 @@ def goto(self, index):
       self.state.goto(index)
       self.state.dump(self.state_filename)
 
+  def wait_for_checkpoints(self):
+    '''
+    Wait until all the files from in process commands have been written
+
+    '''
+    if self.state.checkpoint_writer is not None:
+      self.state.checkpoint_writer.wait()
+
   def run(self, stdout=sys.stdout, stderr=sys.stderr):
     '''
     Run a program
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+# image_summation.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division, print_function
+
+# The largest value of a summed integer pixel
+max_int_value = 2**31 - 1
+
+def _as_double(panel):
+  '''
+  Get a double precision copy of a panel array
+
+  '''
+  from scitbx.array_family import flex
+  if isinstance(panel, flex.double):
+    return panel.deep_copy()
+  return panel.as_double()
+
+
+class FrameSum(object):
+  '''
+  Accumulate a running sum of frames, one frame at a time, so that only the
+  sum and the current frame are held in memory. Each frame is a tuple of
+  panel arrays. Negative pixel values in the first frame are special values
+  (e.g. gaps between modules) and are preserved; negative values in the other
+  frames are not added. Integer sums are accumulated in double precision and
+  saturate at the largest int value rather than overflowing.
+
+  '''
+
+  def __init__(self, keep_special=True):
+    '''
+    :param keep_special: Preserve the negative values of the first frame. This
+                         is False for a partial sum which does not start at
+                         the first frame of the range.
+
+    '''
+    self.keep_special = keep_special
+    self.is_int = None
+    self.total = None
+
+  def add(self, frame):
+    '''
+    Add a frame to the sum
+
+    :param frame: The frame
+
+    '''
+    from scitbx.array_family import flex
+    if self.total is None:
+      self.is_int = [isinstance(panel, flex.int) for panel in frame]
+      self.total = [_as_double(panel) for panel in frame]
+      if not self.keep_special:
+        for total in self.total:
+          total.set_selected(total < 0, 0)
+      return
+    assert len(frame) == len(self.total)
+    for total, panel in zip(self.total, frame):
+      data = _as_double(panel)
+      assert data.all() == total.all()
+      data.set_selected(data < 0, 0)
+      total += data
+
+  def result(self):
+    '''
+    :return: The summed frame
+
+    '''
+    from scitbx.array_family import flex
+    assert self.total is not None
+    result = []
+    for is_int, total in zip(self.is_int, self.total):
+      if is_int:
+        grid = total.all()
+        total = total.deep_copy()
+        total.set_selected(total > max_int_value, max_int_value)
+        total = total.iround()
+        total.reshape(flex.grid(grid))
+      result.append(total)
+    return tuple(result)
+
+
+def sum_frames(frames, keep_special=True):
+  '''
+  Sum a sequence of frames. The frames may be generated lazily; each frame is
+  added to the running sum as it is produced.
+
+  :param frames: The iterable of frames
+  :param keep_special: Preserve the negative values of the first frame
+  :return: The summed frame
+
+  '''
+  summed = FrameSum(keep_special)
+  for frame in frames:
+    summed.add(frame)
+  return summed.result()
+
+
+class FrameBlockSummer(object):
+  '''
+  Sum a block of consecutive frames and pass the sum to a writer. The reader
+  and writer must be picklable so that blocks can be summed in separate
+  processes.
+
+  '''
+
+  def __init__(self, reader, writer, n_frames, first=0, last=None,
+               partial=False):
+    '''
+    :param reader: A function reader(index) returning a frame
+    :param writer: A function writer(block, frame) writing the sum
+    :param n_frames: The number of frames in a block
+    :param first: The index of the first frame of the first block
+    :param last: The end of the frame range; the last block may be shorter
+    :param partial: The blocks are partial sums of a single range, so only
+                    the first block keeps the special values
+
+    '''
+    self.reader = reader
+    self.writer = writer
+    self.n_frames = n_frames
+    self.first = first
+    self.last = last
+    self.partial = partial
+
+  def __call__(self, block):
+    first = self.first + block * self.n_frames
+    last = first + self.n_frames
+    if self.last is not None:
+      last = min(last, self.last)
+    frames = (self.reader(i) for i in range(first, last))
+    keep_special = not self.partial or first == self.first
+    return self.writer(block, sum_frames(frames, keep_special))
+
+
+def return_frame(block, frame):
+  '''
+  A writer which returns the summed frame
+
+  '''
+  return frame
+
+
+def sum_frame_blocks(reader, writer, n_frames, n_blocks, nproc=1):
+  '''
+  Sum blocks of consecutive frames. The blocks are distributed over the
+  processes so that frames are read, summed and written concurrently. Each
+  process reads only the frames of its own blocks.
+
+  :param reader: A function reader(index) returning a frame
+  :param writer: A function writer(block, frame) writing the sum
+  :param n_frames: The number of frames in a block
+  :param n_blocks: The number of blocks
+  :param nproc: The number of processes
+  :return: The list of values returned by the writer
+
+  '''
+  summer = FrameBlockSummer(reader, writer, n_frames)
+  return _map_blocks(summer, n_blocks, nproc)
+
+
+def sum_frame_range(reader, first, last, nproc=1):
+  '''
+  Sum a range of frames. The range is split into a block per process and the
+  partial sums are combined at the end.
+
+  :param reader: A function reader(index) returning a frame
+  :param first: The index of the first frame
+  :param last: The index one past the last frame
+  :param nproc: The number of processes
+  :return: The summed frame
+
+  '''
+  import math
+  assert last > first
+  nproc = min(nproc, last - first)
+  n_frames = int(math.ceil((last - first) / nproc))
+  n_blocks = int(math.ceil((last - first) / n_frames))
+  summer = FrameBlockSummer(
+    reader, return_frame, n_frames, first, last, partial=True)
+  return sum_frames(_map_blocks(summer, n_blocks, nproc))
+
+
+def _map_blocks(summer, n_blocks, nproc):
+  '''
+  Sum the blocks in this process or in a pool of processes
+
+  '''
+  if nproc == 1 or n_blocks < 2:
+    return [summer(block) for block in range(n_blocks)]
+  from dials.util.mp import parallel_map
+  return parallel_map(
+    func=summer,
+    iterable=list(range(n_blocks)),
+    processes=min(nproc, n_blocks),
+    method='multiprocessing',
+    preserve_order=True)
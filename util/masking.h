@@ -234,6 +234,32 @@ namespace dials { namespace util {
       }
     }
 
+    /**
+     * Apply the mask for multiple resolution ranges in a single pass
+     * @param mask The mask
+     * @param ranges The list of (d_min, d_max) ranges
+     */
+    void apply_ranges(
+        af::ref< bool, af::c_grid<2> > mask,
+        const af::const_ref< vec2<double> > &ranges) const {
+      DIALS_ASSERT(resolution_.accessor()[0] == mask.accessor()[0]);
+      DIALS_ASSERT(resolution_.accessor()[1] == mask.accessor()[1]);
+      for (std::size_t k = 0; k < ranges.size(); ++k) {
+        DIALS_ASSERT(ranges[k][0] < ranges[k][1]);
+      }
+      for (std::size_t j = 0; j < resolution_.accessor()[0]; ++j) {
+        for (std::size_t i = 0; i < resolution_.accessor()[1]; ++i) {
+          double d = resolution_(j,i);
+          for (std::size_t k = 0; k < ranges.size(); ++k) {
+            if (ranges[k][0] <= d && d <= ranges[k][1]) {
+              mask(j,i) = false;
+              break;
+            }
+          }
+        }
+      }
+    }
+
   private:
 
     af::versa< double, af::c_grid<2> > resolution_;
@@ -138,43 +138,119 @@ def generate_ice_ring_resolution_ranges(beam, panel, params):
       yield (d_min, d_max)
 
 
+# The cache of masks generated from the geometry, shared by all generators
+# as a list of (parameters key, detector, beam, masks), most recent last
+_geometry_mask_cache = []
+
+def _geometry_params_key(params):
+  '''
+  Get a key for the mask parameters which affect the geometry mask
+
+  '''
+  def as_tuple(value):
+    return None if value is None else tuple(value)
+  ice_rings = params.ice_rings
+  return (
+    params.border,
+    params.d_min,
+    params.d_max,
+    tuple(as_tuple(r) for r in params.resolution_range),
+    tuple(
+      (region.panel,
+       as_tuple(region.circle),
+       as_tuple(region.rectangle),
+       as_tuple(region.polygon),
+       as_tuple(region.pixel))
+      for region in params.untrusted),
+    (ice_rings.filter,
+     str(ice_rings.unit_cell),
+     str(ice_rings.space_group),
+     ice_rings.width,
+     ice_rings.d_min))
+
+
 class MaskGenerator(object):
-  ''' Generate a mask. '''
+  '''
+  Generate a mask.
 
-  def __init__(self, params):
+  The parts of the mask which depend only on the detector, beam and mask
+  parameters (the border, untrusted regions and resolution ranges) are cached
+  at module level, keyed on the models and the parameters, so that they are
+  not regenerated for every imageset with the same geometry (e.g. for stills
+  or multiple sweeps) even when a new generator is created for each one. The
+  trusted range mask is generated from the first image of each imageset.
+
+  '''
+
+  def __init__(self, params, max_cache_size=8):
     ''' Set the parameters. '''
     self.params = params
+    self.max_cache_size = max_cache_size
 
   def generate(self, imageset):
     ''' Generate the mask. '''
-    from dials.util.ext import ResolutionMaskGenerator
-    from dials.util.ext import mask_untrusted_rectangle
-    from dials.util.ext import mask_untrusted_circle
-    from dials.util.ext import mask_untrusted_polygon
-    from dials.array_family import flex
 
     # Get the detector and beam
     detector = imageset.get_detector()
     beam = imageset.get_beam()
 
-    # Get the first image
-    image = imageset.get_raw_data(0)
-    assert(len(detector) == len(image))
+    # Get the mask from the geometry
+    masks = self.geometry_mask(detector, beam)
+
+    # Apply the trusted range to the first image
+    if self.params.use_trusted_range:
+      image = imageset.get_raw_data(0)
+      assert(len(detector) == len(image))
+      result = []
+      for mask, im, panel in zip(masks, image, detector):
+        assert mask.all() == im.all()
+        low, high = panel.get_trusted_range()
+        imd = im.as_double()
+        result.append(mask & (imd > low) & (imd < high))
+      return tuple(result)
+    return tuple(mask.deep_copy() for mask in masks)
+
+  def geometry_mask(self, detector, beam):
+    '''
+    Get the mask which depends only on the geometry, from the cache if it has
+    already been generated for the same detector and beam models and mask
+    parameters. The returned masks are shared and must not be modified.
+
+    '''
+    def same_model(a, b):
+      return a is b or (a is not None and b is not None and a == b)
+    key = _geometry_params_key(self.params)
+    for entry in _geometry_mask_cache:
+      cached_key, cached_detector, cached_beam, masks = entry
+      if (cached_key == key and
+          same_model(detector, cached_detector) and
+          same_model(beam, cached_beam)):
+        logger.debug("Using cached mask")
+        _geometry_mask_cache.remove(entry)
+        _geometry_mask_cache.append(entry)
+        return masks
+    from copy import deepcopy
+    masks = self._generate_geometry_mask(detector, beam)
+    _geometry_mask_cache.append((key, deepcopy(detector), deepcopy(beam), masks))
+    while len(_geometry_mask_cache) > self.max_cache_size:
+      del _geometry_mask_cache[0]
+    return masks
+
+  def _generate_geometry_mask(self, detector, beam):
+    ''' Generate the mask from the geometry. '''
+    from dials.util.ext import ResolutionMaskGenerator
+    from dials.util.ext import mask_untrusted_rectangle
+    from dials.util.ext import mask_untrusted_circle
+    from dials.util.ext import mask_untrusted_polygon
+    from dials.array_family import flex
 
     # Create the mask for each image
     masks = []
-    for index, (im, panel) in enumerate(zip(image, detector)):
-
-      # The image width height
-      height, width = im.all()
+    for index, panel in enumerate(detector):
 
-      # Create the basic mask from the trusted range
-      if self.params.use_trusted_range:
-        low, high = panel.get_trusted_range()
-        imd = im.as_double()
-        mask = (imd > low) & (imd < high)
-      else:
-        mask = flex.bool(flex.grid(im.all()), True)
+      # Create the basic mask
+      width, height = panel.get_image_size()
+      mask = flex.bool(flex.grid(height, width), True)
 
       # Add a border around the image
       if self.params.border > 0:
@@ -225,29 +301,20 @@ def generate(self, imageset):
           if region.pixel is not None:
             mask[region.pixel] = False
 
-      # Create the resolution mask generator
-      class ResolutionMaskGeneratorGetter(object):
-        def __init__(self, beam, panel):
-          self.beam = beam
-          self.panel = panel
-          self.result = None
-        def __call__(self):
-          if self.result is None:
-            self.result = ResolutionMaskGenerator(beam, panel)
-          return self.result
-      get_resolution_mask_generator = ResolutionMaskGeneratorGetter(beam, panel)
+      # The resolution ranges to mask
+      ranges = []
 
       # Generate high and low resolution masks
       if self.params.d_min is not None:
         logger.info("Generating high resolution mask:")
         logger.info(" d_min = %f" % self.params.d_min)
-        get_resolution_mask_generator().apply(mask, 0, self.params.d_min)
+        ranges.append((0, self.params.d_min))
       if self.params.d_max is not None:
         logger.info("Generating low resolution mask:")
         logger.info(" d_max = %f" % self.params.d_max)
         d_min = self.params.d_max
         d_max = max(d_min + 1, 1e9)
-        get_resolution_mask_generator().apply(mask, d_min, d_max)
+        ranges.append((d_min, d_max))
 
       # Mask out the resolution range
       for drange in self.params.resolution_range:
@@ -257,7 +324,7 @@ def __call__(self):
         logger.info("Generating resolution range mask:")
         logger.info(" d_min = %f" % d_min)
         logger.info(" d_max = %f" % d_max)
-        get_resolution_mask_generator().apply(mask, d_min, d_max)
+        ranges.append((d_min, d_max))
 
       # Mask out the resolution ranges for the ice rings
       for drange in generate_ice_ring_resolution_ranges(
@@ -268,7 +335,12 @@ def __call__(self):
         logger.info("Generating ice ring mask:")
         logger.info(" d_min = %f" % d_min)
         logger.info(" d_max = %f" % d_max)
-        get_resolution_mask_generator().apply(mask, d_min, d_max)
+        ranges.append((d_min, d_max))
+
+      # Apply all the resolution ranges in a single pass
+      if len(ranges) > 0:
+        ResolutionMaskGenerator(beam, panel).apply_ranges(
+          mask, flex.vec2_double(ranges))
 
       # Add to the list
       masks.append(mask)
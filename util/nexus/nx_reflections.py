@@ -3,12 +3,35 @@
 
 schema_url = 'https://github.com/nexusformat/definitions/blob/master/contributed_definitions/NXreflections.nxdl.xml'
 
+# The number of rows in a chunk and the compression of the datasets
+chunk_size = 1 << 16
+compression = 'gzip'
+compression_opts = 4
+
+def dataset_options(shape):
+  '''
+  Get the chunking and compression options for a dataset of the given shape.
+  Each column is chunked by rows; empty datasets cannot be chunked.
+
+  '''
+  if len(shape) == 0 or shape[0] == 0:
+    return {}
+  chunks = (min(shape[0], chunk_size),) + tuple(shape[1:])
+  return {
+    'chunks' : chunks,
+    'compression' : compression,
+    'compression_opts' : compression_opts,
+    'shuffle' : True
+  }
+
 def make_dataset(handle, name, dtype, data, description, units=None):
+  shape = data.focus()
   dset = handle.create_dataset(
     name,
-    data.focus(),
+    shape,
     dtype=dtype,
-    data=data.as_numpy_array().astype(dtype))
+    data=data.as_numpy_array().astype(dtype),
+    **dataset_options(shape))
   dset.attrs['description'] = description
   if units is not None:
     dset.attrs['units'] = units
@@ -30,22 +53,33 @@ def make_vlen_uint(handle, name, data, description, units=None):
   import h5py
   import numpy as np
   dtype = h5py.special_dtype(vlen=np.dtype("uint64"))
-  dset = handle.create_dataset(name, (len(data),), dtype=dtype)
+  values = np.empty((len(data),), dtype=object)
   for i, d in enumerate(data):
-    if len(d) > 0:
-      dset[i] = d
+    values[i] = np.array(d, dtype="uint64")
+  dset = handle.create_dataset(
+    name,
+    (len(data),),
+    dtype=dtype,
+    **dataset_options((len(data),)))
+  if len(data) > 0:
+    dset[:] = values
   dset.attrs['description'] = description
   if units is not None:
     dset.attrs['units'] = units
   return dset
 
+def read_dataset(handle, name, flex_type, dtype):
+  '''
+  Read a whole dataset in one call and convert it to a flex array
+
+  '''
+  import numpy as np
+  return flex_type(np.ascontiguousarray(handle[name][()], dtype=dtype))
+
 def write(handle, key, data):
   from dials.array_family import flex
   if   key == 'miller_index':
-    col1, col2, col3 = zip(*list(data))
-    col1 = flex.int(col1)
-    col2 = flex.int(col2)
-    col3 = flex.int(col3)
+    col1, col2, col3 = data.as_vec3_double().parts()
     dsc1 = 'The h component of the miller index'
     dsc2 = 'The k component of the miller index'
     dsc3 = 'The l component of the miller index'
@@ -188,81 +222,81 @@ def read(handle, key):
   from dxtbx.format.nexus import convert_units
   import numpy as np
   if   key == 'miller_index':
-    h = flex.int(handle['h'][:].astype(np.int32))
-    k = flex.int(handle['k'][:].astype(np.int32))
-    l = flex.int(handle['l'][:].astype(np.int32))
+    h = read_dataset(handle, 'h', flex.int, np.int32)
+    k = read_dataset(handle, 'k', flex.int, np.int32)
+    l = read_dataset(handle, 'l', flex.int, np.int32)
     return flex.miller_index(h,k,l)
   elif key == 'id':
-    return flex.int(handle['id'][:].astype(int))
+    return read_dataset(handle, 'id', flex.int, np.int32)
   elif key == 'partial_id':
-    return flex.size_t(handle['reflection_id'][:].astype(int))
+    return read_dataset(handle, 'reflection_id', flex.size_t, int)
   elif key == 'entering':
-    return flex.bool(handle['entering'][:])
+    return read_dataset(handle, 'entering', flex.bool, np.bool_)
   elif key == 'flags':
-    return flex.size_t(handle['flags'][:].astype(int))
+    return read_dataset(handle, 'flags', flex.size_t, int)
   elif key == 'panel':
-    return flex.size_t(handle['det_module'][:].astype(int))
+    return read_dataset(handle, 'det_module', flex.size_t, int)
   elif key == 'd':
-    return flex.double(handle['d'][:])
+    return read_dataset(handle, 'd', flex.double, np.float64)
   elif key == 'partiality':
-    return flex.double(handle['partiality'][:])
+    return read_dataset(handle, 'partiality', flex.double, np.float64)
   elif key == 'xyzcal.px':
-    x = flex.double(handle['predicted_px_x'][:])
-    y = flex.double(handle['predicted_px_y'][:])
-    z = flex.double(handle['predicted_frame'][:])
+    x = read_dataset(handle, 'predicted_px_x', flex.double, np.float64)
+    y = read_dataset(handle, 'predicted_px_y', flex.double, np.float64)
+    z = read_dataset(handle, 'predicted_frame', flex.double, np.float64)
     return flex.vec3_double(x, y, z)
   elif key == 'xyzcal.mm':
-    x = convert_units(flex.double(handle['predicted_x'][:]), handle['predicted_x'].attrs['units'], 'mm')
-    y = convert_units(flex.double(handle['predicted_y'][:]), handle['predicted_y'].attrs['units'], 'mm')
-    z = convert_units(flex.double(handle['predicted_phi'][:]), handle['predicted_phi'].attrs['units'], 'rad')
+    x = convert_units(read_dataset(handle, 'predicted_x', flex.double, np.float64), handle['predicted_x'].attrs['units'], 'mm')
+    y = convert_units(read_dataset(handle, 'predicted_y', flex.double, np.float64), handle['predicted_y'].attrs['units'], 'mm')
+    z = convert_units(read_dataset(handle, 'predicted_phi', flex.double, np.float64), handle['predicted_phi'].attrs['units'], 'rad')
     return flex.vec3_double(x, y, z)
   elif key == 'bbox':
-    b = flex.int(handle['bounding_box'][:].astype(np.int32))
+    b = read_dataset(handle, 'bounding_box', flex.int, np.int32)
     return flex.int6(b.as_1d())
   elif key == 'xyzobs.px.value':
-    x = flex.double(handle['observed_px_x'][:])
-    y = flex.double(handle['observed_px_y'][:])
-    z = flex.double(handle['observed_frame'][:])
+    x = read_dataset(handle, 'observed_px_x', flex.double, np.float64)
+    y = read_dataset(handle, 'observed_px_y', flex.double, np.float64)
+    z = read_dataset(handle, 'observed_frame', flex.double, np.float64)
     return flex.vec3_double(x, y, z)
   elif key == 'xyzobs.px.variance':
-    x = flex.double(handle['observed_px_x_var'][:])
-    y = flex.double(handle['observed_px_y_var'][:])
-    z = flex.double(handle['observed_frame_var'][:])
+    x = read_dataset(handle, 'observed_px_x_var', flex.double, np.float64)
+    y = read_dataset(handle, 'observed_px_y_var', flex.double, np.float64)
+    z = read_dataset(handle, 'observed_frame_var', flex.double, np.float64)
     return flex.vec3_double(x, y, z)
   elif key == 'xyzobs.mm.value':
-    x = convert_units(flex.double(handle['observed_x'][:]), handle['observed_x'].attrs['units'], 'mm')
-    y = convert_units(flex.double(handle['observed_y'][:]), handle['observed_y'].attrs['units'], 'mm')
-    z = convert_units(flex.double(handle['observed_phi'][:]), handle['observed_phi'].attrs['units'], 'rad')
+    x = convert_units(read_dataset(handle, 'observed_x', flex.double, np.float64), handle['observed_x'].attrs['units'], 'mm')
+    y = convert_units(read_dataset(handle, 'observed_y', flex.double, np.float64), handle['observed_y'].attrs['units'], 'mm')
+    z = convert_units(read_dataset(handle, 'observed_phi', flex.double, np.float64), handle['observed_phi'].attrs['units'], 'rad')
     return flex.vec3_double(x, y, z)
   elif key == 'xyzobs.mm.variance':
-    x = convert_units(flex.double(handle['observed_x_var'][:]), handle['observed_x_var'].attrs['units'], 'mm')
-    y = convert_units(flex.double(handle['observed_y_var'][:]), handle['observed_y_var'].attrs['units'], 'mm')
-    z = convert_units(flex.double(handle['observed_phi_var'][:]), handle['observed_phi_var'].attrs['units'], 'rad')
+    x = convert_units(read_dataset(handle, 'observed_x_var', flex.double, np.float64), handle['observed_x_var'].attrs['units'], 'mm')
+    y = convert_units(read_dataset(handle, 'observed_y_var', flex.double, np.float64), handle['observed_y_var'].attrs['units'], 'mm')
+    z = convert_units(read_dataset(handle, 'observed_phi_var', flex.double, np.float64), handle['observed_phi_var'].attrs['units'], 'rad')
     return flex.vec3_double(x, y, z)
   elif key == 'background.mean':
-    return flex.double(handle['background_mean'][:])
+    return read_dataset(handle, 'background_mean', flex.double, np.float64)
   elif key == 'intensity.sum.value':
-    return flex.double(handle['int_sum'][:])
+    return read_dataset(handle, 'int_sum', flex.double, np.float64)
   elif key == 'intensity.sum.variance':
-    return flex.double(handle['int_sum_var'][:])
+    return read_dataset(handle, 'int_sum_var', flex.double, np.float64)
   elif key == 'intensity.prf.value':
-    return flex.double(handle['int_prf'][:])
+    return read_dataset(handle, 'int_prf', flex.double, np.float64)
   elif key == 'intensity.prf.variance':
-    return flex.double(handle['int_prf_var'][:])
+    return read_dataset(handle, 'int_prf_var', flex.double, np.float64)
   elif key == 'profile.correlation':
-    return flex.double(handle['prf_cc'][:])
+    return read_dataset(handle, 'prf_cc', flex.double, np.float64)
   elif key == 'lp':
-    return flex.double(handle['lp'][:])
+    return read_dataset(handle, 'lp', flex.double, np.float64)
   elif key == 'num_pixels.background':
-    return flex.int(handle['num_bg'][:].astype(np.int32))
+    return read_dataset(handle, 'num_bg', flex.int, np.int32)
   elif key == 'num_pixels.background_used':
-    return flex.int(handle['num_bg_used'][:].astype(np.int32))
+    return read_dataset(handle, 'num_bg_used', flex.int, np.int32)
   elif key == 'num_pixels.foreground':
-    return flex.int(handle['num_fg'][:].astype(np.int32))
+    return read_dataset(handle, 'num_fg', flex.int, np.int32)
   elif key == 'num_pixels.valid':
-    return flex.int(handle['num_valid'][:].astype(np.int32))
+    return read_dataset(handle, 'num_valid', flex.int, np.int32)
   elif key == 'profile.rmsd':
-    return flex.double(handle['prf_rmsd'][:])
+    return read_dataset(handle, 'prf_rmsd', flex.double, np.float64)
   else:
     raise KeyError('Column %s not read from file' % key)
 
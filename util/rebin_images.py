@@ -98,23 +98,30 @@ def main(in_images, out_images):
     print("Writing %s" % o)
     write_image(o, pixel, header)
 
-def main_sum(in_images, out_image):
-  n = len(in_images)
+class ImageFileReader(object):
+  '''
+  Read the pixel values of an image file as a frame for summation
+
+  '''
+
+  def __init__(self, in_images):
+    self.in_images = in_images
+
+  def __call__(self, i):
+    print("Reading %s" % self.in_images[i])
+    pixel, header = read_image(self.in_images[i])
+    return (pixel,)
+
+def main_sum(in_images, out_image, nproc=1):
+  from dials.util.image_summation import sum_frame_range
   import os
   for i in in_images:
     assert(os.path.exists(i))
   assert(not os.path.exists(out_image))
 
-  in_image_data = []
-  in_image_headers = []
-
-  for i in in_images:
-    print("Reading %s" % i)
-    pixel, header = read_image(i)
-    in_image_data.append(pixel)
-    in_image_headers.append(header)
-
-  sum_image = merge_counts(in_image_data)
+  sum_image = sum_frame_range(
+    ImageFileReader(in_images), 0, len(in_images), nproc=nproc)[0]
+  pixel, header = read_image(in_images[0])
 
   print("Writing %s" % out_image)
-  write_image(out_image, sum_image, in_image_headers[0])
+  write_image(out_image, sum_image, header)
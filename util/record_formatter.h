@@ -0,0 +1,199 @@
+/*
+ * record_formatter.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_UTIL_RECORD_FORMATTER_H
+#define DIALS_UTIL_RECORD_FORMATTER_H
+
+#include <stdio.h>
+#include <cstring>
+#include <string>
+#include <vector>
+#include <dials/array_family/scitbx_shared_and_versa.h>
+#include <dials/error.h>
+
+namespace dials { namespace util {
+
+  namespace detail {
+
+    /**
+     * Check a printf format contains a single conversion of the given kind
+     * @param format The format string
+     * @param conversions The allowed conversion characters
+     */
+    inline
+    void check_format(const std::string &format, const char *conversions) {
+      std::size_t count = 0;
+      for (std::size_t i = 0; i < format.size(); ++i) {
+        if (format[i] != '%') {
+          continue;
+        }
+        DIALS_ASSERT(i + 1 < format.size());
+        if (format[i+1] == '%') {
+          ++i;
+          continue;
+        }
+        std::size_t j = i + 1;
+        while (j < format.size() && std::strchr("+- #0123456789.", format[j])) {
+          ++j;
+        }
+        DIALS_ASSERT(j < format.size());
+        DIALS_ASSERT(std::strchr(conversions, format[j]) != NULL);
+        count++;
+        i = j;
+      }
+      DIALS_ASSERT(count == 1);
+    }
+
+    /**
+     * Append a formatted value to a string
+     * @param result The string to append to
+     * @param format The format string
+     * @param value The value
+     */
+    template <typename T>
+    void append_formatted(std::string &result, const std::string &format, T value) {
+      char buffer[128];
+      int n = snprintf(buffer, sizeof(buffer), format.c_str(), value);
+      DIALS_ASSERT(n >= 0);
+      if (n < (int)sizeof(buffer)) {
+        result.append(buffer, n);
+      } else {
+        std::vector<char> large(n + 1);
+        snprintf(&large[0], large.size(), format.c_str(), value);
+        result.append(&large[0], n);
+      }
+    }
+
+  }
+
+  /**
+   * A class to format columns of data as fixed width text records. Each
+   * column has a printf style format which includes any separator, and each
+   * record is terminated by a newline.
+   */
+  class RecordFormatter {
+  public:
+
+    /**
+     * @param nrows The number of records
+     */
+    RecordFormatter(std::size_t nrows)
+      : nrows_(nrows) {}
+
+    /**
+     * Add an integer column
+     * @param data The column data
+     * @param format The format (e.g. "%4d")
+     */
+    void add_int(const af::shared<int> &data, const std::string &format) {
+      DIALS_ASSERT(data.size() == nrows_);
+      detail::check_format(format, "di");
+      fields_.push_back(Field(INT, int_columns_.size(), format));
+      int_columns_.push_back(data);
+    }
+
+    /**
+     * Add a floating point column
+     * @param data The column data
+     * @param format The format (e.g. "%8.2f")
+     */
+    void add_double(const af::shared<double> &data, const std::string &format) {
+      DIALS_ASSERT(data.size() == nrows_);
+      detail::check_format(format, "feEgG");
+      fields_.push_back(Field(DOUBLE, double_columns_.size(), format));
+      double_columns_.push_back(data);
+    }
+
+    /**
+     * @returns The number of records
+     */
+    std::size_t nrows() const {
+      return nrows_;
+    }
+
+    /**
+     * Format a block of records
+     * @param begin The first record
+     * @param end The end of the records
+     * @returns The formatted records
+     */
+    std::string format(std::size_t begin, std::size_t end) const {
+      DIALS_ASSERT(begin <= end && end <= nrows_);
+      std::string result;
+      result.reserve((end - begin) * 16 * (fields_.size() + 1));
+      for (std::size_t i = begin; i < end; ++i) {
+        for (std::size_t j = 0; j < fields_.size(); ++j) {
+          const Field &field = fields_[j];
+          if (field.type == INT) {
+            detail::append_formatted(
+                result, field.format, int_columns_[field.index][i]);
+          } else {
+            detail::append_formatted(
+                result, field.format, double_columns_[field.index][i]);
+          }
+        }
+        result.push_back('\n');
+      }
+      return result;
+    }
+
+  private:
+
+    enum FieldType { INT, DOUBLE };
+
+    struct Field {
+      FieldType type;
+      std::size_t index;
+      std::string format;
+      Field(FieldType type_, std::size_t index_, const std::string &format_)
+        : type(type_), index(index_), format(format_) {}
+    };
+
+    std::size_t nrows_;
+    std::vector<Field> fields_;
+    std::vector< af::shared<int> > int_columns_;
+    std::vector< af::shared<double> > double_columns_;
+  };
+
+  /**
+   * Format each value of an integer column
+   * @param data The column data
+   * @param format The format
+   * @returns The formatted values
+   */
+  inline
+  af::shared<std::string> format_int_column(
+      const af::const_ref<int> &data,
+      const std::string &format) {
+    detail::check_format(format, "di");
+    af::shared<std::string> result(data.size());
+    for (std::size_t i = 0; i < data.size(); ++i) {
+      detail::append_formatted(result[i], format, data[i]);
+    }
+    return result;
+  }
+
+  /**
+   * Format each value of a floating point column
+   * @param data The column data
+   * @param format The format
+   * @returns The formatted values
+   */
+  inline
+  af::shared<std::string> format_double_column(
+      const af::const_ref<double> &data,
+      const std::string &format) {
+    detail::check_format(format, "feEgG");
+    af::shared<std::string> result(data.size());
+    for (std::size_t i = 0; i < data.size(); ++i) {
+      detail::append_formatted(result[i], format, data[i]);
+    }
+    return result;
+  }
+
+}} // namespace dials::util
+
+#endif // DIALS_UTIL_RECORD_FORMATTER_H
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#
+# record_writer.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division, print_function
+
+
+def record_formatter(columns):
+  '''
+  Create a formatter for fixed width text records
+
+  :param columns: A list of (format, column) pairs. Each format is a printf
+                  style format for a single value including any separator.
+  :return: The record formatter
+
+  '''
+  from dials.util.ext import RecordFormatter
+  from dials.array_family import flex
+  assert len(columns) > 0
+  formatter = RecordFormatter(len(columns[0][1]))
+  for fmt, data in columns:
+    if isinstance(data, flex.int):
+      formatter.add_int(data, fmt)
+    elif isinstance(data, flex.double):
+      formatter.add_double(data, fmt)
+    else:
+      raise TypeError('Unsupported column type %s' % type(data).__name__)
+  return formatter
+
+
+def write_records(fout, columns, block_size=100000):
+  '''
+  Write columns of data as fixed width text records, one per line. The
+  records are formatted in blocks to limit the memory used.
+
+  :param fout: The output file
+  :param columns: A list of (format, column) pairs
+  :param block_size: The number of records in a block
+
+  '''
+  formatter = record_formatter(columns)
+  nrows = formatter.nrows()
+  for begin in range(0, nrows, block_size):
+    end = min(begin + block_size, nrows)
+    fout.write(formatter.format(begin, end))
+
+
+def format_column(fmt, data):
+  '''
+  Format each value of a column, e.g. for the columns of a CIF loop
+
+  :param fmt: The printf style format
+  :param data: The column (flex.int or flex.double)
+  :return: The formatted values as a flex.std_string
+
+  '''
+  from dials.util.ext import format_column as format_values
+  from dials.array_family import flex
+  if not isinstance(data, (flex.int, flex.double)):
+    raise TypeError('Unsupported column type %s' % type(data).__name__)
+  return format_values(data, fmt)
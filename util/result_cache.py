@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+#
+# result_cache.py
+#
+#  This code is distributed under the BSD license, a copy of which is
+#  included in the root directory of this package.
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+from libtbx.phil import parse
+
+logger = logging.getLogger(__name__)
+
+phil_scope = parse('''
+
+  result_cache
+    .expert_level = 1
+  {
+    enable = False
+      .type = bool
+      .help = "Reuse the output of a previous run of the program with the same "
+              "input files, parameters and DIALS version"
+
+    directory = None
+      .type = path
+      .help = "The cache directory (default ~/.dials_cache)"
+
+    max_size = 1024
+      .type = float(value_min=0)
+      .help = "The maximum size of the cache directory in MB. The least "
+              "recently used results are removed when the size is exceeded."
+  }
+
+''')
+
+
+class ResultCache(object):
+  '''
+  A content addressed cache of the output files of the processing programs.
+
+  The results are keyed by a hash of the program name, the DIALS version, the
+  content of the input files and the modified parameters (excluding the input
+  and output filenames). Each result is stored in a directory named by the key
+  and the least recently used results are removed when the total size of the
+  cache exceeds the maximum size. The number of hits, misses and evictions is
+  accumulated in statistics.json in the cache directory.
+
+  Note that the image data referenced by the input experiments or datablocks
+  is not hashed; the images are assumed not to change.
+
+  '''
+
+  # Parameters which do not change the results
+  ignored = ('output.log', 'output.debug_log', 'output.phil')
+
+  def __init__(self, directory=None, max_size=1024):
+    '''
+    Initialise the cache
+
+    :param directory: The cache directory
+    :param max_size: The maximum size of the cache in MB
+
+    '''
+    import os
+    if directory is None:
+      directory = os.path.join(os.path.expanduser('~'), '.dials_cache')
+    self.directory = directory
+    self.max_size = int(max_size * 1024 * 1024)
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    if not os.path.exists(self.directory):
+      try:
+        os.makedirs(self.directory)
+      except OSError:
+        if not os.path.isdir(self.directory):
+          raise
+
+  @classmethod
+  def from_parameters(cls, params):
+    '''
+    Create the cache from the result_cache parameters
+
+    :param params: The result_cache parameters
+    :return: The cache or None if the cache is not enabled
+
+    '''
+    if not params.enable:
+      return None
+    return cls(params.directory, params.max_size)
+
+  def key(self, program, input_params, diff_phil, outputs):
+    '''
+    Compute the key for the inputs of a program
+
+    :param program: The program name
+    :param input_params: The input parameters with the loaded input files
+    :param diff_phil: The diff phil from the option parser
+    :param outputs: A dictionary of output parameter names and filenames
+    :return: The key
+
+    '''
+    from dials.util.version import dials_version
+    import hashlib
+    sha1 = hashlib.sha1()
+    sha1.update(program.encode('utf-8'))
+    sha1.update(dials_version().encode('utf-8'))
+
+    # Hash the content of the input files
+    for name in ['datablock', 'experiments', 'reflections']:
+      for item in getattr(input_params, name, []):
+        sha1.update(name.encode('utf-8'))
+        sha1.update(self._content_hash(item))
+
+    # Hash the modified parameters that are not filenames
+    for item in diff_phil.all_definitions():
+      if item.path.split('.')[0] in ('input', 'result_cache'):
+        continue
+      if item.path in outputs or item.path in self.ignored:
+        continue
+      value = ' '.join(str(word.value) for word in item.object.words)
+      sha1.update(('%s=%s\n' % (item.path, value)).encode('utf-8'))
+    return sha1.hexdigest()
+
+  def fetch(self, key, outputs):
+    '''
+    Copy the cached output files to the output filenames
+
+    :param key: The cache key
+    :param outputs: A dictionary of output parameter names and filenames
+    :return: True/False the result was in the cache
+
+    '''
+    import os
+    import shutil
+    entry = os.path.join(self.directory, key)
+    complete = os.path.join(entry, 'complete')
+    outputs = dict((n, f) for n, f in outputs.items() if f is not None)
+
+    # Only copy anything if every requested output is in the cache
+    found = os.path.exists(complete) and all(
+      os.path.exists(os.path.join(entry, name)) for name in outputs)
+    if found:
+      for name, filename in outputs.items():
+        shutil.copyfile(os.path.join(entry, name), filename)
+    if found:
+      os.utime(complete, None)
+      self.hits += 1
+      logger.info('Result cache hit: copied results from %s' % entry)
+    else:
+      self.misses += 1
+      logger.info('Result cache miss')
+    self._update_statistics(hits=int(found), misses=int(not found))
+    return found
+
+  def store(self, key, outputs):
+    '''
+    Store the output files in the cache. Nothing is stored unless all the
+    output files exist. If the entry already exists, any outputs it does not
+    have (e.g. optional outputs not requested by an earlier run) are added.
+
+    :param key: The cache key
+    :param outputs: A dictionary of output parameter names and filenames
+
+    '''
+    import os
+    import shutil
+    entry = os.path.join(self.directory, key)
+    outputs = dict((n, f) for n, f in outputs.items() if f is not None)
+    if len(outputs) == 0:
+      return
+    if not all(os.path.exists(f) for f in outputs.values()):
+      return
+    if os.path.exists(entry):
+      self._add_missing(entry, outputs)
+      return
+
+    # Copy to a temporary directory and rename so entries are always complete
+    temp = '%s.%d.tmp' % (entry, os.getpid())
+    os.makedirs(temp)
+    for name, filename in outputs.items():
+      shutil.copyfile(filename, os.path.join(temp, name))
+    open(os.path.join(temp, 'complete'), 'w').close()
+    try:
+      os.rename(temp, entry)
+    except OSError:
+      shutil.rmtree(temp, ignore_errors=True)
+      return
+    logger.info('Stored results in result cache %s' % entry)
+    self.evict()
+
+  def _add_missing(self, entry, outputs):
+    '''
+    Copy the outputs which are missing from an existing entry. Each file is
+    copied to a temporary name and renamed so that it is always complete.
+
+    '''
+    import os
+    import shutil
+    added = 0
+    for name, filename in outputs.items():
+      cached = os.path.join(entry, name)
+      if os.path.exists(cached):
+        continue
+      temp = '%s.%d.tmp' % (cached, os.getpid())
+      try:
+        shutil.copyfile(filename, temp)
+        os.rename(temp, cached)
+      except (IOError, OSError):
+        if os.path.exists(temp):
+          os.remove(temp)
+        continue
+      added += 1
+    if added > 0:
+      logger.info('Added %d results to result cache %s' % (added, entry))
+      self.evict()
+
+  def evict(self):
+    '''
+    Remove the least recently used results until the cache is small enough
+
+    '''
+    import os
+    import shutil
+    entries = []
+    total = 0
+    for name in os.listdir(self.directory):
+      complete = os.path.join(self.directory, name, 'complete')
+      if not os.path.exists(complete):
+        continue
+      size = 0
+      for dirpath, dirnames, filenames in os.walk(os.path.join(self.directory, name)):
+        size += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+      entries.append((os.path.getmtime(complete), name, size))
+      total += size
+    evictions = 0
+    for mtime, name, size in sorted(entries):
+      if total <= self.max_size:
+        break
+      shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+      total -= size
+      evictions += 1
+    if evictions > 0:
+      self.evictions += evictions
+      logger.info('Removed %d results from result cache' % evictions)
+      self._update_statistics(evictions=evictions)
+
+  def statistics(self):
+    '''
+    Get the accumulated cache statistics
+
+    :return: A dictionary of hits, misses and evictions
+
+    '''
+    import json
+    import os
+    filename = os.path.join(self.directory, 'statistics.json')
+    statistics = {'hits' : 0, 'misses' : 0, 'evictions' : 0}
+    if os.path.exists(filename):
+      try:
+        with open(filename) as infile:
+          statistics.update(json.load(infile))
+      except ValueError:
+        pass
+    return statistics
+
+  def _update_statistics(self, hits=0, misses=0, evictions=0):
+    '''
+    Add to the accumulated cache statistics
+
+    '''
+    import json
+    import os
+    statistics = self.statistics()
+    statistics['hits'] += hits
+    statistics['misses'] += misses
+    statistics['evictions'] += evictions
+    filename = os.path.join(self.directory, 'statistics.json')
+    temp = '%s.%d.tmp' % (filename, os.getpid())
+    with open(temp, 'w') as outfile:
+      json.dump(statistics, outfile)
+    os.rename(temp, filename)
+    logger.info('Result cache statistics: %d hits, %d misses, %d evictions' % (
+      statistics['hits'], statistics['misses'], statistics['evictions']))
+
+  @staticmethod
+  def _content_hash(item):
+    '''
+    Hash the content of an input file. If the file is not on disk (e.g. it is
+    held in memory by idials) the pickled data is hashed instead.
+
+    '''
+    import hashlib
+    import os
+    sha1 = hashlib.sha1()
+    if os.path.exists(item.filename):
+      with open(item.filename, 'rb') as infile:
+        for block in iter(lambda: infile.read(1 << 20), b''):
+          sha1.update(block)
+    else:
+      import six.moves.cPickle as pickle
+      sha1.update(pickle.dumps(item.data, protocol=pickle.HIGHEST_PROTOCOL))
+    return sha1.digest()